@@ -17,4 +17,673 @@ def test_batch():
         test_passed = False
     
     assert test_passed
-    
\ No newline at end of file
+    
+def _calibration_table(n_points=60, seed=0):
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    freqs = 10**rng.uniform(-0.5, 1.3, n_points)
+    rockTypes = rng.choice(['shale', 'limestone', 'dolomite'], n_points)
+    aTrue = {'shale': 90, 'limestone': 110, 'dolomite': 70}
+    depths = np.array([aTrue[r] for r in rockTypes]) * freqs**-1.1 * 10**rng.normal(0, 0.05, n_points)
+    xcoords = rng.uniform(0, 1000, n_points)
+    ycoords = rng.uniform(0, 1000, n_points)
+    return pd.DataFrame({'PeakFrequency': freqs, 'Bedrock_Depth': depths, 'rock': rockTypes,
+                         'xcoord': xcoords, 'ycoord': ycoords})
+
+def test_calibrate_models():
+    import numpy as np
+
+    calibDF = _calibration_table()
+    calibDF.loc[0, 'Bedrock_Depth'] = np.nan
+    models = sprit.calibrate_models(calibDF, group_by='rock', leave_one_out=True, n_bootstrap=0)
+
+    validDF = calibDF.dropna()
+    assert set(models.index) == {'All', 'shale', 'limestone', 'dolomite'}
+    for modelName, subDF in [('All', validDF)] + list(validDF.groupby('rock')):
+        logF = np.log10(subDF['PeakFrequency'].to_numpy())
+        logD = np.log10(subDF['Bedrock_Depth'].to_numpy())
+
+        b, logA = np.polyfit(logF, logD, 1)
+        assert np.isclose(models.loc[modelName, 'a'], 10**logA)
+        assert np.isclose(models.loc[modelName, 'b'], b)
+        assert models.loc[modelName, 'n_points'] == len(subDF)
+
+        # Brute-force leave-one-out
+        looErrors = []
+        for i in range(len(logF)):
+            keep = np.arange(len(logF)) != i
+            bLOO, logALOO = np.polyfit(logF[keep], logD[keep], 1)
+            looErrors.append(logD[i] - (logALOO + bLOO * logF[i]))
+        assert np.isclose(models.loc[modelName, 'loo_rmse_log10'], np.sqrt(np.mean(np.square(looErrors))))
+
+def test_calibrate_local():
+    import numpy as np
+    import pandas as pd
+
+    calibDF = _calibration_table(n_points=200)
+    siteDF = pd.DataFrame({'Site Name': ['s0', 's1', 's2', 's3'],
+                           'xcoord': [100, 500, 900, 5000],
+                           'ycoord': [100, 500, 200, 5000],
+                           'Peak': [0.8, 2.0, 5.0, 1.0]})
+    kNeighbors = 12
+    outlierRadius = 300
+    localModels = sprit.calibrate_local(siteDF, calibDF, k_neighbors=kNeighbors, outlier_radius=outlierRadius)
+
+    calibXY = calibDF[['xcoord', 'ycoord']].to_numpy()
+    logF = np.log10(calibDF['PeakFrequency'].to_numpy())
+    logD = np.log10(calibDF['Bedrock_Depth'].to_numpy())
+    for i, site in siteDF.iterrows():
+        dists = np.hypot(calibXY[:, 0] - site['xcoord'], calibXY[:, 1] - site['ycoord'])
+        nearest = np.argsort(dists)[:kNeighbors]
+        nearest = nearest[dists[nearest] <= outlierRadius]
+        if len(nearest) < 3:
+            # Sites without enough nearby points use the regional model
+            nearest = np.arange(len(calibDF))
+        else:
+            assert localModels.loc[i, 'n_neighbors'] == len(nearest)
+        b, logA = np.polyfit(logF[nearest], logD[nearest], 1)
+        assert np.isclose(localModels.loc[i, 'a'], 10**logA)
+        assert np.isclose(localModels.loc[i, 'b'], b)
+        assert np.isclose(localModels.loc[i, 'BedrockDepth'], 10**logA * site['Peak']**b)
+
+def test_calibrate_models_depth_model():
+    import numpy as np
+
+    models = sprit.calibrate_models(_calibration_table(), n_bootstrap=0)
+    a = models.loc['All', 'a']
+    b = models.loc['All', 'b']
+    depthData = sprit.calculate_depth(2.0, depth_model=models.loc['All'])
+    assert np.isclose(depthData.Table_Report['BedrockDepth'].iloc[0], a * 2.0**b)
+
+def test_streaming_stats():
+    import numpy as np
+    from sprit import sprit_hvsr
+
+    rng = np.random.default_rng(0)
+    curves = rng.normal(-140, 5, size=(200, 64))
+    curves[rng.random(curves.shape) < 0.02] = np.nan
+
+    psdStats = sprit_hvsr._init_streaming_stats(curves.shape[1], buffer_size=50)
+    for i, curve in enumerate(curves):
+        sprit_hvsr._update_streaming_stats(psdStats, curve)
+        if i == 29:
+            # The median is exact while the curves are still kept
+            medVals, stdVals = sprit_hvsr._streaming_stats_results(psdStats)
+            assert np.allclose(medVals, np.nanmedian(curves[:30], axis=0))
+    medVals, stdVals = sprit_hvsr._streaming_stats_results(psdStats)
+    assert np.allclose(stdVals, np.nanstd(curves, axis=0))
+    assert np.nanmax(np.abs(medVals - np.nanmedian(curves, axis=0))) < 2
+
+    # Removing curves gives the same standard deviation as never adding them
+    hvStats = sprit_hvsr._init_streaming_stats(curves.shape[1], track_median=False)
+    sprit_hvsr._update_streaming_stats(hvStats, curves)
+    sprit_hvsr._update_streaming_stats(hvStats, curves[::3], remove=True)
+    keepRows = np.arange(curves.shape[0]) % 3 != 0
+    assert np.allclose(sprit_hvsr._streaming_stats_results(hvStats)[1], np.nanstd(curves[keepRows], axis=0))
+
+def test_sorted_medians():
+    import numpy as np
+    from sprit import sprit_hvsr
+
+    initMedians = getattr(sprit_hvsr, '__init_sorted_medians')
+    removeWindows = getattr(sprit_hvsr, '__remove_from_sorted_medians')
+    getMedians = getattr(sprit_hvsr, '__sorted_medians')
+
+    rng = np.random.default_rng(1)
+    curves = rng.normal(size=(60, 40))
+    curves[rng.random(curves.shape) < 0.1] = np.nan
+    curves[:, 0] = np.round(curves[:, 0])  # Many ties
+
+    medState = initMedians(curves)
+    activeWins = np.ones(curves.shape[0], dtype=bool)
+    for iteration in range(6):
+        expMedians = np.nanmedian(curves[activeWins], axis=0)
+        assert np.array_equal(getMedians(medState), expMedians, equal_nan=True)
+        removedWins = rng.choice(curves.shape[0], size=7)
+        removeWindows(medState, removedWins)
+        activeWins[removedWins] = False
+
+def test_noise_thresh_moving_average():
+    import pathlib
+    import numpy as np
+    from sprit import sprit_hvsr
+
+    movingAverage = getattr(sprit_hvsr, '__nan_moving_average')
+
+    # Without gaps, the same as np.convolve(mode='same'), including at the edges
+    rng = np.random.default_rng(0)
+    data = rng.normal(0, 1000, 5000)
+    for windowSize in [1, 10, 301]:
+        expLTA = np.convolve(data, np.ones(windowSize) / windowSize, mode='same')
+        assert np.allclose(movingAverage(data, windowSize), expLTA, atol=1e-2)
+
+    # Gaps are left out of the mean of their windows
+    gapData = np.ma.masked_array(data, mask=np.zeros(data.shape[0], dtype=bool))
+    gapData.mask[2000:2100] = True
+    gapLTA = movingAverage(gapData, 301)
+    assert np.isclose(gapLTA[1900], np.mean(data[1750:2000]), atol=1e-2)
+    assert np.isclose(gapLTA[1000], np.mean(data[850:1151]), atol=1e-2)
+
+    siteFile = pathlib.Path(sprit.__file__).parent.joinpath('extra_sample_data', 'SampleHVSRSite08.MSEED')
+    hvsrData = sprit.fetch_data(sprit.input_params(siteFile))
+    hvsrData = sprit.remove_noise(hvsrData, remove_method='noise threshold')
+    hvsrData = sprit.generate_psds(hvsrData)
+    assert hvsrData['hvsr_windows_df']['Use'].sum() == 121
+
+def test_rs_archive_index(tmp_path, monkeypatch):
+    import pathlib
+    import obspy
+    from sprit import sprit_hvsr
+
+    siteFile = pathlib.Path(sprit.__file__).parent.joinpath('extra_sample_data', 'SampleHVSRSite08.MSEED')
+    for tr in obspy.read(str(siteFile)):
+        chaDir = tmp_path.joinpath(tr.stats.channel + '.D')
+        chaDir.mkdir(exist_ok=True)
+        for doy in [124, 125]:
+            tr.write(str(chaDir.joinpath(f'{tr.id}.D.2023.{doy}')), format='MSEED')
+
+    # The archive is indexed from the file names, without reading any files
+    def _no_read(*args, **kwargs):
+        raise AssertionError('Files should not be read while indexing')
+    monkeypatch.setattr(sprit_hvsr.obspy, 'read', _no_read)
+
+    findDayFiles = getattr(sprit_hvsr, '__find_RS_day_files')
+    indexDict, rootFiles, subDirFiles = findDayFiles(tmp_path, [(2023, 125)])
+    assert rootFiles == []
+    assert sorted(f.name for f in subDirFiles) == ['AM.RAC84.00.EHE.D.2023.125', 'AM.RAC84.00.EHN.D.2023.125', 'AM.RAC84.00.EHZ.D.2023.125']
+    assert len(indexDict['files']) == 6
+    assert tmp_path.joinpath(sprit_hvsr.RS_INDEX_FILENAME).exists()
+
+def test_azimuth_curves():
+    import pathlib
+    import numpy as np
+    from sprit import sprit_hvsr
+
+    siteFile = pathlib.Path(sprit.__file__).parent.joinpath('extra_sample_data', 'SampleHVSRSite05.MSEED')
+    hvsrData = sprit.fetch_data(sprit.input_params(siteFile))
+    hvsrData = sprit.calculate_azimuth(hvsrData, azimuth_angle=45, azimuth_type='multiple')
+    hvsrData = sprit.generate_psds(hvsrData, azimuthal_psds=True)
+    hvsrData = sprit.process_hvsr(hvsrData)
+
+    # plot_azimuth() evaluates other angles the same way as the azimuths in hvsr_az
+    azKeys = sorted(hvsrData['hvsr_az'].keys())
+    azAngles = [hvsrData['azimuths'][azKey]['azimuth_rad'] for azKey in azKeys]
+    azCurves = getattr(sprit_hvsr, '__azimuth_hvsr_curves')(hvsrData, azAngles, chunk_size=2)
+    for azKey, azCurve in zip(azKeys, azCurves):
+        assert np.allclose(azCurve, hvsrData['hvsr_az'][azKey], rtol=1e-10)
+
+def test_get_report_parallel(tmp_path):
+    import copy
+    import pathlib
+    import warnings
+    import matplotlib
+    matplotlib.use('Agg')
+
+    sampleDir = pathlib.Path(sprit.__file__).parent.joinpath('extra_sample_data')
+    siteList = []
+    for site in ['05', '11']:
+        siteList.append(sprit.run(sampleDir.joinpath(f'SampleHVSRSite{site}.MSEED'), report_formats=['table'],
+                                  suppress_report_outputs=True, show_plot=False, verbose=False))
+    hvsrBatch = sprit.HVSRBatch(siteList)
+
+    # A site that cannot be reported is kept in the batch (with its status) in both modes
+    brokenBatch = copy.deepcopy(hvsrBatch)
+    brokenSite = list(brokenBatch.keys())[0]
+    brokenBatch[brokenSite]['BestPeak']['HV']['Report'] = None
+
+    reportKwargs = dict(report_formats=['print', 'table', 'plot', 'html'], report_export_format=['print', 'table', 'plot', 'html'],
+                        csv_handling='append', suppress_report_outputs=True, verbose=False)
+    batchResults = {}
+    for workers in [1, 2]:
+        exportDir = tmp_path.joinpath(f'workers{workers}', 'reports')
+        exportDir.mkdir(parents=True)
+        batchResults[workers] = sprit.get_report(copy.deepcopy(hvsrBatch), report_export_path=exportDir, report_workers=workers, **reportKwargs)
+
+        with warnings.catch_warnings(record=True) as caughtWarnings:
+            warnings.simplefilter('always')
+            brokenResults = sprit.get_report(copy.deepcopy(brokenBatch), report_formats=['print', 'table', 'plot'], report_export_format=None,
+                                             suppress_report_outputs=True, report_workers=workers, verbose=False)
+        assert brokenResults[brokenSite]['processing_status']['get_report_status'] is False
+        assert any(brokenSite in str(w.message) for w in caughtWarnings)
+
+    # The same files are written in both modes
+    serialFiles = sorted(f.relative_to(tmp_path.joinpath('workers1')) for f in tmp_path.joinpath('workers1').rglob('*') if f.is_file())
+    assert serialFiles == sorted(f.relative_to(tmp_path.joinpath('workers2')) for f in tmp_path.joinpath('workers2').rglob('*') if f.is_file())
+    for fname in serialFiles:
+        if fname.suffix != '.png':
+            assert tmp_path.joinpath('workers1', fname).read_text() == tmp_path.joinpath('workers2', fname).read_text()
+
+    for site in hvsrBatch.keys():
+        serialSite = batchResults[1][site]
+        parallelSite = batchResults[2][site]
+        assert parallelSite['processing_status']['get_report_status'] is True
+        assert serialSite['Print_Report'] == parallelSite['Print_Report']
+        assert serialSite['Table_Report'].equals(parallelSite['Table_Report'])
+        assert isinstance(parallelSite['Plot_Report'], matplotlib.figure.Figure)
+        assert {k: p.name for k, p in serialSite['Report_Paths'].items()} == {k: p.name for k, p in parallelSite['Report_Paths'].items()}
+        assert sorted(parallelSite['Report_Paths'].keys()) == ['html', 'plot', 'print', 'table']
+
+def test_pdf_report_azimuth(tmp_path):
+    import pathlib
+    import pypdf
+
+    siteFile = pathlib.Path(sprit.__file__).parent.joinpath('extra_sample_data', 'SampleHVSRSite11.MSEED')
+    hvsrData = sprit.run(siteFile, azimuth_angle=30, report_formats=['table'], suppress_report_outputs=True, show_plot=False, verbose=False)
+    assert round(hvsrData['BestPeak']['AZ030']['f0'], 3) != round(hvsrData['BestPeak']['HV']['f0'], 3)
+
+    # The pdf (and the reports it is made from) use the azimuth passed to get_report()
+    pdfPath = tmp_path.joinpath('report.pdf')
+    hvsrData = sprit.get_report(hvsrData, report_formats=['pdf'], azimuth='AZ030', pdf_engine='matplotlib',
+                                report_export_path=pdfPath, suppress_report_outputs=True, verbose=False)
+    summaryText = pypdf.PdfReader(pdfPath).pages[0].extract_text()
+    assert f"Peak Frequency: {round(float(hvsrData['BestPeak']['AZ030']['f0']), 3)}" in summaryText
+
+def test_ind_peaks():
+    import pathlib
+    import numpy as np
+    import scipy.signal
+    from sprit import sprit_hvsr
+
+    siteFile = pathlib.Path(sprit.__file__).parent.joinpath('extra_sample_data', 'SampleHVSRSite08.MSEED')
+    hvsrData = sprit.run(siteFile, report_formats=['table'], suppress_report_outputs=True, show_plot=False, verbose=False)
+    hvsrDF = hvsrData['hvsr_windows_df']
+    hvsrDF.loc[hvsrDF.index[::3], 'Use'] = False
+    useArr = hvsrDF['Use'].to_numpy(dtype=bool)
+
+    # The peaks of each window are the same as scipy.signal.find_peaks() on its H/V curve
+    for useOnly, curveList in [(False, list(hvsrDF['HV_Curves'])), (True, list(hvsrDF['HV_Curves'][useArr]))]:
+        peakInds, peakOffsets = sprit_hvsr._get_ind_peaks(hvsrData, 'HV', use_only=useOnly)
+        assert peakOffsets.shape[0] == len(curveList) + 1
+        for i, curve in enumerate(curveList):
+            assert np.array_equal(peakInds[peakOffsets[i]:peakOffsets[i+1]], scipy.signal.find_peaks(curve)[0])
+
+    # Same result from the DataFrame columns (e.g., data from earlier versions of sprit)
+    peakInds, peakOffsets = sprit_hvsr._get_ind_peaks(hvsrData, 'HV', use_only=True)
+    oldPeakInds, oldPeakOffsets = sprit_hvsr._get_ind_peaks({'hvsr_windows_df': hvsrDF}, 'HV', use_only=True)
+    assert np.array_equal(peakInds, oldPeakInds)
+    assert np.array_equal(peakOffsets, oldPeakOffsets)
+
+def test_sesame_checks():
+    import pathlib
+
+    siteFile = pathlib.Path(sprit.__file__).parent.joinpath('extra_sample_data', 'SampleHVSRSite05.MSEED')
+    hvsrData = sprit.run(siteFile, report_formats=['table'], suppress_report_outputs=True, show_plot=False, verbose=False)
+
+    # Same results as the per-peak (non-vectorized) SESAME checks of earlier versions
+    bestPeak = hvsrData['BestPeak']['HV']
+    assert round(bestPeak['f0'], 4) == 2.9448
+    assert bestPeak['PassList'] == {'WinLen': True, 'SigCycles': True, 'LowCurveStD': True,
+                                    'ProminenceLow': True, 'ProminenceHi': True, 'AmpClarity': True,
+                                    'FreqStability': True, 'LowStDev_Freq': False, 'LowStDev_Amp': True}
+    assert bestPeak['Report']['σ_A(f)'] == 'H/V Amp. St.Dev. for 1.472-5.890Hz < 2  ✔'
+    assert bestPeak['Report']['A(f-)'] == 'Amp. of H/V Curve @0.739Hz (0.646) < 3.275 ✔'
+    assert bestPeak['Report']['A(f+)'] == 'H/V Curve at 11.74 Hz: 0.93 < 3.27 (f0/2) ✔'
+    assert bestPeak['Report']['P+'] == '2.92 Hz within ±5% of 2.94 Hz ✔'
+    assert bestPeak['Report']['P-'] == '3.03 Hz within ±5% of 2.94 Hz ✔'
+    assert bestPeak['Report']['Sf'] == 'St.Dev. of Peak Freq. (0.19) < 0.147 ✘'
+    assert bestPeak['Report']['Sa'] == 'St.Dev. of Peak Amp. (0.047) < 0.20 ✔'
+
+def test_dbscan_blocks():
+    import copy
+    import pathlib
+    from sprit import sprit_hvsr
+
+    siteFile = pathlib.Path(sprit.__file__).parent.joinpath('extra_sample_data', 'SampleHVSRSite08.MSEED')
+    hvsrData = sprit.run(siteFile, report_formats=['table'], suppress_report_outputs=True, show_plot=False, verbose=False)
+    hvsrData['hvsr_windows_df']['Use'] = True
+    nWindows = hvsrData['hvsr_windows_df'].shape[0]
+
+    # Calculating the distances in blocks of a few curves gives the same labels as all distances at once
+    dbscanOutliers = getattr(sprit_hvsr, '__dbscan_outlier_detect')
+    for neighborhoodSize, usePercentile in [(10, True), (30, True), (73.3, True), (40, False)]:
+        useLists = []
+        for maxBlockElements in [2**22, nWindows * 7, nWindows]:
+            blockData = dbscanOutliers(copy.deepcopy(hvsrData), neighborhood_size=neighborhoodSize, min_neighborhood_pts=20,
+                                       use_percentile=usePercentile, max_block_elements=maxBlockElements)
+            useLists.append(blockData['hvsr_windows_df']['Use'].tolist())
+        assert 0 < sum(useLists[0]) < nWindows
+        assert useLists[1] == useLists[0]
+        assert useLists[2] == useLists[0]
+
+def _tromino_yellow_file(trc_path, data, sampling_rate=128):
+    # Minimal Tromino (yellow) file: header with start time (2024-06-21 13:30:45), channels and sampling rate
+    #  (byte pairs swapped), then the samples of each channel interleaved
+    import numpy as np
+
+    header = bytearray(0xC000)
+    header[0:27] = b'NAKAGRILLA FLASHCARD HEADER'
+    metadata = bytearray(16)
+    metadata[1], metadata[3], metadata[5], metadata[7], metadata[9], metadata[11] = 0x45, 0x30, 0x13, 0x21, 0x06, 0x24
+    metadata[12:14] = data.shape[1].to_bytes(2, 'big')
+    metadata[14:16] = int(sampling_rate).to_bytes(2, 'big')
+    header[0x4020:0x4030] = np.frombuffer(bytes(metadata), dtype='<u2').byteswap().tobytes()
+    trc_path.write_bytes(bytes(header) + data.astype(data.dtype.newbyteorder('<')).tobytes())
+    return trc_path
+
+def test_tromino_decoding(tmp_path):
+    import numpy as np
+    import obspy
+
+    rng = np.random.default_rng(0)
+    unsignedData = (32768 + rng.normal(0, 500, (5000, 3))).astype(np.uint16)
+    signedData = rng.normal(0, 500, (5000, 3)).astype(np.int16)
+    for trcData in [unsignedData, signedData]:
+        trcFile = _tromino_yellow_file(tmp_path.joinpath(f'{trcData.dtype}.trc'), trcData)
+        trcStream = sprit.read_tromino_files(trcFile, tromino_model='yellow')
+
+        assert trcStream[0].stats.starttime == obspy.UTCDateTime(2024, 6, 21, 13, 30, 45)
+        assert trcStream[0].stats.sampling_rate == 128
+        # Channels are N, E, Z in the file, and each has its median removed
+        for comp, channelData in zip('NEZ', trcData.T.astype(np.float64)):
+            assert np.array_equal(trcStream.select(component=comp)[0].data, channelData - np.median(channelData))
+
+def _tromino_blue_file(trc_path, data, sampling_rate=128):
+    # Minimal Tromino Blue file: text header and GPS sentences (byte pairs swapped), then the 7 interleaved channels
+    import numpy as np
+
+    header = bytearray(b'NAKAGRILLA FLASHCARD HEADER blue  ')
+    header += f'  FIRST DATA ADDRES 137.  -  BYTE {sampling_rate}PER SECOND - '.encode()
+    header += b'$GPZDA,133045.00,21,06,2024,00,00*6A\r\n'
+    header += b'$GPGGA,133045.00,4006.1000,N,08814.2000,W,1,08,0.9,220.0,M,,M,,*47\r\n'
+    header += bytes(200 + len(header) % 2)
+    header = np.frombuffer(bytes(header), dtype='<u2').byteswap().tobytes()
+    trc_path.write_bytes(header + data.astype('<i2').tobytes())
+    return trc_path
+
+def test_tromino_time_window(tmp_path):
+    import numpy as np
+    import obspy
+
+    rng = np.random.default_rng(0)
+    yellowFile = _tromino_yellow_file(tmp_path.joinpath('yellow.trc'), (32768 + rng.normal(0, 500, (20000, 3))).astype(np.uint16))
+    blueFile = _tromino_blue_file(tmp_path.joinpath('blue.trc'), rng.normal(0, 500, (20000, 7)).astype(np.int16))
+
+    for trcFile, trcModel in [(yellowFile, 'yellow'), (blueFile, 'blue')]:
+        fullStream = sprit.read_tromino_files(trcFile, tromino_model=trcModel)
+        recordStart = fullStream[0].stats.starttime
+        for timeWindow in [(10, 60.5), (recordStart + 30, recordStart + 45), (None, 20), (100, None)]:
+            # Only the time window is read, with the same samples as when the whole file is read and trimmed
+            windowStream = sprit.read_tromino_files(trcFile, tromino_model=trcModel, time_window=timeWindow)
+            trimTimes = [recordStart + t if isinstance(t, (int, float)) else t for t in timeWindow]
+            trimStream = fullStream.copy().trim(starttime=trimTimes[0], endtime=trimTimes[1])
+            assert len(windowStream) == len(trimStream) == 3
+            for windowTrace in windowStream:
+                trimTrace = trimStream.select(id=windowTrace.id)[0]
+                assert windowTrace.stats.starttime == trimTrace.stats.starttime
+                assert np.array_equal(windowTrace.data, trimTrace.data)
+
+def test_fetch_data_time_window(tmp_path, monkeypatch):
+    import pathlib
+    import numpy as np
+    import obspy
+    from sprit import sprit_hvsr
+
+    siteFile = pathlib.Path(sprit.__file__).parent.joinpath('extra_sample_data', 'SampleHVSRSite08.MSEED')
+    siteStart = obspy.read(siteFile)[0].stats.starttime
+    siteParams = sprit.input_params(siteFile, acq_date=siteStart.date,
+                                    starttime=(siteStart + 60.3).strftime('%H:%M:%S.%f'), endtime=(siteStart + 300).strftime('%H:%M:%S.%f'))
+    windowData = sprit.fetch_data(siteParams.copy())
+
+    # Same data as when the whole file is read (and then trimmed by fetch_data())
+    readTimeRange = getattr(sprit_hvsr, '__read_obspy_time_range')
+    monkeypatch.setattr(sprit_hvsr, '__read_obspy_time_range', lambda data_path, input_parameters, verbose=False, **read_kwargs: obspy.read(data_path, **read_kwargs))
+    fullData = sprit.fetch_data(siteParams.copy())
+    monkeypatch.undo()
+    assert len(windowData['stream']) == len(fullData['stream']) == 3
+    for fullTrace in fullData['stream']:
+        windowTrace = windowData['stream'].select(id=fullTrace.id)[0]
+        assert windowTrace.stats.starttime == fullTrace.stats.starttime
+        assert np.array_equal(windowTrace.data, fullTrace.data)
+
+    # Times that are not in the data (used to update the timing of the data, not to trim it), and full days, read all data
+    assert readTimeRange(siteFile, {'starttime': siteStart - 3600, 'endtime': siteStart - 60}) == obspy.read(siteFile)
+    assert readTimeRange(siteFile, {'starttime': obspy.UTCDateTime(siteStart.date), 'endtime': obspy.UTCDateTime(siteStart.date) + 86399.999999}) == obspy.read(siteFile)
+
+    # Tromino data in the time range is the same as the whole record trimmed
+    rng = np.random.default_rng(0)
+    trcFile = _tromino_yellow_file(tmp_path.joinpath('yellow.trc'), (32768 + rng.normal(0, 500, (60000, 3))).astype(np.uint16))
+    trcStream = sprit.read_tromino_files(trcFile, tromino_model='yellow')
+    sTime = trcStream[0].stats.starttime + 60.3
+    eTime = trcStream[0].stats.starttime + 300
+    trcParams = sprit.input_params(trcFile, instrument='Tromino', acq_date=sTime.date,
+                                   starttime=sTime.strftime('%H:%M:%S.%f'), endtime=eTime.strftime('%H:%M:%S.%f'))
+    windowStream = getattr(sprit_hvsr, '__read_tromino_time_range')(trcParams)
+    trcStream.trim(starttime=sTime, endtime=eTime)
+    assert len(windowStream) == 3
+    for trimTrace in trcStream:
+        windowTrace = windowStream.select(id=trimTrace.id)[0]
+        assert windowTrace.stats.starttime == trimTrace.stats.starttime
+        assert np.array_equal(windowTrace.data, trimTrace.data)
+
+def test_decimate_minmax():
+    import numpy as np
+    from sprit import sprit_plot
+
+    rng = np.random.default_rng(0)
+    x = np.arange(100003) / 100
+    y = np.ma.masked_array(rng.normal(0, 1, x.shape[0]), mask=np.zeros(x.shape[0], dtype=bool))
+    y.mask[50000:52000] = True
+
+    decX, decY = sprit_plot._decimate_minmax(x, y, n_bins=500)
+    assert decX.shape[0] <= 2 * 500 + 4
+    assert np.all(np.diff(decX) > 0)
+    assert decX[0] == x[0] and decX[-1] == x[-1]
+
+    # The envelope of each bin (the extremes of the line) is kept, and the gap still breaks the line
+    fullY = np.ma.filled(y, np.nan)
+    binLen = x.shape[0] // 500
+    for binStart in range(0, 500 * binLen, binLen):
+        inBin = (decX >= x[binStart]) & (decX < x[binStart + binLen - 1] + 0.005)
+        binY = fullY[binStart:binStart + binLen]
+        if np.all(np.isnan(binY)):
+            assert np.all(np.isnan(decY[inBin]))
+        else:
+            assert np.nanmax(decY[inBin]) == np.nanmax(binY)
+            assert np.nanmin(decY[inBin]) == np.nanmin(binY)
+    assert np.isnan(decY).any()
+
+    # Short lines are not decimated
+    shortX, shortY = sprit_plot._decimate_minmax(x[:1000], fullY[:1000], n_bins=500)
+    assert np.array_equal(shortX, x[:1000])
+
+def test_aggregate_outlier_curves():
+    import pathlib
+    import matplotlib.collections
+    import numpy as np
+    import sprit
+    from sprit import sprit_plot
+
+    siteFile = pathlib.Path(sprit.__file__).parent.joinpath('extra_sample_data', 'SampleHVSRSite05.MSEED')
+    hvsrData = sprit.run(siteFile, report_formats=['table'], suppress_report_outputs=True, show_plot=False, verbose=False)
+    nWindows = hvsrData.hvsr_windows_df.shape[0]
+
+    # Plotly: the same curves are drawn, one trace per component and per retained/removed group
+    def dashed_and_solid_points(fig):
+        points = {True: [], False: []}
+        for trace in fig.data:
+            yVals = np.asarray(trace.y, dtype=float)
+            points[trace.line.dash == 'dash'].append(yVals[~np.isnan(yVals)])
+        return {k: np.sort(np.concatenate(v)) if v else np.array([]) for k, v in points.items()}
+
+    aggFig = sprit_plot.plot_outlier_curves(hvsrData, plot_engine='plotly', aggregate_curves=True, show_plot=False)
+    lineFig = sprit_plot.plot_outlier_curves(hvsrData, plot_engine='plotly', aggregate_curves=False, show_plot=False)
+    assert len(aggFig.data) == 3 * 3 < len(lineFig.data)
+    aggPoints = dashed_and_solid_points(aggFig)
+    linePoints = dashed_and_solid_points(lineFig)
+    for removed in [True, False]:
+        assert np.array_equal(aggPoints[removed], linePoints[removed])
+    assert aggFig.layout.annotations[-1].text == lineFig.layout.annotations[-1].text
+
+    # Matplotlib: one LineCollection segment per window
+    aggFig = sprit_plot.plot_outlier_curves(hvsrData, plot_engine='matplotlib', aggregate_curves=True, show_plot=False)
+    lineFig = sprit_plot.plot_outlier_curves(hvsrData, plot_engine='matplotlib', aggregate_curves=False, show_plot=False)
+    for aggAx, lineAx in zip(aggFig.axes, lineFig.axes):
+        collections = [c for c in aggAx.collections if isinstance(c, matplotlib.collections.LineCollection)]
+        assert sum(len(c.get_segments()) for c in collections) == nWindows
+        removedSegments = sum(len(c.get_segments()) for c in collections if c.get_label() == 'Removed Curve')
+        assert removedSegments == sum(line.get_linestyle() == '--' for line in lineAx.get_lines())
+
+def test_cross_section_grid():
+    import pathlib
+    import matplotlib.collections
+    import matplotlib.pyplot as plt
+    import numpy as np
+    import sprit
+    from sprit import sprit_plot
+
+    sampleDir = pathlib.Path(sprit.__file__).parent.joinpath('extra_sample_data')
+    siteList = []
+    for i, site in enumerate(['05', '06', '08']):
+        hvsrData = sprit.run(sampleDir.joinpath(f'SampleHVSRSite{site}.MSEED'), report_formats=['table'],
+                             suppress_report_outputs=True, show_plot=False, verbose=False)
+        hvsrData['longitude'] = hvsrData['xcoord'] = -88.30 + 0.01 * i
+        hvsrData['latitude'] = hvsrData['ycoord'] = 40.10 + 0.001 * i
+        hvsrData['elevation'] = 220 + 3 * i
+        hvsrData.Table_Report['Elevation'] = 220 + 3 * i
+        siteList.append(hvsrData)
+
+    # RBF interpolation is evaluated on the full grid (it used to raise a TypeError and fall back silently)
+    fig, ax = plt.subplots()
+    hvBatch, df = sprit_plot.plot_cross_section(sprit.HVSRBatch(siteList), fig=fig, ax=ax, interpolation_type='rbf',
+                                                return_df=True, show_cross_section=False)
+
+    # Every H/V sample of every site is placed at the site's coordinates and depth
+    for i, site in enumerate(hvBatch.sites):
+        siteDF = df[df['site'] == site]
+        hvCurve = np.asarray(hvBatch[site].hvsr_curve, dtype=float)
+        assert siteDF.shape[0] == hvCurve.shape[0]
+        assert np.all(siteDF['longitude'] == -88.30 + 0.01 * i)
+        assert np.allclose(siteDF['elevation'], hvBatch[site]['x_elev_m']['Z'][:hvCurve.shape[0]])
+        assert np.allclose(siteDF['HVVal'], np.log10(hvCurve/np.log10(np.nanmax(hvCurve))))
+
+    # The grid runs along the profile, from the first to the last site
+    quadMesh = [c for c in ax.collections if isinstance(c, matplotlib.collections.QuadMesh)][0]
+    gridXs = quadMesh.get_coordinates()[0, :, 0]
+    assert np.isclose(gridXs[0], -88.30) and np.isclose(gridXs[-1], -88.28)
+    assert np.all(np.diff(gridXs) > 0)
+    assert np.isfinite(quadMesh.get_array()).all()
+    plt.close(fig)
+
+def test_cross_section_interpolator_cache(monkeypatch):
+    import pathlib
+    import matplotlib.collections
+    import matplotlib.pyplot as plt
+    import numpy as np
+    import sprit
+    from sprit import sprit_plot
+
+    sampleDir = pathlib.Path(sprit.__file__).parent.joinpath('extra_sample_data')
+    siteList = []
+    for i, site in enumerate(['05', '08']):
+        hvsrData = sprit.run(sampleDir.joinpath(f'SampleHVSRSite{site}.MSEED'), report_formats=['table'],
+                             suppress_report_outputs=True, show_plot=False, verbose=False)
+        hvsrData['longitude'] = hvsrData['xcoord'] = -88.30 + 0.01 * i
+        hvsrData['latitude'] = hvsrData['ycoord'] = 40.10
+        hvsrData['elevation'] = 220 + 3 * i
+        hvsrData.Table_Report['Elevation'] = 220 + 3 * i
+        siteList.append(hvsrData)
+    hvBatch = sprit.HVSRBatch(siteList)
+
+    # Count how many times an interpolator is actually fitted
+    monkeypatch.setattr(sprit_plot, '_cross_section_interpolators', {})
+    makeInterpolator = getattr(sprit_plot, '__make_cross_section_interpolator')
+    fitTypes = []
+    def counting_make_interpolator(interp_points, interp_values, interpolation_type):
+        fitTypes.append(interpolation_type)
+        return makeInterpolator(interp_points, interp_values, interpolation_type)
+    monkeypatch.setattr(sprit_plot, '__make_cross_section_interpolator', counting_make_interpolator)
+
+    def cross_section_grid(**kwargs):
+        fig, ax = plt.subplots()
+        sprit_plot.plot_cross_section(hvBatch, fig=fig, ax=ax, show_cross_section=False, **kwargs)
+        quadMesh = [c for c in ax.collections if isinstance(c, matplotlib.collections.QuadMesh)][0]
+        plt.close(fig)
+        return np.asarray(quadMesh.get_array())
+
+    firstGrid = cross_section_grid(interpolation_type='linear')
+    assert fitTypes == ['linear']
+
+    # Restyling and changing the grid reuse the fitted interpolator
+    restyledGrid = cross_section_grid(interpolation_type='linear', show_curves=False, cmap='viridis')
+    assert np.array_equal(restyledGrid, firstGrid, equal_nan=True)
+    regriddedGrid = cross_section_grid(interpolation_type='linear', grid_size=[20, 40])
+    assert regriddedGrid.shape == (19, 39)
+    assert fitTypes == ['linear']
+
+    # A different interpolation type is fitted separately
+    cross_section_grid(interpolation_type='nearest')
+    assert fitTypes == ['linear', 'nearest']
+    assert len(sprit_plot._cross_section_interpolators) == 2
+
+def test_calculate_depth_axes():
+    import copy
+    import pathlib
+    import numpy as np
+    import sprit
+    from sprit import sprit_calibration
+
+    siteFile = pathlib.Path(sprit.__file__).parent.joinpath('extra_sample_data', 'SampleHVSRSite08.MSEED')
+    hvsrData = sprit.run(siteFile, report_formats=['table'], suppress_report_outputs=True, show_plot=False, verbose=False)
+    hvsrData.Table_Report['Elevation'] = 220.0
+    peakFreq = float(hvsrData.Table_Report['Peak'].values[0])
+    freqs = np.asarray(hvsrData.x_freqs['Z'], dtype=float)
+
+    # Named, (a, b), "a,b" and dict models all give the same power-law depths
+    (a, b) = sprit_calibration.model_parameters['ISGS_North']
+    for depthModel in ['ISGS_North', (a, -b), f'{a},{b}', {'A': a, 'B': b}]:
+        depthData = sprit_calibration.calculate_depth(copy.deepcopy(hvsrData), depth_model=depthModel,
+                                                      calculate_depth_in_feet=True, show_depth_curve=False)
+        assert np.isclose(depthData.Table_Report['BedrockDepth'].values[0], np.around(a*peakFreq**-b, 3))
+        assert np.isclose(depthData.Table_Report['BedrockElevation'].values[0], 220.0 - a*peakFreq**-b, atol=1e-3)
+        for comp in ['Z', 'E', 'N']:
+            depthAxis = np.around([a*(f**-b) for f in depthData.x_freqs[comp]], 3)
+            assert np.array_equal(depthData.x_depth_m[comp], depthAxis)
+            assert np.array_equal(depthData.x_depth_ft[comp], np.around(depthAxis*3.281, 3))
+            assert np.array_equal(depthData.x_elev_m[comp], np.around(220.0 - depthAxis, 3))
+
+    # Quarter wavelength model gets depth axes too
+    depthData = sprit_calibration.calculate_depth(copy.deepcopy(hvsrData), depth_model='swave', swave_velocity=400,
+                                                  show_depth_curve=False)
+    assert np.isclose(depthData.Table_Report['BedrockDepth'].values[0], np.around(400/(4*peakFreq), 3))
+    assert np.allclose(depthData.x_depth_m['Z'], np.around(400/(4*freqs), 3))
+
+def test_rs_concurrent_read(tmp_path):
+    import pathlib
+    import numpy as np
+    import obspy
+    from sprit import sprit_hvsr
+
+    siteFile = pathlib.Path(sprit.__file__).parent.joinpath('extra_sample_data', 'SampleHVSRSite08.MSEED')
+    siteStream = obspy.read(str(siteFile))
+    rawDir = tmp_path.joinpath('raw')
+    fileDir = tmp_path.joinpath('dir')
+    fileDir.mkdir()
+    for tr in siteStream:
+        chaDir = rawDir.joinpath(tr.stats.channel + '.D')
+        chaDir.mkdir(parents=True)
+        tr.write(str(chaDir.joinpath(f'{tr.id}.D.2023.124')), format='MSEED')
+        tr.write(str(fileDir.joinpath(f'{tr.id}.mseed')), format='MSEED')
+
+    params = {'starttime': obspy.UTCDateTime('2023-05-04T20:20:00'), 'endtime': obspy.UTCDateTime('2023-05-04T20:40:00'),
+              'acq_date': obspy.UTCDateTime('2023-05-04').date}
+    expectedStream = siteStream.copy().trim(starttime=params['starttime'], endtime=params['endtime'], nearest_sample=False)
+
+    # Raw archive: one trace per channel, Z first, same as reading and trimming each file in turn
+    readRSFiles = getattr(sprit_hvsr, '__read_RS_file_struct')
+    rawStream = readRSFiles(rawDir, 'raw', 2023, 124, None, params, save_archive_index=False)
+    assert [tr.stats.channel for tr in rawStream] == ['EHZ', 'EHN', 'EHE']
+    for tr in rawStream:
+        expectedTrace = expectedStream.select(channel=tr.stats.channel)[0]
+        assert tr.stats.starttime == expectedTrace.stats.starttime
+        assert np.array_equal(tr.data, expectedTrace.data)
+
+    # Directory of files: the traces of all files, as read from each file in turn
+    readTimeRange = getattr(sprit_hvsr, '__read_obspy_time_range')
+    dirStream = readRSFiles(fileDir, 'dir', 2023, 124, None, params)
+    assert sorted(tr.stats.channel for tr in dirStream) == ['EHE', 'EHN', 'EHZ']
+    for tr in dirStream:
+        expectedTrace = readTimeRange(fileDir.joinpath(f'{tr.id}.mseed'), params)[0]
+        assert tr.stats.starttime == expectedTrace.stats.starttime
+        assert np.array_equal(tr.data, expectedTrace.data)
@@ -66,6 +66,8 @@
 from sprit.sprit_calibration import (
     calculate_depth,
     calibrate,
+    calibrate_models,
+    calibrate_local,
 )
 
 
@@ -112,6 +114,8 @@
         'sprit_calibration',
             'calculate_depth',
             'calibrate',
+            'calibrate_models',
+            'calibrate_local',
             )
 
 
@@ -3,6 +3,7 @@
 to derive a relation between the resonant frequency and the depth to bedrock beneath the subsurface.
 
 """
+import functools
 import importlib
 import inspect
 import numbers
@@ -15,6 +16,7 @@
 import numpy as np
 import pandas as pd
 from scipy.optimize import curve_fit
+from scipy import spatial
 
 #try:  # For distribution
 #    from sprit import sprit_hvsr
@@ -88,6 +90,67 @@ def power_law(f, a, b):
     return a*(f**-b)
 
 
+# Helper function to standardize the depth_model parameter of calculate_depth()
+def __parse_depth_model(depth_model):
+    """Standardize depth model to an (a, b) tuple (with b positive) or, for non-power law models, a lowercase string"""
+    if depth_model is None:
+        depth_model = CONGLOMERATE_MODEL
+
+    # e.g., a row of the table returned by calibrate_models()
+    if isinstance(depth_model, pd.Series):
+        depth_model = depth_model.to_dict()
+
+    if isinstance(depth_model, dict):
+        depth_modelDict = {k.lower(): v for k, v in depth_model.items()}
+        depth_model = (depth_modelDict['a'], depth_modelDict['b'])
+    elif isinstance(depth_model, str):
+        if depth_model.casefold() in list(map(str.casefold, model_parameters)):
+            for k, v in model_parameters.items():
+                if depth_model.casefold() == k.casefold():
+                    depth_model = v
+                    break
+        elif depth_model.casefold() in swave_model_list or depth_model.casefold() in ["all", 'average', 'conglomerate']:
+            return depth_model.casefold()
+        else:   # parameters a and b could be passed in as a parsable string
+            depth_model = [float(param) for param in depth_model.split(',')]
+
+    if isinstance(depth_model, (list, tuple, np.ndarray)) and len(depth_model) == 2:
+        (a, b) = depth_model
+        if a == 0 or b == 0:
+            raise ValueError(f"Model parameters (a, b)={depth_model} cannot be zero, check model inputs.")
+
+        # Standardize b as positive for input to function
+        if b < 0:
+            b = b * -1
+        depth_model = (a, b)
+    return depth_model
+
+
+# Helper function to get the depth at each frequency of a frequency array
+def __get_depth_axis(freqs, a, b, decimal_places):
+    """Get depth axis (a * f^-b) for array of frequencies, reusing the result for identical frequency arrays"""
+    freqs = np.ascontiguousarray(freqs, dtype=float)
+    return __power_law_depth_axis(freqs.tobytes(), float(a), float(b), decimal_places)
+
+
+@functools.lru_cache(maxsize=32)
+def __power_law_depth_axis(freq_bytes, a, b, decimal_places):
+    """Cached calculation of depth axis from frequencies (as bytes, so they are hashable)"""
+    return np.around(a*(np.frombuffer(freq_bytes, dtype=float)**-b), decimal_places)
+
+
+# Helper function to do an operation on the depth axes of each component, only once if they share the same array
+def __apply_once_per_axis(component_axes, axis_func):
+    """Apply axis_func to each array in component_axes dict, computing only once for components sharing the same array"""
+    outArrays = {}
+    outAxes = {}
+    for comp, compAxis in component_axes.items():
+        if id(compAxis) not in outArrays:
+            outArrays[id(compAxis)] = axis_func(compAxis)
+        outAxes[comp] = outArrays[id(compAxis)]
+    return outAxes
+
+
 def calculate_depth(freq_input,
                     depth_model=None,
                     freq_col="Peak",
@@ -109,8 +172,9 @@ def calculate_depth(freq_input,
     ----------
     freq_input : HVSRData, HVSRBatch, float, int, or filepath, optional
         Input with frequency information, by default {sprit_hvsr.HVSRData, sprit_hvsr.HVSRBatch, float, os.PathLike}
-    depth_model : str, tuple, list, or dict, optional
-        Model describing a relationship between frequency and depth, by default "ISGS_All"
+    depth_model : str, tuple, list, dict, or pandas.Series, optional
+        Model describing a relationship between frequency and depth, by default "ISGS_All".
+        A row of the table returned by calibrate_models() can also be used directly.
     calculate_depth_in_feet : bool, optional
         Whether to calculate depth in feet (in addition to meters, which is done by default)
     freq_col : str, optional
@@ -168,6 +232,10 @@ def calculate_depth(freq_input,
     if 'ax' in kwargs:
         ax = kwargs['ax']
 
+    # Standardize depth model once (also passed on to each item of lists/batches)
+    depth_model = __parse_depth_model(depth_model)
+    orig_args['depth_model'] = depth_model
+
     # Break out if list (of random or not) items
     if isinstance(freq_input, (list, tuple)):
         outputList = []
@@ -189,50 +257,6 @@ def calculate_depth(freq_input,
             newBatchList.append(calculate_depth(freq_input=freq_input[site], **calc_depth_kwargs))
         return sprit_hvsr.HVSRBatch(newBatchList, df_as_read=freq_input.input_df)    
 
-    # Extract and standardize depth_model for a, b
-    # initialize values
-    a = 0
-    b = 0
-    depth_model_params = None
-    if isinstance(depth_model, (list, tuple, np.ndarray)) and len(depth_model) == 2:
-        (a, b) = depth_model
-
-        # Fetch parameters for frequency-depth model
-        if isinstance(depth_model, (tuple, list)):
-            (a, b) = depth_model
-            if a == 0 or b == 0:
-                raise ValueError(f"Model parameters (a, b)={depth_model} cannot be zero, check model inputs.")
-        elif isinstance(depth_model, dict):
-            depth_modelDict = {k.lower(): v for k, v in depth_model.items()}
-            a = depth_modelDict['a']
-            b = depth_modelDict['b']
-        elif isinstance(depth_model, str):
-            if depth_model.casefold() in list(map(str.casefold, model_parameters)):
-                for k, v in model_parameters.items():
-                    if depth_model.casefold() == k.casefold():
-                        (a, b) = v
-                        break
-
-            elif depth_model.casefold() in swave_model_list:
-                depth_model_params = depth_model.casefold()
-
-            elif depth_model.casefold() == "all":
-                depth_model_params = depth_model.casefold()
-
-            else:   # parameters a and b could be passed in as a parsable string
-                depth_model_params = depth_model.split(',')
-                # Work on re update[int(s) for s in re.findall(r"[-+]?(?:\d*\.*\d+)", 
-                # depth_model)]  #figure this out later for floating points; works for integers
-                (a, b) = depth_model_params
-                if a == 0 or b == 0:
-                    raise ValueError("Parameters cannot be zero, check model inputs")            
-
-        # Standardize b as positive for input to function
-        if b < 0:
-            b = b * -1
-        
-        depth_model = (a, b)
-
     # Get frequency input
     # Checking if freq_input is HVSRData object
     if isinstance(freq_input, (sprit_hvsr.HVSRData, str, bytes, os.PathLike, float, int)):
@@ -353,49 +377,42 @@ def calculate_depth(freq_input,
                 newBatchList.append(calculate_depth(freq_input=freq_input[site], **calc_depth_kwargs))
             return sprit_hvsr.HVSRBatch(newBatchList, df_as_read=freq_input.input_df)
 
-        # Calibrate data
-        pf_values = tableReport[freq_col].values
-
-        calib_data = []
-        depthModelList = []
-        depthModelTypeList = []
+        # Calibrate data (all peaks of the table at once)
+        pf_values = np.asarray(tableReport[freq_col].values, dtype=float)
 
-        for site_peak_freq in pf_values:
-            try:
-                if str(depth_model).lower() in swave_model_list:
-                    calib_data.append(swave_velocity/(4*site_peak_freq))
+        try:
+            if str(depth_model).lower() in swave_model_list:
+                # Quarter wavelength depth (Vs/4f) is a power law with a=Vs/4 and b=1
+                (a, b) = (swave_velocity/4, 1)
+                if depth_model_in_latex:
+                    depthModelList = [f"$\\frac{{{swave_velocity}}}{{4\\times{site_peak_freq}}}$" for site_peak_freq in pf_values]
+                else:
+                    depthModelList = [f"{swave_velocity}/(4 * {site_peak_freq})" for site_peak_freq in pf_values]
+                depthModelTypeList = ['Quarter Wavelength'] * pf_values.shape[0]
+            else:
+                if str(depth_model).lower() in ["all", 'average', 'conglomerate']:
+                    (a, b) = CONGLOMERATE_MODEL
+                else:
+                    (a, b) = depth_model
 
-                    if depth_model_in_latex:
-                        dModelStr = f"$\\frac{{{swave_velocity}}}{{4\\times{site_peak_freq}}}$"
-                    else:
-                        dModelStr = f"{swave_velocity}/(4 * {site_peak_freq})"
-                    depthModelList.append(dModelStr)
-                    depthModelTypeList.append('Quarter Wavelength')
+                if depth_model_in_latex:
+                    depthModelList = [f"{a} \\times {{{site_peak_freq}}}^{{-{b}}}" for site_peak_freq in pf_values]
                 else:
-                    if str(depth_model).lower() in ["all", 'average', 'conglomerate']:
-                        (a, b) = CONGLOMERATE_MODEL
-                    else:
-                        (a, b) = depth_model
-                    calib_data.append(a*(site_peak_freq**-b))
-                    if hasattr(freq_input, 'x_freqs'):
-                        freq_input['x_depth_m'] = {'Z': np.around([a*(f**-b) for f in freq_input["x_freqs"]['Z']], decimal_places),
-                                                   'E': np.around([a*(f**-b) for f in freq_input["x_freqs"]['E']], decimal_places),
-                                                   'N': np.around([a*(f**-b) for f in freq_input["x_freqs"]['N']], decimal_places)}
-
-                        # Calculate depth in feet
-                        freq_input['x_depth_ft'] = {'Z': np.around(freq_input['x_depth_m']['Z']*3.281, decimal_places),
-                                                    'E': np.around(freq_input['x_depth_m']['E']*3.281, decimal_places),
-                                                    'N': np.around(freq_input['x_depth_m']['N']*3.281, decimal_places)}
-
-                    if depth_model_in_latex:
-                        dModelStr = f"{a} \\times {{{site_peak_freq}}}^{{-{b}}}"
-                    else:
-                        dModelStr = f"{a} * {site_peak_freq}^-{b}"
-                    depthModelList.append(dModelStr)
-                    depthModelTypeList.append('Power Law')
+                    depthModelList = [f"{a} * {site_peak_freq}^-{b}" for site_peak_freq in pf_values]
+                depthModelTypeList = ['Power Law'] * pf_values.shape[0]
 
-            except Exception as e:
-                raise ValueError("Error in calculating depth, check HVSRData object for empty values or missing columns") from e
+            calib_data = a*(pf_values**-b)
+
+            # Depth axis is only calculated once for each unique frequency array (usually shared by all components)
+            if hasattr(freq_input, 'x_freqs'):
+                freq_input['x_depth_m'] = {comp: __get_depth_axis(freq_input["x_freqs"][comp], a, b, decimal_places)
+                                           for comp in ['Z', 'E', 'N']}
+
+                # Calculate depth in feet
+                freq_input['x_depth_ft'] = __apply_once_per_axis(freq_input['x_depth_m'],
+                                                                 lambda depthAxis: np.around(depthAxis*3.281, decimal_places))
+        except Exception as e:
+            raise ValueError("Error in calculating depth, check HVSRData object for empty values or missing columns") from e
 
         # Record depth data in table
         tableReport[bedrock_depth_data] = np.around(calib_data, decimal_places)
@@ -404,9 +421,9 @@ def calculate_depth(freq_input,
         if calculate_elevation and surface_elevation_data in tableReport.columns:
             tableReport[bedrock_elevation_data] = np.around((np.float32(tableReport.loc[:, surface_elevation_data]) - np.float32(tableReport.loc[:, bedrock_depth_data])), decimal_places)
             if hasattr(freq_input, 'x_depth_m'):
-                freq_input['x_elev_m'] = {'Z': np.around([float(tableReport[surface_elevation_data].values[0]) - float(f) for f in freq_input["x_depth_m"]['Z']], decimal_places),
-                                          'E': np.around([float(tableReport[surface_elevation_data].values[0]) - float(f) for f in freq_input["x_depth_m"]['E']], decimal_places),
-                                          'N': np.around([float(tableReport[surface_elevation_data].values[0]) - float(f) for f in freq_input["x_depth_m"]['N']], decimal_places)}
+                surfElev = float(tableReport[surface_elevation_data].values[0])
+                freq_input['x_elev_m'] = __apply_once_per_axis(freq_input['x_depth_m'],
+                                                               lambda depthAxis: np.around(surfElev - depthAxis, decimal_places))
 
         if calculate_depth_in_feet:
             tableReport[bedrock_depth_data+'_ft'] = np.around(calib_data*3.281,
@@ -414,11 +431,6 @@ def calculate_depth(freq_input,
             if calculate_elevation and surface_elevation_data in tableReport.columns:
                 tableReport[bedrock_elevation_data+'_ft'] = np.around(tableReport[bedrock_elevation_data] * 3.281,
                                                                 decimals=decimal_places)
-                if hasattr(freq_input, 'x_elev_m') and not hasattr(freq_input['x_depth_ft']):
-                    # Calculate depth in feet
-                    freq_input['x_depth_ft'] = {'Z': np.around(freq_input['x_depth_m']['Z']*3.281, decimal_places),
-                                                'E': np.around(freq_input['x_depth_m']['E']*3.281, decimal_places),
-                                                'N': np.around(freq_input['x_depth_m']['N']*3.281, decimal_places)}
 
         tableReport["DepthModel"] = depthModelList
         tableReport["DepthModelType"] = depthModelTypeList
@@ -517,7 +529,7 @@ def calculate_depth(freq_input,
 
 def calibrate(calib_filepath, calib_type="power", peak_freq_col="PeakFrequency", calib_depth_col="Bedrock_Depth", 
             outlier_radius=None, xcoord_col='xcoord', ycoord_col='ycoord', bedrock_type=None,
-            show_calibration_plot=True):
+            show_calibration_plot=True, site_coords=None):
     
     """The calibrate function allows input of table with f0 and known depths to generate a power-law regression relationship.
 
@@ -530,7 +542,12 @@ def calibrate(calib_filepath, calib_type="power", peak_freq_col="PeakFrequency",
         Which calibration to use. Currently only power-law is supported, by default "power"
     outlier_radius : None or float, optional
         Radius (in CRS of coordinates) within which to use the points for calibration, by default None.
-        Not currently supported.
+        Points are selected within this radius of site_coords, which must also be specified.
+        See also calibrate_local() for a separate calibration for each site.
+    xcoord_col : str, optional
+        Which column in calib_filepath to use for x coordinates (used with outlier_radius), by default 'xcoord'
+    ycoord_col : str, optional
+        Which column in calib_filepath to use for y coordinates (used with outlier_radius), by default 'ycoord'
     bedrock_type : str or None, optional
         Bedrock type by which to select which points to use for calibration, by default None.
         Not currently supported.
@@ -540,6 +557,9 @@ def calibrate(calib_filepath, calib_type="power", peak_freq_col="PeakFrequency",
         Which column in calib_filepath to use for depth values, by default "Bedrock_Depth"
     show_calibration_plot : bool, optional
         Whether to show the calibration plot, by default True
+    site_coords : None or tuple, optional
+        Coordinates (x, y) of the site around which to select points within outlier_radius, 
+        in the same CRS as xcoord_col and ycoord_col, by default None.
 
     Returns
     -------
@@ -561,6 +581,17 @@ def calibrate(calib_filepath, calib_type="power", peak_freq_col="PeakFrequency",
 
     depthDataDF = pd.read_csv(calib_filepath)
 
+    # Only use points within outlier_radius of the site
+    if outlier_radius is not None:
+        if site_coords is None:
+            warn("outlier_radius requires site_coords to be specified, all points will be used for calibration.")
+        else:
+            calibTree, treeInds = __build_calibration_tree(depthDataDF[xcoord_col], depthDataDF[ycoord_col])
+            nearInds = treeInds[calibTree.query_ball_point(np.asarray(site_coords, dtype=float), r=outlier_radius)]
+            depthDataDF = depthDataDF.iloc[np.sort(nearInds)]
+            if depthDataDF.shape[0] < 2:
+                raise ValueError(f"Only {depthDataDF.shape[0]} calibration points within outlier_radius={outlier_radius} of {site_coords}, at least 2 are needed for calibration.")
+
     depths = depthDataDF[calib_depth_col]
     freqs = depthDataDF[peak_freq_col]
 
@@ -658,3 +689,315 @@ def hvsrPowerLaw(f0, a, b):
     calibration_vals = tuple(popt)
 
     return calibration_vals
+
+
+def calibrate_models(calib_data, peak_freq_col="PeakFrequency", calib_depth_col="Bedrock_Depth", group_by=None,
+                     leave_one_out=False, n_bootstrap=1000, confidence_level=0.95, random_seed=None, verbose=False):
+    """Fit power-law frequency-depth models to all points and to subsets of calibration data at once.
+
+    Each model is a least-squares fit of log10(depth) = log10(a) + b * log10(f0). All models are fit in a single matrix operation, 
+    so many subsets (e.g., per bedrock type, per county) can be fit quickly.
+
+    Parameters
+    ----------
+    calib_data : pathlike object or pandas.DataFrame
+        Path to file readable by pandas.read_csv() (or DataFrame) with a column for frequencies and a column for depths.
+    peak_freq_col : str, optional
+        Which column in calib_data to use for fundamental frequency values, by default "PeakFrequency"
+    calib_depth_col : str, optional
+        Which column in calib_data to use for depth values, by default "Bedrock_Depth"
+    group_by : str, list, or None, optional
+        Column name(s) in calib_data by which to group points. A model is fit for each group, in addition to all points together.
+        By default None (only fit all points together).
+    leave_one_out : bool, optional
+        Whether to do leave-one-out cross-validation of each model (within its own points), by default False
+    n_bootstrap : int, optional
+        Number of bootstrap resamples used for confidence intervals of a and b. If 0, confidence intervals are not calculated. By default 1000.
+    confidence_level : float, optional
+        Confidence level of bootstrap confidence intervals, by default 0.95
+    random_seed : int or None, optional
+        Seed for the random number generator used for bootstrap resampling, by default None
+    verbose : bool, optional
+        Whether to print information about the calibration to the terminal, by default False
+
+    Returns
+    -------
+    pandas.DataFrame
+        Table with one row per model (index is "All" or the name of the group). 
+        Columns include a and b (depth = a * f0^b), number of points, r-squared and RMSE (in log10 units of depth),
+        and, if calculated, bootstrap confidence intervals and leave-one-out RMSE.
+        Each row can be used directly as the depth_model parameter of calculate_depth(), e.g., depth_model=models.loc['All']
+    """
+    if isinstance(calib_data, pd.DataFrame):
+        depthDataDF = calib_data.copy()
+    else:
+        depthDataDF = pd.read_csv(calib_data)
+
+    freqs = pd.to_numeric(depthDataDF[peak_freq_col], errors='coerce').to_numpy(dtype=float)
+    depths = pd.to_numeric(depthDataDF[calib_depth_col], errors='coerce').to_numpy(dtype=float)
+
+    # Only points with positive frequency and depth can be used for log-log regression
+    validPts = np.isfinite(freqs) & np.isfinite(depths) & (freqs > 0) & (depths > 0)
+    if verbose and not np.all(validPts):
+        print(f"\t{np.sum(~validPts)} points with missing, zero, or negative frequency or depth values are not used for calibration")
+    depthDataDF = depthDataDF[validPts].reset_index(drop=True)
+    logFreqs = np.log10(freqs[validPts])
+    logDepths = np.log10(depths[validPts])
+
+    # Each row of subsetMasks selects the points of one model
+    modelNames = ['All']
+    subsetMasks = [np.ones(logFreqs.shape[0], dtype=bool)]
+    if group_by is not None:
+        if isinstance(group_by, str):
+            group_by = [group_by]
+        for groupName, groupInds in depthDataDF.groupby(list(group_by)).indices.items():
+            if isinstance(groupName, tuple):
+                groupName = ' / '.join([str(gn) for gn in groupName])
+            groupMask = np.zeros(logFreqs.shape[0], dtype=bool)
+            groupMask[groupInds] = True
+            modelNames.append(str(groupName))
+            subsetMasks.append(groupMask)
+    subsetMasks = np.array(subsetMasks)
+
+    # Fit all models at once
+    logA, b = __fit_log_power_laws(logFreqs, logDepths, subsetMasks)
+    nPoints = subsetMasks.sum(axis=1)
+
+    residuals = logDepths[np.newaxis, :] - (logA[:, np.newaxis] + b[:, np.newaxis] * logFreqs[np.newaxis, :])
+    meanLogDepths = (subsetMasks @ logDepths) / nPoints
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rss = np.sum(subsetMasks * residuals**2, axis=1)
+        tss = np.sum(subsetMasks * (logDepths[np.newaxis, :] - meanLogDepths[:, np.newaxis])**2, axis=1)
+        rSquared = 1 - rss/tss
+        rmse = np.sqrt(rss/nPoints)
+
+    modelTable = pd.DataFrame({'a': 10**logA,
+                               'b': b,
+                               'n_points': nPoints,
+                               'r_squared': rSquared,
+                               'rmse_log10': rmse},
+                              index=pd.Index(modelNames, name='Model'))
+
+    # Bootstrap confidence intervals (resampled points of each model are drawn as an index matrix, one row per resample)
+    if n_bootstrap is not None and n_bootstrap > 0:
+        rng = np.random.default_rng(random_seed)
+        ciPercentiles = [(1 - confidence_level) / 2 * 100, (1 - (1 - confidence_level) / 2) * 100]
+        ciCols = {'a_ci_low': [], 'a_ci_high': [], 'b_ci_low': [], 'b_ci_high': []}
+        for subsetMask in subsetMasks:
+            subsetInds = np.flatnonzero(subsetMask)
+            nSubset = subsetInds.shape[0]
+            if nSubset < 3:
+                for col in ciCols:
+                    ciCols[col].append(np.nan)
+                continue
+
+            resampleInds = rng.integers(0, nSubset, size=(n_bootstrap, nSubset))
+            # Convert resampled indices to counts of each point in each resample (used as weights)
+            resampleCounts = np.bincount((resampleInds + np.arange(n_bootstrap)[:, np.newaxis] * nSubset).ravel(),
+                                         minlength=n_bootstrap * nSubset).reshape(n_bootstrap, nSubset)
+            bootLogA, bootB = __fit_log_power_laws(logFreqs[subsetInds], logDepths[subsetInds], resampleCounts)
+
+            aCI = np.nanpercentile(10**bootLogA, ciPercentiles)
+            bCI = np.nanpercentile(bootB, ciPercentiles)
+            ciCols['a_ci_low'].append(aCI[0])
+            ciCols['a_ci_high'].append(aCI[1])
+            ciCols['b_ci_low'].append(bCI[0])
+            ciCols['b_ci_high'].append(bCI[1])
+
+        for col, vals in ciCols.items():
+            modelTable[col] = vals
+
+    # Leave-one-out validation (one fit for each point of each model, all fit at once)
+    if leave_one_out:
+        looModel, looPoint = np.nonzero(subsetMasks)
+        looMasks = subsetMasks[looModel].copy()
+        looMasks[np.arange(looPoint.shape[0]), looPoint] = False
+        looLogA, looB = __fit_log_power_laws(logFreqs, logDepths, looMasks)
+        looResiduals = logDepths[looPoint] - (looLogA + looB * logFreqs[looPoint])
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            looSqErr = np.bincount(looModel, weights=np.nan_to_num(looResiduals**2, nan=0.0), minlength=len(modelNames))
+            looCount = np.bincount(looModel, weights=np.isfinite(looResiduals), minlength=len(modelNames))
+            modelTable['loo_rmse_log10'] = np.sqrt(looSqErr/looCount)
+
+    if verbose:
+        print(modelTable.to_string())
+
+    return modelTable
+
+
+def calibrate_local(site_data, calib_data, k_neighbors=10, outlier_radius=None, min_neighbors=3,
+                    peak_freq_col="PeakFrequency", calib_depth_col="Bedrock_Depth", xcoord_col='xcoord', ycoord_col='ycoord',
+                    site_freq_col="Peak", site_xcoord_col='xcoord', site_ycoord_col='ycoord', verbose=False):
+    """Fit a local power-law frequency-depth model for each site using only the nearest calibration points (e.g., wells).
+
+    Calibration points are indexed using a KD-tree, so the nearest points to each site are found quickly, 
+    even for many sites and many calibration points. The local models of all sites are then fit at once.
+    Sites with fewer than min_neighbors calibration points nearby use a regional model fit to all calibration points.
+
+    Parameters
+    ----------
+    site_data : HVSRData, HVSRBatch, pathlike object, or pandas.DataFrame
+        Sites for which to calculate local models. If a table, it should have columns for frequency and coordinates.
+        If HVSRData or HVSRBatch, the coordinates (xcoord, ycoord) and peak frequency of each site are used.
+    calib_data : pathlike object or pandas.DataFrame
+        Path to file readable by pandas.read_csv() (or DataFrame) with columns for frequencies, depths, and coordinates.
+    k_neighbors : int, optional
+        Maximum number of (nearest) calibration points to use for each site, by default 10
+    outlier_radius : None or float, optional
+        Radius (in CRS of coordinates) within which to use the points for calibration of each site, by default None (no limit).
+    min_neighbors : int, optional
+        Minimum number of calibration points needed for a local model. 
+        Sites with fewer points within outlier_radius use the regional model, by default 3
+    peak_freq_col : str, optional
+        Which column in calib_data to use for fundamental frequency values, by default "PeakFrequency"
+    calib_depth_col : str, optional
+        Which column in calib_data to use for depth values, by default "Bedrock_Depth"
+    xcoord_col : str, optional
+        Which column in calib_data to use for x coordinates, by default 'xcoord'
+    ycoord_col : str, optional
+        Which column in calib_data to use for y coordinates, by default 'ycoord'
+    site_freq_col : str, optional
+        Which column of site_data to use for frequency (or of the Table_Report, if HVSRData/HVSRBatch), by default "Peak"
+    site_xcoord_col : str, optional
+        Which column of site_data to use for x coordinates (if table), by default 'xcoord'
+    site_ycoord_col : str, optional
+        Which column of site_data to use for y coordinates (if table), by default 'ycoord'
+    verbose : bool, optional
+        Whether to print information about the calibration to the terminal, by default False
+
+    Returns
+    -------
+    pandas.DataFrame
+        Table with one row per site with the local model (a and b, where depth = a * f0^b), 
+        the number of calibration points used and the distance to the farthest one, 
+        whether the model is "local" or "regional", and the depth calculated at the site.
+        Each row can be used directly as the depth_model parameter of calculate_depth().
+    """
+    # Get calibration points
+    if isinstance(calib_data, pd.DataFrame):
+        depthDataDF = calib_data.copy()
+    else:
+        depthDataDF = pd.read_csv(calib_data)
+
+    freqs = pd.to_numeric(depthDataDF[peak_freq_col], errors='coerce').to_numpy(dtype=float)
+    depths = pd.to_numeric(depthDataDF[calib_depth_col], errors='coerce').to_numpy(dtype=float)
+    validPts = np.isfinite(freqs) & np.isfinite(depths) & (freqs > 0) & (depths > 0)
+    if verbose and not np.all(validPts):
+        print(f"\t{np.sum(~validPts)} points with missing, zero, or negative frequency or depth values are not used for calibration")
+    depthDataDF = depthDataDF[validPts]
+
+    calibTree, treeInds = __build_calibration_tree(depthDataDF[xcoord_col], depthDataDF[ycoord_col])
+    logFreqs = np.log10(freqs[validPts][treeInds])
+    logDepths = np.log10(depths[validPts][treeInds])
+    nCalibPts = treeInds.shape[0]
+    if nCalibPts < 2:
+        raise ValueError(f"Only {nCalibPts} calibration points with valid coordinates, frequency and depth, at least 2 are needed for calibration.")
+
+    # Get sites
+    if isinstance(site_data, (sprit_hvsr.HVSRData, sprit_hvsr.HVSRBatch)):
+        if isinstance(site_data, sprit_hvsr.HVSRData):
+            hvDataList = [site_data]
+        else:
+            hvDataList = [site_data[site] for site in site_data]
+        siteDF = pd.DataFrame({'Site Name': [hvData['site'] for hvData in hvDataList],
+                               'xcoord': [hvData['xcoord'] for hvData in hvDataList],
+                               'ycoord': [hvData['ycoord'] for hvData in hvDataList],
+                               'PeakFrequency': [hvData['Table_Report'][site_freq_col].iloc[0] for hvData in hvDataList]})
+    else:
+        if isinstance(site_data, pd.DataFrame):
+            siteInDF = site_data
+        else:
+            siteInDF = pd.read_csv(site_data)
+        siteDF = pd.DataFrame({'xcoord': siteInDF[site_xcoord_col].to_numpy(),
+                               'ycoord': siteInDF[site_ycoord_col].to_numpy(),
+                               'PeakFrequency': siteInDF[site_freq_col].to_numpy()},
+                              index=siteInDF.index)
+        if 'Site Name' in siteInDF.columns:
+            siteDF.insert(0, 'Site Name', siteInDF['Site Name'].to_numpy())
+    siteXY = np.column_stack([pd.to_numeric(siteDF['xcoord'], errors='coerce').to_numpy(dtype=float),
+                              pd.to_numeric(siteDF['ycoord'], errors='coerce').to_numpy(dtype=float)])
+    siteFreqs = pd.to_numeric(siteDF['PeakFrequency'], errors='coerce').to_numpy(dtype=float)
+    validSites = np.all(np.isfinite(siteXY), axis=1)
+
+    # Query nearest calibration points of all sites at once (missing neighbors are returned with index nCalibPts)
+    kNeighbors = min(k_neighbors, nCalibPts)
+    if outlier_radius is None:
+        outlier_radius = np.inf
+    nbrDists = np.full((siteXY.shape[0], kNeighbors), np.inf)
+    nbrInds = np.full((siteXY.shape[0], kNeighbors), nCalibPts)
+    if np.any(validSites):
+        qDists, qInds = calibTree.query(siteXY[validSites], k=kNeighbors, distance_upper_bound=outlier_radius)
+        nbrDists[validSites] = np.reshape(qDists, (-1, kNeighbors))
+        nbrInds[validSites] = np.reshape(qInds, (-1, kNeighbors))
+    nbrMask = nbrInds < nCalibPts
+    nNeighbors = nbrMask.sum(axis=1)
+
+    # Fit local models of all sites at once (padded value at index nCalibPts is never used, since its weight is 0)
+    paddedLogFreqs = np.append(logFreqs, 0.0)
+    paddedLogDepths = np.append(logDepths, 0.0)
+    localLogA, localB = __fit_log_power_laws(paddedLogFreqs[nbrInds], paddedLogDepths[nbrInds], nbrMask)
+    regionalLogA, regionalB = __fit_log_power_laws(logFreqs, logDepths, np.ones((1, nCalibPts)))
+
+    useLocal = (nNeighbors >= max(min_neighbors, 2)) & np.isfinite(localLogA) & np.isfinite(localB)
+    modelA = np.where(useLocal, 10**localLogA, 10**regionalLogA[0])
+    modelB = np.where(useLocal, localB, regionalB[0])
+
+    siteDF['n_neighbors'] = nNeighbors
+    siteDF['max_neighbor_distance'] = np.where(nNeighbors > 0, np.max(np.where(nbrMask, nbrDists, -np.inf), axis=1), np.nan)
+    siteDF['a'] = modelA
+    siteDF['b'] = modelB
+    siteDF['model'] = np.where(useLocal, 'local', 'regional')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        siteDF['BedrockDepth'] = modelA * siteFreqs**modelB
+
+    if verbose:
+        print(f"\t{np.sum(useLocal)} of {siteDF.shape[0]} sites calibrated with local models ({nCalibPts} calibration points)")
+        print(siteDF.to_string())
+
+    return siteDF
+
+
+# Helper function to build a spatial index (KD-tree) of calibration point coordinates
+def __build_calibration_tree(xcoords, ycoords):
+    """Build KD-tree of points with valid coordinates
+
+    Returns
+    -------
+    tuple
+        Tuple (scipy.spatial.cKDTree, numpy.ndarray), where the array contains the (positional) index of each point in the tree
+    """
+    calibXY = np.column_stack([pd.to_numeric(pd.Series(xcoords), errors='coerce').to_numpy(dtype=float),
+                               pd.to_numeric(pd.Series(ycoords), errors='coerce').to_numpy(dtype=float)])
+    treeInds = np.flatnonzero(np.all(np.isfinite(calibXY), axis=1))
+    return spatial.cKDTree(calibXY[treeInds]), treeInds
+
+
+# Helper function to fit many power laws at once using weighted log-log least squares
+def __fit_log_power_laws(log_freqs, log_depths, weights):
+    """Fit log10(depth) = log10(a) + b * log10(f0) for each row of weights (shape: n_models x n_points)
+
+    log_freqs and log_depths are either shared by all models (1D), or have one row for each model (same shape as weights).
+
+    Returns
+    -------
+    tuple
+        Tuple of numpy.ndarrays (log10(a), b), each with one value per model
+    """
+    weights = np.asarray(weights, dtype=float)
+    nPts = weights.sum(axis=1)
+    if np.ndim(log_freqs) == 1:
+        sumX = weights @ log_freqs
+        sumY = weights @ log_depths
+        sumXX = weights @ (log_freqs**2)
+        sumXY = weights @ (log_freqs * log_depths)
+    else:
+        sumX = np.sum(weights * log_freqs, axis=1)
+        sumY = np.sum(weights * log_depths, axis=1)
+        sumXX = np.sum(weights * log_freqs**2, axis=1)
+        sumXY = np.sum(weights * log_freqs * log_depths, axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        b = (nPts * sumXY - sumX * sumY) / (nPts * sumXX - sumX**2)
+        logA = (sumY - b * sumX) / nPts
+    return logA, b
@@ -6,22 +6,22 @@
 See documentation for individual functions for more information.
 """
 import base64
+import concurrent.futures
 import copy
 import datetime
+import functools
 import gzip
 import inspect
 import io
 import json
 import math
 import numbers
-import operator
 import os
 import pathlib
 import pickle
 import importlib
 import re
 import requests
-import struct
 import sys
 import tempfile
 import traceback
@@ -32,6 +32,7 @@
 
 import matplotlib
 from matplotlib.backend_bases import MouseButton
+from matplotlib.backends.backend_pdf import PdfPages
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import numpy as np
@@ -40,8 +41,7 @@
 import pandas as pd
 from pyproj import CRS, Transformer
 import scipy
-from scipy.spatial.distance import squareform, pdist
-from xhtml2pdf import pisa
+from scipy.spatial.distance import cdist
 
 from . import sprit_utils
 from . import sprit_jupyter_UI
@@ -57,6 +57,7 @@
                  'SAC', 'SACXY', 'SEG2', 'SEGY', 'SEISAN', 'SH_ASC', 'SLIST', 'TRC',
                  'SU', 'TSPAIR', 'WAV', 'WIN', 'Y']
 PLOT_KEYS = ["Input_Plot", "Outlier_Plot", "Plot_Report", "Depth_Plot", "Plot_Report"]
+RS_INDEX_FILENAME = 'sprit_rs_index.json'
 RESOURCE_DIR = pathlib.Path(str(importlib.resources.files('sprit'))).joinpath('resources')
 
 with open(RESOURCE_DIR.joinpath('defaults.json'), 'r') as fp:
@@ -70,10 +71,12 @@
 global spritApp
 
 # Predefined variables
-max_rank = 0
 global do_run
 do_run = False
 
+# Indexes of Raspberry Shake archive directories (kept in memory, and saved as RS_INDEX_FILENAME in each archive)
+_rs_archive_indexes = {}
+
 sampleListNos = ['1', '2', '3', '4', '5', '6', '7', '8', '9', '10', '11', '12', '13', '14']
 SAMPLE_LIST = ['1', '2', '3', '4', '5', '6', '7', '8', '9', '10', '11', '12', '13', '14',
                'batch', 'sample', 'sample_batch']
@@ -92,6 +95,9 @@
                     'batch': SAMPLE_DATA_DIR.joinpath('Batch_SampleData.csv'),
                     'sample_batch': SAMPLE_DATA_DIR.joinpath('Batch_SampleData.csv')}
 
+# Figures (and axes) reused by plot_hvsr(reuse_fig=True), keyed by subplot layout
+_plot_templates = {}
+
 
 # CLASSES
 # Check if the data is already the right class
@@ -1774,11 +1780,8 @@ def run(input_data=None, source='file',
                 for site_name in hvsr_results_interim.keys():  # This should work more or less the same for batch and regular data now
                     # Check if data has azimuth data
                     hasAz = False
-                    if 'stream' in hvsr_results_interim[site_name].keys():
-                        for tr in hvsr_results_interim[site_name]['stream']:
-                            if tr.stats.component == 'R':
-                                hasAz = True
-                                break
+                    if 'azimuths' in hvsr_results_interim[site_name].keys():
+                        hasAz = len(hvsr_results_interim[site_name]['azimuths']) > 0
 
                     # Assuming all sites in batch have az if one does
                     if hasAz:
@@ -1793,8 +1796,8 @@ def run(input_data=None, source='file',
                     get_report_kwargs['plot_type'] = get_report_kwargs['plot_type'] + ' az'
 
             azimuth = 'HV'
-            if hasAz and len(hvsr_results.stream.select(component='R')) > 0:
-                get_report_kwargs['azimuth'] = 'AZ'+hvsr_results.stream.select(component='R')[0].stats.location
+            if hasAz and 'azimuths' in hvsr_results.keys() and len(hvsr_results['azimuths']) > 0:
+                get_report_kwargs['azimuth'] = list(hvsr_results['azimuths'].keys())[0]
 
             if skip_steps is None or ('get_report' not in skip_steps and 'report' not in skip_steps):
                 hvsr_results = get_report(hvsr_results=hvsr_results, verbose=verbose, **get_report_kwargs)
@@ -2269,7 +2272,7 @@ def calculate_azimuth(hvsr_data, azimuth_angle=45, azimuth_type='multiple', azim
                       show_az_plot=False, verbose=False, **plot_azimuth_kwargs):
     """Function to calculate azimuthal horizontal component at specified angle(s).
 
-       Adds each new horizontal component as a radial component to obspy.Stream object at hvsr_data['stream']
+       Azimuthal components are not calculated as time series; each azimuth is stored as its angle and component weights in hvsr_data['azimuths']
 
     Parameters
     ----------
@@ -2294,8 +2297,10 @@ def calculate_azimuth(hvsr_data, azimuth_angle=45, azimuth_type='multiple', azim
     Returns
     -------
     HVSRData
-        Updated HVSRData object specified in hvsr_data with hvsr_data['stream'] attribute containing additional components (EHR-***),
+        Updated HVSRData object with hvsr_data['azimuths'] attribute containing a dictionary with an entry for each azimuth (AZ***),
         with *** being zero-padded (3 digits) azimuth angle in degrees.
+        Each entry contains the angle (in degrees and radians) and the weights applied to the N and E components.
+        No additional traces are added to hvsr_data['stream']; azimuthal spectra are calculated in generate_psds().
     """
     # Get intput paramaters
     orig_args = locals().copy()
@@ -2422,70 +2427,23 @@ def calculate_azimuth(hvsr_data, azimuth_angle=45, azimuth_type='multiple', azim
             warnings.warn(f"azimuth_type={azimuth_type} not supported. Try 'multiple' or 'single'. No azimuthal analysis run.")
             return hvsr_data
 
-        if isinstance(hvsr_data, (HVSRData, dict)):
-            zComp = hvsr_data['stream'].select(component='Z').merge()
-            eComp = hvsr_data['stream'].select(component='E').merge()
-            nComp = hvsr_data['stream'].select(component='N').merge()
-        elif isinstance(hvsr_data, obspy.Stream):
-            zComp = hvsr_data.select(component='Z').merge()
-            eComp = hvsr_data.select(component='E').merge()
-            nComp = hvsr_data.select(component='N').merge()
-
-        # Reset stats for original data too
-        zComp[0].stats['azimuth_deg'] = 0
-        eComp[0].stats['azimuth_deg'] = 90
-        nComp[0].stats['azimuth_deg'] = 0
-
-        zComp[0].stats['azimuth_rad'] = 0
-        eComp[0].stats['azimuth_rad'] = np.pi/2
-        nComp[0].stats['azimuth_rad'] = 0
-
-        zComp[0].stats['location'] = '000'
-        eComp[0].stats['location'] = '090'
-        nComp[0].stats['location'] = '000'
-
-        statsDict = {}
-        for key, value in eComp[0].stats.items():
-            statsDict[key] = value
+        # Azimuths are stored lazily as the angle and the weights of the N and E components
+        #  (H(az) = N*cos(az) + E*sin(az)); azimuthal spectra are calculated from these in generate_psds()
+        if 'azimuths' not in hvsr_data.keys() or not isinstance(hvsr_data['azimuths'], dict):
+            hvsr_data['azimuths'] = {}
 
         for i, az_rad in enumerate(azimuth_list):
             az_deg = azimuth_list_deg[i]
-            statsDict['location'] = f"{str(round(az_deg, 0)).zfill(3)}"  # Change location name
-            statsDict['channel'] = "EHR"  # -{str(round(az_deg,0)).zfill(3)}" #Change channel name
-            statsDict['azimuth_deg'] = az_deg
-            statsDict['azimuth_rad'] = az_rad
-
-            hasMask = [False, False]
-            if np.ma.is_masked(nComp[0].data):
-                nData = nComp[0].data.data
-                nMask = nComp[0].data.mask
-                hasMask[0] = True
-            else:
-                nData = nComp[0].data
-                nMask = [True] * len(nData)
-
-            if np.ma.is_masked(eComp[0].data):
-                eData = eComp[0].data.data
-                eMask = eComp[0].data.mask
-                hasMask[1] = True
-            else:
-                eData = eComp[0].data
-                eMask = [True] * len(eData)
-
-            # From hvsrpy: horizontal = self.ns._amp * math.cos(az_rad) + self.ew._amp*math.sin(az_rad)
-            if True in hasMask:
-                radial_comp_data = np.ma.array(np.add(nData * np.cos(az_rad), eData * np.sin(az_rad)), mask=list(map(operator.and_, nMask, eMask)))
-            else:
-                radial_comp_data = np.add(nData * np.cos(az_rad), eData * np.sin(az_rad))
-
-            radial_trace = obspy.Trace(data=radial_comp_data, header=statsDict)
-            hvsr_data['stream'].append(radial_trace)
+            azKey = "AZ" + str(int(round(float(az_deg)))).zfill(3)
+            hvsr_data['azimuths'][azKey] = {'azimuth_deg': float(az_deg),
+                                            'azimuth_rad': float(az_rad),
+                                            'weights': (float(np.cos(az_rad)), float(np.sin(az_rad)))}
 
     # Verbose printing
     if verbose and not isinstance(hvsr_data, HVSRBatch):
-        dataINStr = hvsr_data.stream.__str__().split('\n')
-        for line in dataINStr:
-            print('\t\t', line)
+        print('\t\tAzimuths (N weight, E weight):')
+        for azKey, azDict in hvsr_data['azimuths'].items():
+            print('\t\t ', azKey, tuple(round(w, 4) for w in azDict['weights']))
 
     if show_az_plot:
         hvsr_data['Azimuth_Fig'] = plot_azimuth(hvsr_data=hvsr_data, **plot_azimuth_kwargs)
@@ -2632,7 +2590,7 @@ def check_peaks(hvsr_data, hvsr_band=DEFAULT_BAND, peak_selection='max', peak_fr
             hvsrp = hvsr_data['hvsrp'][col_id]  # Calculated based on "Use" column
             hvsrm = hvsr_data['hvsrm'][col_id]  # Calculated based on "Use" column
 
-            hvsrPeaks = hvsr_data['hvsr_windows_df'][hvsr_data['hvsr_windows_df']['Use']]['CurvesPeakIndices_'+col_id]
+            hvsrPeaks, hvsrPeakOffsets = _get_ind_peaks(hvsr_data, col_id, use_only=True)
 
             hvsr_log_std = hvsr_data['hvsr_log_std'][col_id]
             peak_freq_range = hvsr_data['peak_freq_range']
@@ -2641,7 +2599,7 @@ def check_peaks(hvsr_data, hvsr_band=DEFAULT_BAND, peak_selection='max', peak_fr
             peak = __init_peaks(x, y, index_list, hvsr_band, peak_freq_range, _min_peak_amp=0.5)
 
             peak = __check_curve_reliability(hvsr_data, peak, col_id)
-            peak = __check_clarity(x, y, peak, do_rank=True)
+            peak = __check_clarity(x, y, peak)
 
             # Do for hvsrp
             # Find  the relative extrema of hvsrp (hvsr + 1 standard deviation)
@@ -2650,8 +2608,8 @@ def check_peaks(hvsr_data, hvsr_band=DEFAULT_BAND, peak_selection='max', peak_fr
             else:
                 index_p = list()
 
+            # Only the peak frequencies of hvsrp and hvsrm are needed (for the frequency stability test)
             peakp = __init_peaks(x, hvsrp, index_p, hvsr_band, peak_freq_range, _min_peak_amp=1)
-            peakp = __check_clarity(x, hvsrp, peakp, do_rank=True)
 
             # Do for hvsrm
             # Find  the relative extrema of hvsrm (hvsr - 1 standard deviation)
@@ -2661,13 +2619,12 @@ def check_peaks(hvsr_data, hvsr_band=DEFAULT_BAND, peak_selection='max', peak_fr
                 index_m = list()
 
             peakm = __init_peaks(x, hvsrm, index_m, hvsr_band, peak_freq_range, _min_peak_amp=0)
-            peakm = __check_clarity(x, hvsrm, peakm, do_rank=True)
 
             # Get standard deviation of time peaks
-            stdf = __get_stdf(x, index_list, hvsrPeaks)
+            stdf = __get_stdf(x, index_list, hvsrPeaks, hvsrPeakOffsets)
 
             peak = __check_freq_stability(peak, peakm, peakp)
-            peak = __check_stability(stdf, peak, hvsr_log_std, rank=True)
+            peak = __check_stability(stdf, peak, hvsr_log_std)
 
             hvsr_data['PeakReport'][col_id] = peak
 
@@ -2924,6 +2881,10 @@ def export_hvsr(hvsr_data, hvsr_export_path=None, hvsr_export_ext='hvsr', hvsr_e
     """
     def _hvsr_export(_hvsr_data=hvsr_data, _export_path=hvsr_export_path, _ext=hvsr_export_ext):
 
+        # The png of the plot report (saved while generating reports) is not exported
+        if hasattr(_hvsr_data, '_plot_report_png'):
+            _hvsr_data = __clear_report_png(_hvsr_data.copy())
+
         fname = f"{_hvsr_data['site']}_HVSRData_{_hvsr_data['hvsr_id']}_{datetime.date.today()}_pickled.{hvsr_export_ext}"
         if _export_path is None or _export_path is True:
             _export_path = _hvsr_data['input_data']
@@ -3040,6 +3001,10 @@ def export_json(hvsr_results, json_export_path=None,
         if k == '_batch':
             continue
 
+        # Ragged arrays of the time window peaks; these are exported as ind_hvsr_peak_indices
+        if k == 'ind_hvsr_peaks':
+            continue
+
         if k in plot_attrs and include_plots:
             plotEngine = hvsr_results.processing_parameters['fetch_data']['plot_engine']
 
@@ -3360,7 +3325,7 @@ def _mapstringtime(dt):
 
 
 # Function to export reports to disk in various formats
-def export_report(hvsr_results, report_export_path=None, report_export_format=['pdf'], azimuth='HV', csv_handling='rename', show_report=True, verbose=False):
+def export_report(hvsr_results, report_export_path=None, report_export_format=['pdf'], azimuth='HV', csv_handling='rename', pdf_engine='xhtml2pdf', show_report=True, verbose=False):
     """Function to export reports to disk. Exportable formats for report_export_format include:
 
         * 'table': saves a pandas DataFrame as a csv)
@@ -3389,6 +3354,8 @@ def export_report(hvsr_results, report_export_path=None, report_export_format=['
         * "overwrite": overwrites the existing file
     report_export_format : str or list, optional
         The format (or a list of formats) to export the report, by default ['pdf'].
+    pdf_engine : str {'xhtml2pdf', 'matplotlib'}, optional
+        How to create the pdf report, if 'pdf' in report_export_format, by default 'xhtml2pdf'. See get_report() for more information.
     show_report : bool, optional
         Whether to show the designated reports that were chosen for export, by default True
     verbose : bool, optional
@@ -3480,6 +3447,7 @@ def export_report(hvsr_results, report_export_path=None, report_export_format=['
             try:
                 print(f'\nSaving table report to: {outFile}')
                 reportDF.to_csv(outFile, index_label='ID')
+                __add_report_path(hvsr_results, ref, outFile)
             except Exception:
                 warnings.warn("Table report not exported. \n\tDataframe to be exported as csv has been saved in hvsr_results['BestPeak']['Report']['Table_Report]", category=RuntimeWarning)
 
@@ -3513,12 +3481,17 @@ def export_report(hvsr_results, report_export_path=None, report_export_format=['
         elif ref == 'plot':
             if not hasattr(hvsr_results, 'Plot_Report'):
                 fig = plot_hvsr(hvsr_results, return_fig=True)
+            else:
+                fig = hvsr_results['Plot_Report']
             hvsr_results['BestPeak'][azimuth]['Report']['Plot_Report'] = hvsr_results['Plot_Report'] = fig
 
             if verbose:
                 print(f'\nSaving plot to: {outFile}')
-            plt.scf = fig
-            plt.savefig(outFile)
+            if hasattr(fig, 'savefig'):
+                fig.savefig(outFile)
+            else:
+                plt.savefig(outFile)
+            __add_report_path(hvsr_results, ref, outFile)
         elif ref == 'print':
             if not hasattr(hvsr_results, "Print_Report") or hvsr_results['Print_Report'] is None:
                 hvsr_results = _generate_print_report(hvsr_results, azimuth=azimuth, show_print_report=show_report, verbose=verbose)
@@ -3528,13 +3501,15 @@ def export_report(hvsr_results, report_export_path=None, report_export_format=['
                 # Could write more details in the future
                 if show_report or verbose:
                     print(hvsr_results['Print_Report'])
+            __add_report_path(hvsr_results, ref, outFile)
         elif ref == "html":
             if not hasattr(hvsr_results, "HTML_Report") or hvsr_results['HTML_Report'] is None:
-                hvsr_results = _generate_html_report(hvsr_results)
+                hvsr_results = _generate_html_report(hvsr_results, azimuth=azimuth)
             with open(outFile, 'w') as outF:
                 outF.write(hvsr_results['HTML_Report'])
+            __add_report_path(hvsr_results, ref, outFile)
         elif ref == "pdf":
-            hvsr_results = _generate_pdf_report(hvsr_results, pdf_report_filepath=report_export_path, show_pdf_report=show_report, verbose=verbose)
+            hvsr_results = _generate_pdf_report(hvsr_results, pdf_report_filepath=report_export_path, azimuth=azimuth, pdf_engine=pdf_engine, show_pdf_report=show_report, verbose=verbose)
 
     return hvsr_results
 
@@ -3750,7 +3725,9 @@ def fetch_data(input_parameters, source='file', data_export_path=None, data_expo
     verbose : bool, default=False
         Whether to print outputs and inputs to the terminal
     **kwargs
-        Keywords arguments, primarily for 'batch' and 'dir' sources
+        Keywords arguments, primarily for 'batch' and 'dir' sources.
+        For source='raw' (Raspberry Shake archives), files are looked up using an index saved in the archive directory (sprit_rs_index.json).
+        Use save_archive_index=False to keep this index only in memory.
 
     Returns
     -------
@@ -3961,7 +3938,9 @@ def fetch_data(input_parameters, source='file', data_export_path=None, data_expo
                     trominoKwargs = {k: v for k, v in kwargs.items() if k in tuple(inspect.signature(read_tromino_files).parameters.keys())}
                     paramDict = {k: v for k, v in input_parameters.items()}
                     trominoKwargs.update(paramDict)
-                    rawDataIN = read_tromino_files(input_parameters, verbose=verbose, **trominoKwargs)
+                    if 'input_data' in trominoKwargs:
+                        del trominoKwargs['input_data']
+                    rawDataIN = __read_tromino_time_range(input_parameters, verbose=verbose, **trominoKwargs)
 
                     if 'site' in rawDataIN[0].stats:
                         if hasattr(input_parameters, 'site'):
@@ -3971,7 +3950,8 @@ def fetch_data(input_parameters, source='file', data_export_path=None, data_expo
                 else:
                     if inst.lower() not in raspShakeInstNameList:
                         print(f"Unrecognized value instrument={inst}. Defaulting to raw raspberry shake data.")
-                    rawDataIN = __read_RS_file_struct(dPath, source, year, doy, inv, input_parameters, verbose=verbose)
+                    rawDataIN = __read_RS_file_struct(dPath, source, year, doy, inv, input_parameters,
+                                                      save_archive_index=kwargs.get('save_archive_index', True), verbose=verbose)
 
             except Exception as e:
                 raise RuntimeError(f"Data not fetched for {input_parameters['site']}. Check input parameters or the data file.\n\n{e}")
@@ -4019,7 +3999,7 @@ def fetch_data(input_parameters, source='file', data_export_path=None, data_expo
                     if 'tromino_model' not in trominoKwargs:
                         trominoKwargs['tromino_model'] = input_parameters['instrument']
 
-                    rawDataIN = read_tromino_files(input_data=input_parameters, verbose=verbose, **trominoKwargs)
+                    rawDataIN = __read_tromino_time_range(input_parameters, verbose=verbose, **trominoKwargs)
 
                     if 'site' in rawDataIN[0].stats and input_parameters['site'] == 'HVSRSite':
                         if hasattr(input_parameters, 'site'):
@@ -4040,7 +4020,7 @@ def fetch_data(input_parameters, source='file', data_export_path=None, data_expo
                 if isinstance(dPath, list) or isinstance(dPath, tuple):
                     rawStreams = []
                     for datafile in dPath:
-                        rawStream = obspy.read(datafile, **obspyReadKwargs)
+                        rawStream = __read_obspy_time_range(datafile, input_parameters, verbose=verbose, **obspyReadKwargs)
                         rawStreams.append(rawStream)  # These are actually streams, not traces
                     for i, stream in enumerate(rawStreams):
                         if i == 0:
@@ -4050,7 +4030,8 @@ def fetch_data(input_parameters, source='file', data_export_path=None, data_expo
                 elif str(dPath).lower().startswith('sample'):
                     rawDataIN = sprit_utils._get_sample_data(dPath)
                 else:
-                    rawDataIN = obspy.read(dPath, **obspyReadKwargs)  # , starttime=obspy.core.UTCDateTime(input_parameters['starttime']), endttime=obspy.core.UTCDateTime(input_parameters['endtime']), nearest_sample =True)
+                    # Only read data in the time range of input_parameters (if specified)
+                    rawDataIN = __read_obspy_time_range(dPath, input_parameters, verbose=verbose, **obspyReadKwargs)
         elif str(source).lower() == 'url':
             url = input_parameters['input_data']
 
@@ -4822,7 +4803,9 @@ def generate_psds(hvsr_data, window_length=30.0, overlap_pct=0.5, window_type='h
         obspy_ppsds : bool, default=False
             Whether to use the Obspy PPSD class.
         azimuthal_psds : bool, default=False
-            Whether to generate PPSDs for azimuthal data
+            Whether to generate PPSDs for azimuthal data (calculated using sprit.calculate_azimuth()).
+            Azimuthal PSDs are not calculated from rotated time series. Instead, the N/E auto and cross spectra of each window
+            are stored in hvsr_data['psd_cross_spectra'], from which process_hvsr() evaluates any number of azimuths.
         verbose : bool, default=True
             Whether to print inputs and results to terminal
         show_psd_plot : bool, default=False
@@ -4961,17 +4944,12 @@ def _get_obspy_ppsds(hvsr_data, **obspy_ppsd_kwargs):
         ppsdZ.add(zStream)
 
         # Get ppsds of R components (azimuthal data)
-        # has_az = False
+        #  Obspy PPSDs need time series, so the radial traces are only built here
         ppsds = {'Z': ppsdZ, 'E': ppsdE, 'N': ppsdN}
-        rStream = stream.select(component='R')
-        for curr_trace in stream:
-            if 'R' in curr_trace.stats.channel:
-                curr_stats = curr_trace.stats
-                ppsd_curr = PPSD(curr_stats, paz['E'], **obspy_ppsd_kwargs)
-
-                # has_az = True
-                ppsdName = curr_trace.stats.location
-                ppsd_curr.add(rStream)
+        if azimuthal_psds and 'azimuths' in hvsr_data.keys() and len(hvsr_data['azimuths']) > 0:
+            for ppsdName, curr_trace in __get_azimuth_traces(hvsr_data).items():
+                ppsd_curr = PPSD(curr_trace.stats, paz['E'], **obspy_ppsd_kwargs)
+                ppsd_curr.add(obspy.Stream([curr_trace]).split())
                 ppsds[ppsdName] = ppsd_curr
 
         # Add to the input dictionary, so that some items can be manipulated later on, and original can be saved
@@ -5064,6 +5042,7 @@ def _get_obspy_ppsds(hvsr_data, **obspy_ppsd_kwargs):
 
     if obspy_ppsds:
         hvsr_data, dfList, colList, common_times = _get_obspy_ppsds(hvsr_data, **obspy_ppsd_kwargs)
+        hvsr_data['psd_cross_spectra'] = {}
         hvsrDF = pd.DataFrame(dfList, columns=colList)
 
     else:
@@ -5071,9 +5050,10 @@ def _get_obspy_ppsds(hvsr_data, **obspy_ppsd_kwargs):
         if overlap_pct > 1:
             overlap_pct = overlap_pct / 100
 
-        psdDict, times_bool = __single_psd_from_raw_data(hvsr_data, window_length=window_length, window_length_method=window_length_method, window_type=window_type,
-                                                         num_freq_bins=num_freq_bins, verbose=verbose,
-                                                         overlap_pct=overlap_pct, remove_response=remove_response, do_azimuths=azimuthal_psds)
+        do_azimuths = azimuthal_psds and 'azimuths' in hvsr_data.keys() and len(hvsr_data['azimuths']) > 0
+        psdDict, times_bool, crossDict = __single_psd_from_raw_data(hvsr_data, window_length=window_length, window_length_method=window_length_method, window_type=window_type,
+                                                                    num_freq_bins=num_freq_bins, verbose=verbose,
+                                                                    overlap_pct=overlap_pct, remove_response=remove_response, do_azimuths=do_azimuths)
         common_times = [ct[0] for ct in times_bool]
         use_times = [ut[1] for ut in times_bool]
 
@@ -5085,11 +5065,16 @@ def _get_obspy_ppsds(hvsr_data, **obspy_ppsd_kwargs):
             psdDictUpdate[key] = np.array([list(np.flip(arr)) for time, arr in compdict.items()])
             hvsr_data['psds'][key] = {}
 
-        for key, item in psdDict.items():
-            if 'AZ' in key:
-                currSt = hvsr_data.stream.select(component='R', location=key[2:])
-            else:
-                currSt = hvsr_data.stream.select(component=key).merge()
+        # The per-window N/E auto and cross spectra (linear units) are stored once;
+        #  psds at any number of azimuths are calculated from these in process_hvsr()
+        hvsr_data['psd_cross_spectra'] = {}
+        if do_azimuths:
+            hvsr_data['psd_cross_spectra'] = {'NN': np.power(10.0, psdDictUpdate['N'] / 10.0),
+                                              'EE': np.power(10.0, psdDictUpdate['E'] / 10.0),
+                                              'NE': np.array([np.flip(arr) for time, arr in crossDict['NE'].items()])}
+
+        for key in psdDictUpdate.keys():
+            currSt = hvsr_data.stream.select(component=key).merge()
 
             hvsr_data['psds'][key]['channel'] = currSt[0].stats.channel
             hvsr_data['psds'][key]['current_times_used'] = common_times
@@ -5125,6 +5110,9 @@ def _get_obspy_ppsds(hvsr_data, **obspy_ppsd_kwargs):
             hvsr_data['psds'][key]['times_gaps'] = [[None, None]]
             hvsr_data['psds'][key]['times_processed'] = [[None, None]]
 
+        if do_azimuths:
+            hvsr_data['psd_cross_spectra']['period_bin_centers'] = hvsr_data['psds']['N']['period_bin_centers'].copy()
+
         hvsr_data['ppsds_obspy'] = {}
         dfList = []
 
@@ -5420,7 +5408,7 @@ def get_report(hvsr_results, report_formats=['print', 'table', 'plot', 'html', '
                suppress_report_outputs=False, show_report_outputs=False,
                csv_handling='append',
 
-               report_export_format=None, report_export_path=None,
+               report_export_format=None, report_export_path=None, report_workers=1, pdf_engine='xhtml2pdf',
 
                verbose=False, **kwargs):
     """Generate and/or print and/or export a report of the HVSR analysis in a variety of formats.
@@ -5433,7 +5421,7 @@ def get_report(hvsr_results, report_formats=['print', 'table', 'plot', 'html', '
     * 'html': An HTML document/text of the HVSR results. This includes the table, print, and plot reports in one document.
     * 'pdf': A PDF document showing the summary of the HVSR Results.
 
-            The PDF report is simply the HTML report saved to an A4-sized PDF document.
+            By default, the PDF report is simply the HTML report saved to an A4-sized PDF document (see pdf_engine).
 
     Parameters
     ----------
@@ -5464,6 +5452,20 @@ def get_report(hvsr_results, report_formats=['print', 'table', 'plot', 'html', '
         If a directory is specified, the filename will be  "<site_name>_<acq_date>_<UTC start time>-<UTC end time>".
 
         The extension/suffix defaults to png for report_formats="plot", csv for 'table', txt for 'print', html for 'html', and pdf for 'pdf.'
+        The paths of the exported reports are saved in hvsr_results['Report_Paths'] (a dict with the report formats as keys).
+    pdf_engine : str {'xhtml2pdf', 'matplotlib'}, default = 'xhtml2pdf'
+        How the pdf report is created.
+            - 'xhtml2pdf' converts the html report to an A4-sized pdf document.
+            - 'matplotlib' writes the pdf directly using matplotlib's PdfPages (much faster). The pdf contains a summary page with the table report,
+              the plot report (as vector graphics if plot_engine='matplotlib'), and the print report.
+    report_workers : int or None, default = 1
+        Only used when hvsr_results is an HVSRBatch object. Number of worker processes used to render the reports of the sites.
+        If 1, sites are processed one after another on the main process (the original behavior).
+        If greater than 1 (or None, to use one worker per CPU), the reports of each site are rendered concurrently in separate processes
+        (using the non-interactive Agg matplotlib backend). The same files are exported as when report_workers=1
+        (table reports are exported from the main process, one site at a time, so csv_handling works the same way).
+        In this case, nothing is shown, but the same report attributes (including Plot_Report and Report_Paths) are returned.
+        If get_report() fails for a site (in either mode), processing_status['get_report_status'] of that site is set to False.
     verbose : bool, default=True
         Whether to print the results to terminal. This is the same output as report_formats='print', and will not repeat if that is already selected
 
@@ -5511,15 +5513,18 @@ def get_report(hvsr_results, report_formats=['print', 'table', 'plot', 'html', '
     report_export_format = orig_args['report_export_format']
     report_export_path = orig_args['report_export_path']
     csv_handling = orig_args['csv_handling']
+    report_workers = orig_args['report_workers']
+    pdf_engine = orig_args['pdf_engine']
     verbose = orig_args['verbose']
     kwargs = orig_args['kwargs']
 
     # Put Processing parameters in hvsr_results immediately (gets used later local function in get_report)
-    hvsr_results['processing_parameters']['get_report'] = {}
-    exclude_params_list = ['hvsr_results']
-    for key, value in orig_args.items():
-        if key not in exclude_params_list:
-            hvsr_results['processing_parameters']['get_report'][key] = value
+    if not isinstance(hvsr_results, HVSRBatch):
+        hvsr_results['processing_parameters']['get_report'] = {}
+        exclude_params_list = ['hvsr_results']
+        for key, value in orig_args.items():
+            if key not in exclude_params_list:
+                hvsr_results['processing_parameters']['get_report'][key] = value
 
     if verbose:
         print('\nGetting HVSR Report: get_report()')
@@ -5546,8 +5551,14 @@ def get_report(hvsr_results, report_formats=['print', 'table', 'plot', 'html', '
 
             print()
 
+        # Render reports of each site concurrently in worker processes
+        if report_workers is None or int(report_workers) > 1:
+            hvsr_results = __get_report_parallel(hvsr_results, report_kwargs=orig_args, report_workers=report_workers)
+
         # If running batch, we'll loop through each site
         for site_name in hvsr_results.keys():
+            if report_workers is None or int(report_workers) > 1:
+                break
             args = orig_args.copy()  # Make a copy so we don't accidentally overwrite
             individual_params = hvsr_results[site_name]  # Get what would normally be the "params" variable for each site
             args['hvsr_results'] = individual_params  # reset the params parameter we originally read in to an individual site params
@@ -5581,6 +5592,8 @@ def get_report(hvsr_results, report_formats=['print', 'table', 'plot', 'html', '
                 else:
                     csvExportPath = csvExportPath.parent
 
+            if pathlib.Path(csvExportPath).is_dir():
+                csvExportPath = pathlib.Path(csvExportPath).joinpath(f"HVSRBatch_REPORT_{datetime.date.today()}.csv")
             combined_csvReport.to_csv(csvExportPath, index=False)
         return hvsr_results
 
@@ -5645,6 +5658,10 @@ def get_report(hvsr_results, report_formats=['print', 'table', 'plot', 'html', '
         report_formats.pop(report_formats.index('print'))
         report_formats.insert(0, 'print')
 
+    # The png of the plot report is only reused within this call (the figure may have been changed since an earlier call)
+    __clear_report_png(hvsr_results)
+    hvsr_results['Report_Paths'] = {}
+
     for i, rep_form in enumerate(report_formats):
         if isinstance(report_export_path, (list, tuple)):
             if not isinstance(report_formats, (list, tuple)):
@@ -5727,10 +5744,10 @@ def get_report(hvsr_results, report_formats=['print', 'table', 'plot', 'html', '
 
                             return_fig=True)
             expFigAx = fig
+            hvsr_results['Plot_Report'] = fig
 
             if 'plot' in report_export_format:
-                export_report(hvsr_results=hvsr_results, report_export_path=report_export_path, report_export_format='plot')
-            hvsr_results['Plot_Report'] = fig
+                export_report(hvsr_results=hvsr_results, azimuth=azimuth, report_export_path=report_export_path, report_export_format='plot')
 
             if show_plot_report:  # 'show_plot' in plot_hvsr_kwargs.keys() and plot_hvsr_kwargs['show_plot'] is False:
                 if not verbose:
@@ -5754,7 +5771,7 @@ def get_report(hvsr_results, report_formats=['print', 'table', 'plot', 'html', '
             verbose_html = verbose
             if verbose or show_html_report:
                 verbose_html = True
-            hvsr_results = _generate_html_report(hsvr_results, show_html_report=show_html_report, verbose=verbose_html)
+            hvsr_results = _generate_html_report(hsvr_results, azimuth=azimuth, show_html_report=show_html_report, verbose=verbose_html)
 
             if 'html' in report_export_format:
                 if exp_path is None:
@@ -5781,11 +5798,12 @@ def get_report(hvsr_results, report_formats=['print', 'table', 'plot', 'html', '
                 pdf_exp_path = exp_path
             else:
                 pdf_exp_path = pathlib.Path(exp_path)
-            hvsr_results = _generate_pdf_report(hvsr_results, pdf_report_filepath=pdf_exp_path,
+            hvsr_results = _generate_pdf_report(hvsr_results, pdf_report_filepath=pdf_exp_path, azimuth=azimuth, pdf_engine=pdf_engine,
                                                 show_pdf_report=show_pdf_report, show_html_report=show_html_report,
 
                                                 verbose=verbose_pdf)
 
+    __clear_report_png(hvsr_results)
     return hvsr_results
 
 
@@ -6258,7 +6276,10 @@ def plot_azimuth(hvsr_data, fig=None, ax=None, show_azimuth_peaks=False, interpo
         Whether to interpolate the azimuth data to get a smoother plot.
 
         This is just for visualization, does not change underlying data.
-        It takes a lot of time to process the data, but interpolation for vizualization can happen fairly fast. By default True.
+        If the N/E cross spectra were calculated (generate_psds(azimuthal_psds=True)), the H/V curves are evaluated
+        at each 1 degree step the same way as the curves in hvsr_data['hvsr_az'] (no additional PSDs need to be calculated,
+        but each azimuth psd is still smoothed, so this takes longer than interpolating).
+        Otherwise, the calculated azimuths are linearly interpolated. By default True.
     show_azimuth_grid : bool, optional
         Whether to display the grid on the chart, by default False
 
@@ -6293,13 +6314,12 @@ def plot_azimuth(hvsr_data, fig=None, ax=None, show_azimuth_peaks=False, interpo
 
         freq = hvsr_data.x_freqs['Z'].tolist()[1:]
 
-        a = np.deg2rad(np.array((list(set([int(tr.stats.location) for tr in hvsr_data.stream])))))
-        aDeg = np.array(list(set([int(tr.stats.location) for tr in hvsr_data.stream])))
+        azKeys = sorted(hvsr_data.hvsr_az.keys(), key=lambda azk: hvsr_data['azimuths'][azk]['azimuth_deg'])
+        a = np.array([hvsr_data['azimuths'][aKey]['azimuth_rad'] for aKey in azKeys])
         # a = np.deg2rad(np.array(sorted(hvsr_data.hvsr_az.keys())).astype(float)) # old version
         b = a + np.pi
 
-        for k in aDeg:
-            aKey = 'AZ'+str(int(k)).zfill(3)
+        for aKey in azKeys:
             currData = hvsr_data.hvsr_az[aKey]
             azDataList.append(currData)
             azExtraDataList.append(currData)
@@ -6325,8 +6345,20 @@ def interp_along_theta(orig_array, orig_ind):
                 interpolate_azimuths = False
 
         if interpolate_azimuths:
-            z = interp_along_theta(z, a)
-            z2 = interp_along_theta(z2, a)
+            if 'psd_cross_spectra' in hvsr_data.keys() and len(hvsr_data['psd_cross_spectra']) > 0:
+                # Evaluate H/V at each (1 degree) step from the N/E cross spectra, instead of interpolating
+                azAngles = np.linspace(np.deg2rad(1), np.pi, 180)
+                z = __azimuth_hvsr_curves(hvsr_data, azAngles)
+
+                # The azimuths calculated by process_hvsr() are used as they are
+                for aKey, aRad in zip(azKeys, a):
+                    azMatch = np.isclose(azAngles, aRad)
+                    if np.any(azMatch):
+                        z[np.argmax(azMatch)] = hvsr_data.hvsr_az[aKey]
+                z2 = z.copy()
+            else:
+                z = interp_along_theta(z, a)
+                z2 = interp_along_theta(z2, a)
 
             a = np.linspace(np.deg2rad(1), np.pi, 180)
             b = (a + np.pi).tolist()
@@ -6429,7 +6461,7 @@ def interp_along_theta(orig_array, orig_ind):
 
 
 # Main function for plotting results
-def plot_hvsr(hvsr_data, plot_type=DEFAULT_PLOT_STR, azimuth='HV', use_subplots=True, fig=None, ax=None, return_fig=False,  plot_engine='matplotlib', save_dir=None, save_suffix='', show_legend=False, show_plot=True, close_figs=False, clear_fig=True, **kwargs):
+def plot_hvsr(hvsr_data, plot_type=DEFAULT_PLOT_STR, azimuth='HV', use_subplots=True, fig=None, ax=None, return_fig=False,  plot_engine='matplotlib', save_dir=None, save_suffix='', show_legend=False, show_plot=True, close_figs=False, clear_fig=True, reuse_fig=False, **kwargs):
     """Function to plot HVSR data
 
     Parameters
@@ -6480,7 +6512,7 @@ def plot_hvsr(hvsr_data, plot_type=DEFAULT_PLOT_STR, azimuth='HV', use_subplots=
     plot_engine : str, default='Matplotlib'
         Which engine to use for plotting. Both "matplotlib" and "plotly" are acceptable. For shorthand, 'mpl', 'm' also work for matplotlib; 'plty' or 'p' also work for plotly. Not case sensitive.
     save_dir : str or None
-        Directory in which to save figures
+        Directory in which to save figures. The filename will be "<site_name>_HVSR_<hvsr_id>_<date><save_suffix>.png"
     save_suffix : str
         Suffix to add to end of figure filename(s), if save_dir is used
     show_legend : bool, default=False
@@ -6491,6 +6523,14 @@ def plot_hvsr(hvsr_data, plot_type=DEFAULT_PLOT_STR, azimuth='HV', use_subplots=
         Whether to close figures before plotting
     clear_fig : bool, default=True
         Whether to clear figures before plotting
+    reuse_fig : bool, default=False
+        Only used with plot_engine='matplotlib' and use_subplots=True.
+        If True, the figure (and subplot layout) is created once for each combination of plot types and reused (cleared and redrawn) by later calls,
+        instead of creating a new figure each time. This is much faster and uses less memory when plotting many sites,
+        but a figure returned by an earlier call will be overwritten by the next call with reuse_fig=True.
+        Not used if fig is specified.
+        When hvsr_data is an HVSRBatch object and show_plot=False, this is True unless fig or ax is specified
+        or plot_type includes an azimuth plot (since hvsr_data['Azimuth_fig'] is kept for each site).
     **kwargs : keyword arguments
         Keyword arguments for matplotlib.pyplot
 
@@ -6505,7 +6545,13 @@ def plot_hvsr(hvsr_data, plot_type=DEFAULT_PLOT_STR, azimuth='HV', use_subplots=
         for site_name in hvsr_data.keys():
             args = orig_args.copy()  # Make a copy so we don't accidentally overwrite
             individual_params = hvsr_data[site_name]  # Get what would normally be the "params" variable for each site
-            args['hvsr_results'] = individual_params  # reset the params parameter we originally read in to an individual site params
+            args['hvsr_data'] = individual_params  # reset the params parameter we originally read in to an individual site params
+            args.update(args.pop('kwargs'))
+            # Figures are not shown, so one figure can be used for all sites
+            #  (unless a figure is kept for each site, as for azimuth plots in hvsr_data['Azimuth_fig'], or a figure was passed in)
+            keepSiteFigs = len(set(['azimuth', 'az', 'a', 'radial', 'r']).intersection(str(plot_type).lower().replace(',', '').split(' '))) > 0
+            if not show_plot and fig is None and ax is None and not keepSiteFigs:
+                args['reuse_fig'] = True
             if hvsr_data[site_name]['processing_status']['overall_status']:
                 try:
                     __hvsr_plot_batch(**args)  # Call another function, that lets us run this function again
@@ -6609,7 +6655,7 @@ def plot_hvsr(hvsr_data, plot_type=DEFAULT_PLOT_STR, azimuth='HV', use_subplots=
             pEndInd = plotIndOrder[i+1]
             plotComponents = kList[pStartInd:pEndInd]
 
-            if use_subplots and i == 0 and fig is None and ax is None:
+            if use_subplots and i == 0 and ax is None:
                 mosaicPlots = []
                 for pto in plotTypeOrder:
                     if pto == 'az':
@@ -6625,9 +6671,16 @@ def plot_hvsr(hvsr_data, plot_type=DEFAULT_PLOT_STR, azimuth='HV', use_subplots=
                 perSubPDict = {}
                 if 'az' in plotTypeOrder:
                     perSubPDict['az'] = {'projection': 'polar'}
-                fig, ax = plt.subplot_mosaic(mosaicPlots, per_subplot_kw=perSubPDict,
+                if fig is not None:
+                    # Use the figure that was passed in
+                    ax = fig.subplot_mosaic(mosaicPlots, per_subplot_kw=perSubPDict)
+                elif reuse_fig:
+                    fig, ax = __get_plot_template(mosaicPlots, per_subplot_kw=perSubPDict,
+                                                  layout=figLayout, figsize=(figWidth, figHeight), dpi=figdpi)
+                else:
+                    fig, ax = plt.subplot_mosaic(mosaicPlots, per_subplot_kw=perSubPDict,
 
-                                             layout=figLayout, figsize=(figWidth, figHeight), dpi=figdpi)
+                                                 layout=figLayout, figsize=(figWidth, figHeight), dpi=figdpi)
                 axis = ax[p]
             elif use_subplots:
                 with warnings.catch_warnings():
@@ -6640,7 +6693,7 @@ def plot_hvsr(hvsr_data, plot_type=DEFAULT_PLOT_STR, azimuth='HV', use_subplots=
 
             if p == 'hvsr':
                 kwargs['subplot'] = p
-                fig, ax[p] = _plot_hvsr(hvsr_data, fig=fig, ax=axis, plot_type=plotComponents, azimuth=azimuth, xtype='x_freqs', show_legend=show_legend, axes=ax, **kwargs)
+                fig, ax[p] = _plot_hvsr(hvsr_data, fig=fig, ax=axis, plot_type=plotComponents, azimuth=azimuth, xtype='x_freqs', show_legend=show_legend, show_plot=show_plot, axes=ax, **kwargs)
             elif p == 'comp':
                 plotComponents[0] = plotComponents[0][:-1]
                 kwargs['subplot'] = p
@@ -6665,13 +6718,13 @@ def plot_hvsr(hvsr_data, plot_type=DEFAULT_PLOT_STR, azimuth='HV', use_subplots=
 
                 compKwargs = {'ylim': compYlim}
                 compKwargs.update(kwargs)
-                fig, ax[p] = _plot_hvsr(hvsr_data, fig=fig, ax=axis, plot_type=plotComponents, azimuth=azimuth, xtype='x_freqs', show_legend=show_legend, axes=ax, **kwargs)
+                fig, ax[p] = _plot_hvsr(hvsr_data, fig=fig, ax=axis, plot_type=plotComponents, azimuth=azimuth, xtype='x_freqs', show_legend=show_legend, show_plot=show_plot, axes=ax, **kwargs)
             elif p == 'spec':
                 plottypeKwargs = {}
                 for c in plotComponents:
                     plottypeKwargs[c] = True
                 kwargs.update(plottypeKwargs)
-                _plot_specgram_hvsr(hvsr_data, fig=fig, ax=axis, azimuth=azimuth, colorbar=False, **kwargs)
+                _plot_specgram_hvsr(hvsr_data, fig=fig, ax=axis, azimuth=azimuth, colorbar=False, show_plot=show_plot, **kwargs)
             elif p == 'az':
                 kwargs['plot_type'] = plotComponents
                 hvsr_data['Azimuth_fig'] = plot_azimuth(hvsr_data, fig=fig, ax=axis, **kwargs)
@@ -6687,6 +6740,11 @@ def plot_hvsr(hvsr_data, plot_type=DEFAULT_PLOT_STR, azimuth='HV', use_subplots=
             matplotlib.rcParams["figure.constrained_layout.h_pad"] = 0.075
         # if use_subplots:
         #    fig.subplots_adjust()#.set(h_pad=0.075, hspace=-5)
+
+        if save_dir is not None:
+            figFName = f"{hvsr_data['site']}_HVSR_{hvsr_data['hvsr_id']}_{datetime.date.today()}{save_suffix}.png".replace(':', '')
+            fig.savefig(pathlib.Path(save_dir).joinpath(figFName))
+
         if show_plot:
             # fig.canvas.draw()
             plt.show()
@@ -6701,7 +6759,7 @@ def plot_hvsr(hvsr_data, plot_type=DEFAULT_PLOT_STR, azimuth='HV', use_subplots=
 def process_hvsr(hvsr_data, horizontal_method=None, freq_smooth='konno ohmachi',
 
                  f_smooth_width=40, resample=True, array_processing=True,
-                 outlier_curve_percentile_threshold=False, azimuth=None, verbose=False):
+                 outlier_curve_percentile_threshold=False, azimuth=None, stats_method='exact', verbose=False):
     """Process the input data and get HVSR data
 
     This is the main function that uses other (private) functions to do
@@ -6751,6 +6809,15 @@ def process_hvsr(hvsr_data, horizontal_method=None, freq_smooth='konno ohmachi',
         Otherwise, float of percentile used as outlier_threshold of remove_outlier_curve().
     azimuth : float, default = None
         The azimuth angle to use when method is single azimuth.
+    stats_method : str {'exact', 'streaming'}, default = 'exact'
+        How to calculate the median and standard deviation across time windows at each frequency
+        (psd_values_tavg, ppsd_std, ind_hvsr_stdDev and hvsr_log_std).
+
+            - 'exact' stacks the curves of all windows and uses np.nanmedian() and np.nanstd().
+            - 'streaming' adds each window to single-pass estimators as it is processed, so no stacked arrays of all windows are needed.
+              Standard deviations use Welford's algorithm and are the same as 'exact' (up to floating point rounding).
+              Medians are exact for the first 50 windows and are then estimated with the P² algorithm.
+              The estimators are kept in hvsr_out['streaming_stats'], and more windows can be added with _update_streaming_stats().
     verbose : bool, defualt=False
         Whether to print output to terminal
 
@@ -6782,6 +6849,7 @@ def process_hvsr(hvsr_data, horizontal_method=None, freq_smooth='konno ohmachi',
     resample = orig_args['resample']
     array_processing = orig_args['array_processing']
     outlier_curve_percentile_threshold = orig_args['outlier_curve_percentile_threshold']
+    stats_method = orig_args['stats_method']
     verbose = orig_args['verbose']
 
     if (verbose and isinstance(hvsr_data, HVSRBatch)) or (verbose and not hvsr_data['batch']):
@@ -6925,7 +6993,7 @@ def move_avg(y, box_pts):
         horizontal_method = 3  # Geometric mean is used as default if nothing is specified
 
     # If an azimuth has been calculated and it's only one, automatically use the single azimuth method
-    if len(hvsr_data.stream.merge().select(component='R')) == 1:
+    if 'azimuths' in hvsr_data.keys() and len(hvsr_data['azimuths']) == 1:
         horizontal_method = 8  # Single azimuth
 
     # horizontal_method needs to be str or int
@@ -6989,63 +7057,45 @@ def move_avg(y, box_pts):
             warnings.warn('No frequency smoothing is being applied. This is not recommended for noisy datasets.')
     elif freq_smooth is True or (freq_smooth.lower() in freq_smooth_ko and (not not f_smooth_width and not not freq_smooth)):
         # Carry out Konno Ohmachi smoothing
-        from obspy.signal import konnoohmachismoothing
         for k in hvsr_data['psd_raw']:
             colName = f'psd_values_{k}'
 
-            psd_data = np.stack(hvsr_data['hvsr_windows_df'][colName])
-            psd_data = hvsr_data['psd_raw'][k]
-
-            freqs = x_freqs[k]
-            padding_length = int(f_smooth_width)
-
-            padding_value_R = np.nanmean(psd_data[:, -1*padding_length:])
-            padding_value_L = np.nanmean(psd_data[:, :padding_length])
-
-            # Pad the data to prevent boundary anamolies
-            padded_psd_data = np.pad(psd_data, ((0, 0), (padding_length, padding_length)),
-
-                                     'constant', constant_values=(padding_value_L, padding_value_R))
-
-            # Pad the frequencies
-            ratio = freqs[1] / freqs[0]
-            # Generate new elements on either side and combine
-            left_padding = [freqs[0] / (ratio ** i) for i in range(padding_length, 0, -1)]
-            right_padding = [freqs[-1] * (ratio ** i) for i in range(1, padding_length + 1)]
-            padded_freqs = np.concatenate([left_padding, freqs, right_padding])
-
-            # Filter out UserWarning for just this method, since it throws up a UserWarning that doesn't really matter about dtypes often
-            with warnings.catch_warnings():
-                # warnings.simplefilter('ignore', category=UserWarning)
-                padded_psd_data = padded_psd_data.astype(padded_freqs.dtype)  # Make them the same datatype
-                padded_psd_data = np.round(padded_psd_data, 12)  # Prevent overflows
-                padded_freqs = np.round(padded_freqs, 9)
-
-                smoothed_psd_data = konnoohmachismoothing.konno_ohmachi_smoothing(padded_psd_data, padded_freqs,
-
-                                                                                  bandwidth=f_smooth_width,
-
-                                                                                  normalize=True)
-
-            # Only use the original, non-padded data
-            smoothed_psd_data = smoothed_psd_data[:, padding_length:-1*padding_length]
+            smoothed_psd_data = __konno_ohmachi_smooth(hvsr_data['psd_raw'][k], x_freqs[k], f_smooth_width)
             hvsr_data['psd_raw'][k] = smoothed_psd_data
             hvsrDF[colName] = pd.Series(list(smoothed_psd_data), index=hvsr_data['hvsr_windows_df'].index)
-    elif freq_smooth.lower() in freq_smooth_constant:
-        hvsr_data = __freq_smooth_window(hvsr_data, f_smooth_width, kind_freq_smooth='constant')
-    elif freq_smooth.lower() in freq_smooth_proport:
-        hvsr_data = __freq_smooth_window(hvsr_data, f_smooth_width, kind_freq_smooth='proportional')
+    elif freq_smooth.lower() in freq_smooth_constant or freq_smooth.lower() in freq_smooth_proport:
+        if freq_smooth.lower() in freq_smooth_constant:
+            kindSmooth = 'constant'
+        else:
+            kindSmooth = 'proportional'
+        hvsr_data = __freq_smooth_window(hvsr_data, f_smooth_width, kind_freq_smooth=kindSmooth)
     else:
         if verbose:
             warnings.warn(f'You indicated no frequency smoothing should be applied (freq_smooth = {freq_smooth}). This is not recommended for noisy datasets.')
 
+    # Azimuths are evaluated from the (unsmoothed) N/E auto and cross spectra of each window calculated in generate_psds()
+    #  These are then resampled and smoothed like the other components (plot_azimuth() uses the same helper for other angles)
+    hasCrossSpectra = 'psd_cross_spectra' in hvsr_data.keys() and len(hvsr_data['psd_cross_spectra']) > 0
+    if hasCrossSpectra and 'azimuths' in hvsr_data.keys() and len(hvsr_data['azimuths']) > 0:
+        azPSDs = __resample_azimuth_psds(hvsr_data['psd_cross_spectra'], hvsr_data['azimuths'], x_periods['N'], resample=resample)
+        smoothedAzPSDs = __smooth_azimuth_psds(azPSDs, x_freqs['N'], freq_smooth=freq_smooth, f_smooth_width=f_smooth_width)
+        for azKey, azPSD in azPSDs.items():
+            psdRaw[azKey] = azPSD
+            hvsr_data['psd_raw'][azKey] = smoothedAzPSDs[azKey]
+            hvsrDF['psd_values_'+azKey] = pd.Series(list(smoothedAzPSDs[azKey]), index=hvsrDF.index)
+            x_freqs[azKey] = x_freqs['N']
+            x_periods[azKey] = x_periods['N']
+
     # Get hvsr curve from three components at each time step
     anyK = list(hvsr_data['psd_raw'].keys())[0]
+    useStreamingStats = str(stats_method).lower() in ['streaming', 'stream', 's']
+    streamStats = {'psd': {}, 'hv': {}, 'log_hv': {}}
     if horizontal_method == 1 or horizontal_method == 'dfa' or horizontal_method == 'Diffuse Field Assumption':
         hvsr_tSteps_az = {}
     else:
         hvsr_tSteps = []
         hvsr_tSteps_az = {}
+        useArr = use.to_numpy(dtype=bool)
         for tStep in range(len(hvsr_data['psd_raw'][anyK])):
             tStepDict = {}
             for k in hvsr_data['psd_raw']:
@@ -7062,17 +7112,33 @@ def move_avg(y, box_pts):
                     hvsr_tSteps_az[k] = [np.float32(v)]
                 else:
                     hvsr_tSteps_az[k].append(np.float32(v))
+
+            # Add the curves of this window to the streaming statistics
+            if useStreamingStats and useArr[tStep]:
+                tStepHVDict = {'HV': hvsr_tSteps[-1]}
+                for k in hvsr_az_tstep.keys():
+                    tStepHVDict[k] = hvsr_tSteps_az[k][-1]
+                for statType, curveDict in [('psd', tStepDict), ('hv', tStepHVDict), ('log_hv', tStepHVDict)]:
+                    for k, curve in curveDict.items():
+                        if k not in streamStats[statType]:
+                            streamStats[statType][k] = _init_streaming_stats(curve.shape[0], track_median=(statType == 'psd'))
+                        if statType == 'log_hv':
+                            curve = np.log10(np.clip(curve, 1e-10, None))
+                        _update_streaming_stats(streamStats[statType][k], curve)
     hvsr_data['hvsr_windows_df']['HV_Curves'] = hvsr_tSteps
 
     for k in hvsr_data['psd_raw'].keys():
         # Get average psd value across time for each channel (used to calc main H/V curve)
-        psdValsTAvg[k] = np.nanmedian(np.stack(hvsrDF[use]['psd_values_'+k]), axis=0)
-        stDev[k] = np.nanstd(np.stack(hvsrDF[use]['psd_values_'+k]), axis=0)
+        if useStreamingStats:
+            psdValsTAvg[k], stDev[k] = _streaming_stats_results(streamStats['psd'][k])
+        else:
+            psdValsTAvg[k] = np.nanmedian(np.stack(hvsrDF['psd_values_'+k][use]), axis=0)
+            stDev[k] = np.nanstd(np.stack(hvsrDF['psd_values_'+k][use]), axis=0)
 
         stDevValsM[k] = np.array(psdValsTAvg[k] - stDev[k])
         stDevValsP[k] = np.array(psdValsTAvg[k] + stDev[k])
 
-        currTimesUsed[k] = np.stack(hvsrDF[use]['TimesProcessed_Obspy'])
+        currTimesUsed[k] = np.stack(hvsrDF['TimesProcessed_Obspy'][use])
         # currTimesUsed[k] = psds[k]['current_times_used'] #original one
 
     # This gets the main hvsr curve averaged from all time steps
@@ -7118,7 +7184,7 @@ def move_avg(y, box_pts):
                 colID = 'HV'
             else:
                 colID = col_name.split('_')[2]
-            hvsr_out['ind_hvsr_curves'][colID] = np.stack(hvsr_out['hvsr_windows_df'][hvsr_out['hvsr_windows_df']['Use']][col_name])
+            hvsr_out['ind_hvsr_curves'][colID] = np.stack(hvsr_out['hvsr_windows_df'][col_name][hvsr_out['hvsr_windows_df']['Use']])
 
     # Initialize array based only on the curves we are currently using
     indHVCurvesArr = np.stack(hvsr_out['hvsr_windows_df']['HV_Curves'][hvsr_out['hvsr_windows_df']['Use']])
@@ -7126,8 +7192,18 @@ def move_avg(y, box_pts):
     if outlier_curve_percentile_threshold:
         if outlier_curve_percentile_threshold is True:
             outlier_curve_percentile_threshold = 98
+        useBeforeOutliers = hvsr_out['hvsr_windows_df']['Use'].to_numpy(dtype=bool, copy=True)
         hvsr_out = remove_outlier_curves(hvsr_out, use_percentile=True, outlier_threshold=outlier_curve_percentile_threshold, use_hv_curves=True, verbose=verbose)
 
+        # Outlier curves are removed from the H/V statistics (psd statistics are calculated before outlier removal, as with 'exact')
+        outlierWins = useBeforeOutliers & ~hvsr_out['hvsr_windows_df']['Use'].to_numpy(dtype=bool)
+        if useStreamingStats and outlierWins.any():
+            for k in streamStats['hv'].keys():
+                colName = 'HV_Curves' if k == 'HV' else 'HV_Curves_'+k
+                outlierCurves = np.stack(hvsr_out['hvsr_windows_df'][colName][outlierWins])
+                _update_streaming_stats(streamStats['hv'][k], outlierCurves, remove=True)
+                _update_streaming_stats(streamStats['log_hv'][k], np.log10(np.clip(outlierCurves, 1e-10, None)), remove=True)
+
     hvsr_out['ind_hvsr_stdDev'] = {}
     for col_name in hvsr_out['hvsr_windows_df'].columns:
         if "HV_Curves" in col_name:
@@ -7135,33 +7211,33 @@ def move_avg(y, box_pts):
                 keyID = 'HV'
             else:
                 keyID = col_name.split('_')[2]
-            curr_indHVCurvesArr = np.stack(hvsr_out['hvsr_windows_df'][col_name][hvsr_out['hvsr_windows_df']['Use']])
-            hvsr_out['ind_hvsr_stdDev'][keyID] = np.nanstd(curr_indHVCurvesArr, axis=0)
+            if useStreamingStats and keyID in streamStats['hv'].keys():
+                hvsr_out['ind_hvsr_stdDev'][keyID] = _streaming_stats_results(streamStats['hv'][keyID])[1]
+            else:
+                curr_indHVCurvesArr = np.stack(hvsr_out['hvsr_windows_df'][col_name][hvsr_out['hvsr_windows_df']['Use']])
+                hvsr_out['ind_hvsr_stdDev'][keyID] = np.nanstd(curr_indHVCurvesArr, axis=0)
 
     # Get peaks for each time step
     hvsr_out['ind_hvsr_peak_indices'] = {}
+    hvsr_out['ind_hvsr_peaks'] = {}
     tStepPFDict = {}
-    # hvsr_out['hvsr_windows_df']['CurvesPeakFreqs'] = {}
     for col_name in hvsr_out['hvsr_windows_df'].columns:
         if col_name.startswith("HV_Curves"):
-            tStepPeaks = []
             if len(col_name.split('_')) > 2:
                 colSuffix = "_"+'_'.join(col_name.split('_')[2:])
             else:
                 colSuffix = '_HV'
 
-            for tStepHVSR in hvsr_out['hvsr_windows_df'][col_name]:
-                tStepPeaks.append(__find_peaks(tStepHVSR))
+            # Peaks of all time windows at once, as a flat array of peak indices and the offsets of each window
+            tStepPeakInds, tStepPeakOffsets = __find_peaks_2d(np.stack(hvsr_out['hvsr_windows_df'][col_name]))
+            hvsr_out['ind_hvsr_peaks'][colSuffix[1:]] = {'indices': tStepPeakInds, 'offsets': tStepPeakOffsets}
 
+            # Per-window views of the same arrays, for hvsr_windows_df and export
+            tStepPeaks = np.split(tStepPeakInds, tStepPeakOffsets[1:-1])
             hvsr_out['ind_hvsr_peak_indices']['CurvesPeakIndices'+colSuffix] = tStepPeaks
 
-            tStepPFList = []
-            for tPeaks in tStepPeaks:
-                tStepPFs = []
-                for pInd in tPeaks:
-                    tStepPFs.append(np.float32(hvsr_out['x_freqs'][anyK][pInd]))
-                tStepPFList.append(tStepPFs)
-            tStepPFDict['CurvesPeakFreqs'+colSuffix] = tStepPFList
+            tStepPeakFreqs = np.asarray(hvsr_out['x_freqs'][anyK])[tStepPeakInds].astype(np.float32)
+            tStepPFDict['CurvesPeakFreqs'+colSuffix] = np.split(tStepPeakFreqs, tStepPeakOffsets[1:-1])
 
     indHVPeakIndsDF = pd.DataFrame(hvsr_out['ind_hvsr_peak_indices'], index=hvsr_out['hvsr_windows_df'].index)
     tStepPFDictDF = pd.DataFrame(tStepPFDict, index=hvsr_out['hvsr_windows_df'].index)
@@ -7179,13 +7255,14 @@ def move_avg(y, box_pts):
     # Get frequency values at HV peaks in main curve
     hvsr_out['hvsr_peak_freqs'] = {}
     for k in hvsr_out['hvsr_peak_indices'].keys():
-        hvsrPF = []
-        for p in hvsr_out['hvsr_peak_indices'][k]:
-            hvsrPF.append(hvsr_out['x_freqs'][anyK][p])
-        hvsr_out['hvsr_peak_freqs'][k] = np.array(hvsrPF)
+        hvsr_out['hvsr_peak_freqs'][k] = np.asarray(hvsr_out['x_freqs'][anyK])[hvsr_out['hvsr_peak_indices'][k]]
 
     # Get other HVSR parameters (i.e., standard deviations, etc.)
-    hvsr_out = __gethvsrparams(hvsr_out)
+    if useStreamingStats:
+        hvsr_out['streaming_stats'] = streamStats
+        hvsr_out = __gethvsrparams(hvsr_out, stream_stats=streamStats)
+    else:
+        hvsr_out = __gethvsrparams(hvsr_out)
 
     # Include the original obspy stream in the output
     # hvsr_out['input_stream'] = hvsr_dataUpdate['input_stream'] #input_stream
@@ -7213,7 +7290,7 @@ def move_avg(y, box_pts):
 # Read data from Tromino
 def read_tromino_files(input_data, struct_format='H', tromino_model=None, diagnose=False,
                        sampling_rate=None, set_record_duration=None, start_byte=24576,
-
+                       time_window=None,
                        verbose=False, **kwargs):
 
     """Function to read data from tromino. Specifically, this has been lightly tested on Tromino 3G+ and Blue machines
@@ -7240,6 +7317,10 @@ def read_tromino_files(input_data, struct_format='H', tromino_model=None, diagno
         Duration of record to set manually in minutes, by default None
     start_byte : int, optional
         Used internally, by default 24576
+    time_window : tuple or None, optional
+        Tuple (starttime, endtime) of the part of the record to read. Only the data in this time window is read from the file.
+        Each time may be a number (seconds since the start of the record), anything readable by obspy.UTCDateTime(),
+        or None (start or end of the record). If None, the whole record is read, by default None.
     verbose : bool, optional
         Whether to print information to terminal, by default False
 
@@ -7268,12 +7349,12 @@ def read_tromino_files(input_data, struct_format='H', tromino_model=None, diagno
         tBlueKwargs = {k: v for k, v in kwargs.items() if k in tuple(inspect.signature(__read_tromino_data_blue).parameters.keys())}
         if 'sampling_rate' not in tBlueKwargs:
             tBlueKwargs['sampling_rate'] = sampling_rate
-            return __read_tromino_data_blue(input_filepath, verbose=False, **tBlueKwargs)
+        return __read_tromino_data_blue(input_filepath, time_window=time_window, verbose=False, **tBlueKwargs)
     else:
         return __read_tromino_data_yellow(input_data=input_data, sampling_rate=sampling_rate,
-
                                           struct_format=struct_format, tromino_model="3G+", diagnose=diagnose,
                                           set_record_duration=set_record_duration, start_byte=start_byte,
+                                          time_window=time_window,
                                           return_dict=False, verbose=verbose, **kwargs)
 
 
@@ -7625,15 +7706,19 @@ def remove_outlier_curves(hvsr_data, outlier_method='prototype',
                           outlier_threshold=50, use_percentile=True, min_pts=5,
                           use_hv_curves=False,
                           plot_engine='matplotlib', show_outlier_plot=False, generate_outlier_plot=True,
-                          verbose=False, **kwargs):
+                          outlier_metric='rmse', outlier_max_iterations=1, verbose=False, **kwargs):
     """Function used to remove outliers curves using a "prototype" or "dbscan" method.
 
     Prototype method calculates a prototype curve (i.e., median) and calculates the distance of the H/V or PSD curve from each window from that prototype curve.
-    Currently, Root Mean Square Error is used to calculate the distance for each windowed H/V or PSD curve at each frequency step for all times.
-    It calculates the RMSE for the PPSD curves of each component individually. All curves are removed from analysis.
+    By default, Root Mean Square Error is used to calculate the distance for each windowed H/V or PSD curve at each frequency step for all times
+    (see outlier_metric for a more robust alternative).
+    It calculates the RMSE for the PPSD curves of each component individually.
+    A window is removed from analysis if its curve is an outlier for any of the components.
 
     DBSCAN uses the DBSCAN method, outlier_threshold being by default the percentile value of distances of all curves from all other curves.
-    Distance is calculated using scipy.spatial.distance.pdist, by default with 'euclidean' distance.
+    Distance is calculated using scipy.spatial.distance.cdist, by default with 'euclidean' distance.
+    Distances are calculated in blocks of curves, so the full distance matrix is never held in memory.
+    For large numbers of windows, only the distances near the percentile (bounded using a random sample of curves) are kept to find its exact value.
 
     The `min_pts` parameter specifies the minimum number of curves whose distance must be within the threshold distance percentile/value to be retained.
 
@@ -7661,6 +7746,17 @@ def remove_outlier_curves(hvsr_data, outlier_method='prototype',
         This is minimum number of points a point needs in its neighborhood to not be considered an outlier.
     use_hv_curves : bool, default=False
         Whether to use the calculated HV Curve or the individual components. This can only be True after process_hvsr() has been run.
+    outlier_metric : str, {'rmse', 'mad'}
+        Distance of each curve from the prototype (median) curve, only used if outlier_method='prototype'.
+        'rmse' (default) uses the Root Mean Square Error.
+        'mad' uses the median absolute deviation from the prototype curve, scaled by the median absolute deviation
+        of all curves at each frequency (a robust z-score), so that a few very abberant curves have less influence.
+        If use_percentile=False, outlier_threshold is then a number of (robust) standard deviations, e.g., 3.5.
+    outlier_max_iterations : int, default=1
+        Maximum number of iterations of outlier detection, only used if outlier_method='prototype'.
+        With values above 1, the prototype curves are recalculated without the outliers found so far,
+        and outliers are identified again (using the thresholds from the first iteration)
+        until no new outliers are found or outlier_max_iterations is reached.
     show_plot : bool, default=False
         Whether to show a plot of the removed data
     verbose : bool, default=False
@@ -7673,7 +7769,7 @@ def remove_outlier_curves(hvsr_data, outlier_method='prototype',
 
     SEE ALSO
     --------
-    [scipy.spatial.distance.pdist](https://docs.scipy.org/doc/scipy/reference/generated/scipy.spatial.distance.pdist.html#scipy.spatial.distance.pdist)
+    [scipy.spatial.distance.cdist](https://docs.scipy.org/doc/scipy/reference/generated/scipy.spatial.distance.cdist.html#scipy.spatial.distance.cdist)
     """
     # Setup function
     #Get intput paramaters
@@ -7699,6 +7795,8 @@ def remove_outlier_curves(hvsr_data, outlier_method='prototype',
     use_percentile = orig_args['use_percentile']
     min_pts = orig_args['min_pts']
     use_hv_curves = orig_args['use_hv_curves']
+    outlier_metric = orig_args['outlier_metric']
+    outlier_max_iterations = orig_args['outlier_max_iterations']
     plot_engine = orig_args['plot_engine']
     show_outlier_plot = orig_args['show_outlier_plot']
     generate_outlier_plot = orig_args['generate_outlier_plot']
@@ -7763,7 +7861,7 @@ def remove_outlier_curves(hvsr_data, outlier_method='prototype',
     if not use_hv_curves:
         compNames = ['Z', 'E', 'N']
         for col_name in hvsr_data['hvsr_windows_df'].columns:
-            if 'psd_values' in col_name and 'RMSE' not in col_name:
+            if col_name.startswith('psd_values_'):
                 cName = col_name.split('_')[2]
                 if cName not in compNames:
                     compNames.append(cName)
@@ -7815,6 +7913,8 @@ def remove_outlier_curves(hvsr_data, outlier_method='prototype',
                                               col_names=colNames,
                                               comp_names=compNames,
                                               col_prefix=col_prefix,
+                                              outlier_metric=outlier_metric,
+                                              max_iterations=outlier_max_iterations,
                                               verbose=verbose)
     else:
         hvsr_out = __prototype_outlier_detect(hvsr_data, use_hv_curves=use_hv_curves,
@@ -7824,6 +7924,8 @@ def remove_outlier_curves(hvsr_data, outlier_method='prototype',
                                               col_names=colNames,
                                               comp_names=compNames,
                                               col_prefix=col_prefix,
+                                              outlier_metric=outlier_metric,
+                                              max_iterations=outlier_max_iterations,
                                               verbose=verbose)
 
     # Show plot of removed/retained data
@@ -8117,18 +8219,215 @@ def __get_report_batch(**get_report_kwargs):
             else:
                 get_report_kwargs['report_formats'] = 'print'
                 get_report(**get_report_kwargs)
-
-    except:
-        warnMsg = f"Error in get_report({get_report_kwargs['hvsr_results']['site']}, **get_report_kwargs)"
+        hvsr_results['processing_status']['get_report_status'] = True
+    except Exception as e:
+        warnMsg = f"Error in get_report({get_report_kwargs['hvsr_results']['site']}, **get_report_kwargs): {e}"
         if get_report_kwargs['verbose']:
             print('\t'+warnMsg)
         else:
             warnings.warn(warnMsg, RuntimeWarning)
         hvsr_results = get_report_kwargs['hvsr_results']
+        hvsr_results['processing_status']['get_report_status'] = False
 
     return hvsr_results
 
 
+# Helper function for rendering batch reports in parallel (get_report with report_workers > 1)
+def __get_report_parallel(hvsr_batch, report_kwargs, report_workers=None):
+    """Private function to render the reports of the sites in an HVSRBatch object concurrently in worker processes.
+
+    Each worker runs get_report() for one site, and exports the same files the serial batch would (except table reports).
+    Table reports are exported afterwards from the main process, one site at a time, so that csv_handling (e.g., 'append') works as in serial mode.
+
+    Parameters
+    ----------
+    hvsr_batch : HVSRBatch
+        HVSRBatch object with processed data (check_peaks() already run)
+    report_kwargs : dict
+        Arguments of get_report() (orig_args of the get_report() call)
+    report_workers : int or None, optional
+        Maximum number of worker processes. If None, uses os.cpu_count(), by default None
+
+    Returns
+    -------
+    HVSRBatch
+        hvsr_batch with Print_Report, Table_Report, HTML_Report, Plot_Report and Report_Paths attributes updated for each site that was rendered.
+        processing_status['get_report_status'] is False for each site where get_report() raised an error.
+    """
+    if report_kwargs['verbose']:
+        print(f'\tRendering reports with {report_workers if report_workers is not None else os.cpu_count()} worker processes')
+
+    # Do not send the whole batch to each worker
+    report_kwargs = {k: v for k, v in report_kwargs.items() if k != 'hvsr_results'}
+
+    siteList = [site for site in hvsr_batch.keys() if hvsr_batch[site]['processing_status']['overall_status']]
+
+    # If report_export_path is a file, the serial batch writes the reports of every site to the same file(s), so the last site is what remains.
+    #  Here, only the last site writes to these files (so that workers do not write to the same file at the same time)
+    exportFormats = [ef for ef in __get_report_formats(report_kwargs['report_export_format']) if ef != 'table']
+    sharedFormats = []
+    exportPath = report_kwargs['report_export_path']
+    if exportPath is not None and exportPath is not True and exportPath is not False:
+        sharedFormats = ['print', 'html']
+        if isinstance(exportPath, (list, tuple)) or not pathlib.Path(exportPath).is_dir():
+            sharedFormats.extend(['plot', 'pdf'])
+
+    siteKwargs = {}
+    for site in siteList:
+        siteKwargs[site] = report_kwargs.copy()
+        siteKwargs[site]['report_export_format'] = exportFormats
+        if site != siteList[-1]:
+            siteKwargs[site]['report_export_format'] = [ef for ef in exportFormats if ef not in sharedFormats]
+            # pdf reports are always written to report_export_path
+            if 'pdf' in sharedFormats:
+                siteKwargs[site]['report_formats'] = [rf for rf in __get_report_formats(report_kwargs['report_formats']) if rf != 'pdf']
+
+    renderedSites = []
+    failedSites = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=report_workers, initializer=matplotlib.use, initargs=('Agg',)) as executor:
+        futureDict = {executor.submit(__get_report_worker, hvsr_batch[site], siteKwargs[site]): site for site in siteList}
+        for future in concurrent.futures.as_completed(futureDict):
+            site = futureDict[future]
+            try:
+                workerResults = future.result()
+            except Exception as e:
+                # The error is kept with the site (as in serial mode), and all failures are reported together below
+                failedSites[site] = e
+                hvsr_batch[site]['processing_status']['get_report_status'] = False
+                continue
+
+            for k, v in workerResults.items():
+                hvsr_batch[site][k] = v
+            hvsr_batch[site]['processing_parameters']['get_report'] = report_kwargs.copy()
+            hvsr_batch[site]['processing_status']['get_report_status'] = True
+            renderedSites.append(site)
+
+    # Only the last site wrote the shared files, but the reports of the other sites are also written there in serial mode
+    if len(siteList) > 0 and siteList[-1] in renderedSites and 'Report_Paths' in hvsr_batch[siteList[-1]].keys():
+        sharedPaths = {ef: expPath for ef, expPath in hvsr_batch[siteList[-1]]['Report_Paths'].items() if ef in sharedFormats}
+        for site in renderedSites:
+            if 'Report_Paths' in hvsr_batch[site].keys():
+                for ef, expPath in sharedPaths.items():
+                    hvsr_batch[site]['Report_Paths'].setdefault(ef, expPath)
+
+    for site in siteList:
+        if site in failedSites.keys():
+            e = failedSites[site]
+            warnMsg = f"Error in get_report({site}, **get_report_kwargs): {type(e).__name__}: {e}"
+            if report_kwargs['verbose']:
+                print('\t'+warnMsg)
+                traceback.print_exception(type(e), e, e.__traceback__)
+            else:
+                warnings.warn(warnMsg, RuntimeWarning)
+
+    # Table reports may be appended to the same file, so these are exported in order from the main process
+    if 'table' in __get_report_formats(report_kwargs['report_export_format']):
+        tableExportPath = exportPath
+        if isinstance(exportPath, (list, tuple)):
+            # Same order of report_formats as in get_report() (print first)
+            reportFormats = __get_report_formats(report_kwargs['report_formats'])
+            if 'print' in reportFormats:
+                reportFormats.insert(0, reportFormats.pop(reportFormats.index('print')))
+            tableExportPath = exportPath[reportFormats.index('table')] if 'table' in reportFormats else None
+        if tableExportPath is not None and tableExportPath is not True and tableExportPath is not False:
+            tableExportPath = pathlib.Path(tableExportPath).with_suffix('.csv')
+
+        for site in siteList:
+            if site in renderedSites and 'Table_Report' in hvsr_batch[site].keys():
+                export_report(hvsr_batch[site], azimuth=report_kwargs['azimuth'],
+                              report_export_format='table', report_export_path=tableExportPath,
+                              csv_handling=report_kwargs['csv_handling'],
+                              show_report=False, verbose=False)
+
+    return hvsr_batch
+
+
+# Helper function (runs in worker process) for rendering the reports of a single site
+def __get_report_worker(hvsr_data, report_kwargs):
+    """Private function to run get_report() on a single site in a worker process, exporting the reports in report_kwargs['report_export_format'].
+    
+    Returns the reports (including the Plot_Report figure) and the paths of the exported reports."""
+    matplotlib.use('Agg')
+
+    workerKwargs = {k: v for k, v in report_kwargs.items() if k not in ['kwargs', 'report_workers']}
+    workerKwargs.update(report_kwargs['kwargs'])
+    workerKwargs.update({'suppress_report_outputs': True, 'verbose': False})
+    # Parameters from earlier get_report() calls should not override these
+    hvsr_data['processing_parameters'].pop('get_report', None)
+    hvsr_data = get_report(hvsr_data, **workerKwargs)
+
+    # The figure is sent back to the main process (pickled), so it does not need to stay open here
+    if 'Plot_Report' in hvsr_data.keys() and not str(report_kwargs['plot_engine']).lower() in ['plotly', 'plty', 'p']:
+        plt.close(hvsr_data['Plot_Report'])
+
+    # Only send back the reports (not the whole HVSRData object) to the main process
+    workerResults = {}
+    for attr in ['Print_Report', 'Table_Report', 'HTML_Report', 'Plot_Report', 'Report_Paths']:
+        if attr in hvsr_data.keys():
+            workerResults[attr] = hvsr_data[attr]
+
+    return workerResults
+
+
+# Helper function to get the report_formats parameter of get_report() as a list
+def __get_report_formats(report_formats):
+    """Private function to get report_formats (or report_export_format) of get_report() as a list of formats"""
+    if report_formats is None:
+        return []
+    elif isinstance(report_formats, (list, tuple)):
+        return [str(rf).lower() for rf in report_formats]
+    elif str(report_formats).lower() in [':', 'all']:
+        return ['print', 'table', 'plot', 'html', 'pdf']
+    return [str(report_formats).lower()]
+
+
+# Helper function for reusing figures in plot_hvsr (reuse_fig=True)
+def __get_plot_template(mosaic, per_subplot_kw, layout, figsize, dpi):
+    """Private function to get a (cleared) figure and axes for plot_hvsr() with the given subplot layout.
+
+    The figure is only created the first time a layout is used. After that, the same figure is cleared and returned,
+    so the figure and subplot layout do not need to be built again for each site.
+
+    Parameters
+    ----------
+    mosaic : list
+        Subplot layout, as used by plt.subplot_mosaic()
+    per_subplot_kw : dict
+        per_subplot_kw parameter of plt.subplot_mosaic()
+    layout : str
+        layout parameter of plt.subplot_mosaic()
+    figsize : tuple
+        Figure size in inches
+    dpi : int
+        Figure dpi
+
+    Returns
+    -------
+    fig, ax
+        Figure and dict of axes (same as returned by plt.subplot_mosaic())
+    """
+    templateKey = (tuple(tuple(row) for row in mosaic), tuple(sorted(per_subplot_kw.keys())), layout, tuple(figsize), dpi)
+
+    if templateKey in _plot_templates and plt.fignum_exists(_plot_templates[templateKey][0].number):
+        fig, ax = _plot_templates[templateKey]
+
+        # Remove anything that was added to the figure in addition to the template axes (e.g., twin axes, colorbars, texts)
+        for extraAx in [a for a in fig.axes if a not in ax.values()]:
+            extraAx.remove()
+        for figText in fig.texts[:]:
+            figText.remove()
+        for a in ax.values():
+            a.clear()
+        # New layout engine, so the current rcParams (e.g., padding) are used like with a new figure
+        fig.set_layout_engine(layout)
+    else:
+        fig, ax = plt.subplot_mosaic(mosaic, per_subplot_kw=per_subplot_kw,
+                                     layout=layout, figsize=figsize, dpi=dpi)
+        _plot_templates[templateKey] = (fig, ax)
+
+    return fig, ax
+
+
 # Helper function for batch procesing of azimuth
 def __azimuth_batch(**azimuth_kwargs):
     try:
@@ -8667,6 +8966,7 @@ def __detrend_data(input, detrend, detrend_options, verbose, source):
 def __read_tromino_data_yellow(input_data, sampling_rate=None,
                                struct_format='H', tromino_model='3G',
                                start_byte=24576, diagnose=False,
+                               time_window=None, data_start=0xC000,
                                return_dict=True,
                                verbose=False, **kwargs):
 
@@ -8674,11 +8974,15 @@ def __read_tromino_data_yellow(input_data, sampling_rate=None,
     if isinstance(input_data, HVSRData):
         input_filepath = input_data['input_data']
 
-    # Reconfigure data for some of the analysis
-    swapped = __read_and_swap_bytes(input_filepath)
+    # Read file only once (memory-mapped), all other steps use these bytes
+    # Only the parts of the file that are used (header and requested data) are actually read from disk
+    rawBytes = __read_tromino_bytes(input_filepath)
+
+    # Reconfigure data for some of the analysis (only the header, before the seismic data)
+    swapped = __swap_byte_pairs(rawBytes[:data_start])
 
     # Extract header information (text sections)
-    header_text = __extract_text_sections(swapped.copy())
+    header_text = __extract_text_sections(swapped)
 
     result = {
         'site_name': None,
@@ -8706,45 +9010,13 @@ def __read_tromino_data_yellow(input_data, sampling_rate=None,
     if 'sampling_rate' in kwargs.keys():
         sampling_rate = kwargs['sampling_rate']
 
-    strucSizes = {'c':1, 'b':1,'B':1, '?':1,
-                'h':2,'H':2,'e':2,
-                'i':4,'I':4,'l':4,'L':4,'f':4,
-                'q':8,'Q':8,'d':8,
-                'n':8,'N':8,'s':16,'p':16,'P':16,'x':16}
-
-    #H (pretty sure it's Q) I L or Q all seem to work (probably not Q?)
-    structFormat = struct_format
-    structSize = strucSizes[structFormat]
-
-    dataList = []
-    with open(input_filepath, 'rb') as f:
-        while True:
-            data = f.read(structSize)  # Read 4 bytes
-            if not data:  # End of file
-                break
-            value = struct.unpack(structFormat, data)[0]  # Interpret as a float
-            dataList.append(value)
-
-    dataArr = np.array(dataList)
-
-    #medVal = np.nanmedian(dataArr[50000:100000])
-
     if 'start_byte' in kwargs.keys():
         start_byte = kwargs['start_byte']
 
-    if diagnose:
-        print("Total file bytes: ", len(dataArr))
-
-        fig, ax = plt.subplots(3, sharex=True, sharey=True)
-        ax[0].plot(comp1, linewidth=0.1, c='k')
-        ax[1].plot(comp2, linewidth=0.1, c='k')
-        ax[2].plot(comp3, linewidth=0.1, c='k')
-        plt.show()
-
     try:
         if verbose:
             print("\t\tExtracting metadata from tromino yellow instrument:")
-        metaDict = __get_tromino_yellow_metadata(input_filepath)
+        metaDict = __get_tromino_yellow_metadata(rawBytes)
         if verbose:
             print(f"\t\t  Starttime: {metaDict['starttime']}\n\t\t  Number of Data Channels: {metaDict['no_data_channels']} \n\t\t  Sampling Rate: {metaDict['sampling_rate']}\n")
 
@@ -8777,22 +9049,6 @@ def __read_tromino_data_yellow(input_data, sampling_rate=None,
     if station is None:
         station='HVSRSite'
 
-    # Get the actual data from the tromino yellow
-    dataArr = __extract_tromino_yellow_data(input_data=input_filepath, start_byte=start_byte,
-                                            swapped_bytes=__read_and_swap_bytes(input_filepath, return_unswapped=True),
-
-                                            no_channels=no_channels,
-
-                                            data_start=0xC000)
-
-    # Get geophone data from each channel
-    compN = dataArr[0]
-    compE = dataArr[1]
-    compZ = dataArr[2]
-
-    # Calculate end time based on length of data
-    eTime = inst_sTime + (((len(compN))/sampling_rate)/60)*60
-
     loc = ''
     if 'GRILLA' in str(input_filepath) and pathlib.Path(input_filepath).exists():
         # Get partition number and make that the location
@@ -8800,10 +9056,36 @@ def __read_tromino_data_yellow(input_data, sampling_rate=None,
     elif  station is not None and (type(station) is int or station.isdigit()):
         loc = str(station)
 
-    sTime = inst_sTime
-    if hasattr(input_data, 'starttime') and input_data['starttime'].datetime!=NOWTIME:
+    # Get the samples in the requested time window (relative to the start of the record in the file header)
+    nFileSamples = max(len(rawBytes) - data_start, 0) // 2 // no_channels
+    sampleWindow = __get_sample_window(time_window, starttime=inst_sTime, sampling_rate=sampling_rate, n_samples=nFileSamples)
+
+    sTime = inst_sTime + sampleWindow[0] / sampling_rate
+    # If the whole record is read, the starttime may be set (e.g., if the instrument clock was not set)
+    if time_window is None and hasattr(input_data, 'starttime') and input_data['starttime'].datetime!=NOWTIME:
         sTime = input_data['starttime']
 
+    # Get the actual data from the tromino yellow
+    dataArr = __extract_tromino_yellow_data(input_data=input_filepath, start_byte=start_byte,
+                                            swapped_bytes=rawBytes,
+                                            no_channels=no_channels,
+                                            data_start=data_start,
+                                            sample_window=sampleWindow)
+
+    if diagnose:
+        print("Total file bytes: ", rawBytes.shape[0])
+
+        fig, ax = plt.subplots(3, sharex=True, sharey=True)
+        ax[0].plot(dataArr[0], linewidth=0.1, c='k')
+        ax[1].plot(dataArr[1], linewidth=0.1, c='k')
+        ax[2].plot(dataArr[2], linewidth=0.1, c='k')
+        plt.show()
+
+    # Get geophone data from each channel (views of dataArr, not copies)
+    compN = dataArr[0]
+    compE = dataArr[1]
+    compZ = dataArr[2]
+
     traceHeaderN = {'sampling_rate':sampling_rate,
                     'calib' : 1,
                     'npts':len(compN),
@@ -8839,10 +9121,13 @@ def __read_tromino_data_yellow(input_data, sampling_rate=None,
 def __read_tromino_data_blue(input_data, sampling_rate=None,
 
                             channel_map={'Z':6, 'E':4, 'N':2}, data_start_buffer=113,
-                            return_dict=False, verbose=False):
+                            time_window=None, return_dict=False, verbose=False):
+
+    # Read file only once (memory-mapped), all other steps use these bytes
+    rawBytes = __read_tromino_bytes(input_data)
 
     # Reconfigure data for some of the analysis
-    swapped = __read_and_swap_bytes(input_data)
+    swapped = __swap_byte_pairs(rawBytes)
 
     # Initialize a result dictionary
     result = {
@@ -8925,34 +9210,44 @@ def __read_tromino_data_blue(input_data, sampling_rate=None,
         if verbose:
             print('\tSampling rate detected as:', sampling_rate)
 
-    # Read the file as simple bytes
-    with open(input_data, 'rb') as f:
-        f.seek(seis_data_start + data_buffer)
-        # Read the rest of the file
-        raw_bytes = f.read()
+    # Extract data from GPS strings
+    acq_date = obspy.UTCDateTime().now()
+    sTime = datetime.time()
+    latPts = []
+    lonPts = []
+    elevPts = []
+
+    for gpsPt in result['gps_data']:
+        if 'ZDA' in gpsPt['type']:
+            if 'timestamp' in gpsPt:
+                sTime = datetime.time(int(gpsPt['timestamp'][:2]), int(gpsPt['timestamp'][2:4]), int(gpsPt['timestamp'][4:6]))
+            if 'date' in gpsPt:
+                acq_date=obspy.UTCDateTime(gpsPt['date'])
+
+        if 'GGA' in gpsPt['type']:
+            latPts.append(gpsPt['latitude'])
+            lonPts.append(gpsPt['longitude'])
+            elevPts.append(float(gpsPt['raw'].split(',')[9]))
+
+    acq_date = acq_date + (sTime.hour* 60*60 + sTime.minute*60 + sTime.second)
+
+    # Get the seismic data bytes (without reading the file again)
+    raw_bytes = rawBytes[seis_data_start + data_buffer:]
     #raw_bytes = swapped[seis_data_start + data_buffer:]
 
     # Assign variables for reading data
     bytes_per_sample = 2  # 16-bit
     num_channels = 7 #3x accel, 3x seism, 1x trigger
-    total_samples = len(raw_bytes) // bytes_per_sample
-
-    # Decode all samples
-    values = []
-    for i in range(total_samples):
-        start_byte = i * bytes_per_sample
-        sample_bytes = raw_bytes[start_byte:start_byte + bytes_per_sample]
 
-        # Try little-endian first
-        value = int.from_bytes(sample_bytes, byteorder='little', signed=True)
-        values.append(value)
+    # Only use complete sets of channel data in the requested time window
+    total_frames = len(raw_bytes) // (bytes_per_sample * num_channels)
+    sampleWindow = __get_sample_window(time_window, starttime=acq_date, sampling_rate=sampling_rate, n_samples=total_frames)
+    acq_date = acq_date + sampleWindow[0] / sampling_rate
+    frameSize = bytes_per_sample * num_channels
 
-    # Convert to numpy array
-    data = np.array(values, dtype=np.int32)
-
-    # Ensure we have complete sets of channel data
-    usable_samples = (len(data) // num_channels) * num_channels
-    channel_data = data[:usable_samples].reshape(-1, num_channels)
+    # Decode all samples at once (little-endian, signed 16-bit)
+    data = np.frombuffer(raw_bytes[sampleWindow[0] * frameSize:sampleWindow[1] * frameSize], dtype='<i2').astype(np.int32)
+    channel_data = data.reshape(-1, num_channels)
 
     if verbose:
         # Analyze the data
@@ -8977,26 +9272,6 @@ def __read_tromino_data_blue(input_data, sampling_rate=None,
         plt.tight_layout()
         plt.show()
 
-    # Extract data from GPS strings
-    acq_date = obspy.UTCDateTime().now()
-    sTime = datetime.time()
-    latPts = []
-    lonPts = []
-    elevPts = []
-
-    for gpsPt in result['gps_data']:
-        if 'ZDA' in gpsPt['type']:
-            if 'timestamp' in gpsPt:
-                sTime = datetime.time(int(gpsPt['timestamp'][:2]), int(gpsPt['timestamp'][2:4]), int(gpsPt['timestamp'][4:6]))
-            if 'date' in gpsPt:
-                acq_date=obspy.UTCDateTime(gpsPt['date'])
-
-        if 'GGA' in gpsPt['type']:
-            latPts.append(gpsPt['latitude'])
-            lonPts.append(gpsPt['longitude'])
-            elevPts.append(float(gpsPt['raw'].split(',')[9]))
-
-    acq_date = acq_date + (sTime.hour* 60*60 + sTime.minute*60 + sTime.second)
     stats = {'network': 'TR',
             'station': 'BLUE',
             'sampling_rate': sampling_rate,
@@ -9027,45 +9302,22 @@ def __read_tromino_data_blue(input_data, sampling_rate=None,
 
 
 # Get the actual data from the tromino yellow
-def __extract_tromino_yellow_data(input_data, swapped_bytes, no_channels, struct_format='H', start_byte=24576, data_start=0xC000):
-    # Assuming data starts at offset 0xC000
-    data_bytes = swapped_bytes[data_start:]
-
-    # Try first with unsigned integers
-    data_array = np.frombuffer(data_bytes, dtype=np.uint16)
-    if np.std(data_array) > 20000:
-        data_array = np.frombuffer(data_bytes, dtype=np.int16)
-
-    #max_val = data_array.max()
-    #dataNorm = data_array/max_val
-    #num_small = (dataNorm < 0.5).sum()
-
-    #small_ratio = num_small / len(data_array)
-    #print("SMALL RATIO", small_ratio)
-    #if small_ratio > 0.5:
-    #    print("SWITCHING ENDIANNES")
-    #    data_array = np.frombuffer(data_bytes, dtype='h')
-
-    strucSizes = {'c':1, 'b':1,'B':1, '?':1,
-                'h':2,'H':2,'e':2,
-                'i':4,'I':4,'l':4,'L':4,'f':4,
-
-                'q':8,'Q':8,'d':8,
-                'n':8,'N':8,'s':16,'p':16,'P':16,'x':16}
-
-    structFormat = struct_format
-    structSize = strucSizes[structFormat]
-
-    dataList = []
-    with open(input_data, 'rb') as f:
-        while True:
-            data = f.read(structSize)  # Read 4 bytes
-            if not data:  # End of file
-                break
-            value = struct.unpack(structFormat, data)[0]  # Interpret as a float
-            dataList.append(value)
-
-    #data_array = np.array(dataList)
+def __extract_tromino_yellow_data(input_data, swapped_bytes, no_channels, struct_format='H', start_byte=24576, data_start=0xC000,
+                                  sample_window=None):
+    # Assuming data starts at offset 0xC000 (only use complete frames, with one 16-bit sample for each channel)
+    frameSize = 2 * no_channels
+    nFrames = max(len(swapped_bytes) - data_start, 0) // frameSize
+    if sample_window is None:
+        sample_window = (0, nFrames)
+    startFrame = min(max(sample_window[0], 0), nFrames)
+    endFrame = min(max(sample_window[1], startFrame), nFrames)
+
+    # Only the bytes in sample_window are decoded
+    data_bytes = swapped_bytes[data_start + startFrame * frameSize:data_start + endFrame * frameSize]
+
+    # Unsigned or signed integers (decided once for the whole file, so all time windows are decoded the same way)
+    dataType = __get_tromino_yellow_dtype(swapped_bytes, data_start=data_start)
+    data_array = np.frombuffer(data_bytes, dtype=dataType)
 
     channel_jump = no_channels
     startPt = 0
@@ -9073,19 +9325,53 @@ def __extract_tromino_yellow_data(input_data, swapped_bytes, no_channels, struct
     eChannelStart = startPt+int(channel_jump/3)
     zChannelStart = startPt+int(channel_jump*(2/3))
 
-    comp1 = data_array[nChannelStart::channel_jump]
-    comp2 = data_array[eChannelStart::channel_jump]
-    comp3 = data_array[zChannelStart::channel_jump]
-
-    comp1 = list(comp1 - np.median(comp1))
-    comp2 = list(comp2 - np.median(comp2))
-    comp3 = list(comp3 - np.median(comp3))
+    # One (3, n) array for all components, so each component is a contiguous row
+    data_frames = data_array.reshape(-1, channel_jump)
+    data_array = np.array(data_frames[:, [nChannelStart, eChannelStart, zChannelStart]].T, dtype=np.float64, order='C')
 
-    data_array = np.array([comp1, comp2, comp3])
+    # The median of each channel is from the whole file (not only sample_window), so a time window has the same values as the whole record
+    #  As in __get_tromino_yellow_dtype(), frames evenly spaced through the file are used for large files
+    if data_array.shape[1] > 0:
+        file_frames = np.frombuffer(swapped_bytes[data_start:data_start + nFrames * frameSize], dtype=dataType).reshape(-1, channel_jump)
+        file_frames = file_frames[::max(1, nFrames // 2**20), [nChannelStart, eChannelStart, zChannelStart]]
+        data_array -= np.median(file_frames.astype(np.float64), axis=0)[:, np.newaxis]
 
     return data_array
 
 
+# Helper function to get the integer type of tromino yellow data
+def __get_tromino_yellow_dtype(swapped_bytes, data_start=0xC000):
+    """Try first with unsigned integers, use signed integers if the data of the whole file is not consistent with unsigned integers.
+    
+    For large files, the check uses samples evenly spaced through the file (at most 2**20), so the whole file does not need to be read."""
+    nValues = max(len(swapped_bytes) - data_start, 0) // 2
+    fileData = np.frombuffer(swapped_bytes[data_start:data_start + nValues * 2], dtype=np.uint16)
+    if fileData.shape[0] > 0 and np.std(fileData[::max(1, fileData.shape[0] // 2**20)]) > 20000:
+        return np.int16
+    return np.uint16
+
+
+# Helper function to get the (start, end) sample indices of a time window (end is exclusive)
+def __get_sample_window(time_window, starttime, sampling_rate, n_samples):
+    """Convert time_window (starttime, endtime) to sample indices, where times are seconds since starttime or absolute times"""
+    if time_window is None:
+        return (0, n_samples)
+
+    sampleBounds = []
+    for winTime, defaultSample, sampleOffset in zip(time_window, [0, n_samples], [0, 1]):
+        if winTime is None:
+            sampleBounds.append(defaultSample)
+            continue
+
+        if isinstance(winTime, numbers.Number):
+            secondsFromStart = winTime
+        else:
+            secondsFromStart = obspy.UTCDateTime(winTime) - obspy.UTCDateTime(starttime)
+        sampleBounds.append(min(max(int(round(secondsFromStart * sampling_rate)) + sampleOffset, 0), n_samples))
+
+    return (sampleBounds[0], max(sampleBounds))
+
+
 # Read starttime, number of channels, and sampling rate
 def __get_tromino_yellow_metadata(input_data, start_hex='00004020', end_hex='00004030'):
     """
@@ -9093,8 +9379,8 @@ def __get_tromino_yellow_metadata(input_data, start_hex='00004020', end_hex='000
 
     Parameters
     ----------
-    input_data : str
-        Path to the binary .trc file.
+    input_data : str or numpy.ndarray
+        Path to the binary .trc file, or its (unswapped) bytes.
     start_hex : int or str
         Start hex offset (int or hex string, e.g., default='00004000').
     end_hex  : int or str
@@ -9104,25 +9390,19 @@ def __get_tromino_yellow_metadata(input_data, start_hex='00004020', end_hex='000
     start = int(start_hex, 16) if isinstance(start_hex, str) else start_hex
     end = int(end_hex, 16) if isinstance(end_hex, str) else end_hex
 
-    with open(input_data, 'rb') as f:
-        alldata = f.read()
-
-    swapped = bytearray(len(alldata))
-    for i in range(0, len(alldata) - 1, 2):
-        swapped[i] = alldata[i + 1]
-        swapped[i + 1] = alldata[i]
-
-    if len(alldata) % 2 == 1:
-        swapped[-1] = alldata[-1]
+    if isinstance(input_data, (bytes, bytearray, np.ndarray)):
+        alldata = input_data
+    else:
+        alldata = __read_tromino_bytes(input_data)
 
-    data = swapped[start:end]
+    # Only the requested bytes need to be swapped (start is at an even offset)
+    data = __swap_byte_pairs(alldata[start:end])
 
     byteList = [f"{b:b}" for b in data]
     hexList = [f"{b:02X}" for b in data]
 
     if len(data) >= 2:
-        ints16 = struct.iter_unpack(">H", data[:len(data)//2*2])
-        ints16List = [x[0] for x in ints16]
+        ints16List = np.frombuffer(data[:len(data)//2*2], dtype='>u2').tolist()
 
     df = pd.DataFrame({'BYTES':byteList, 'HEX':hexList})
 
@@ -9148,25 +9428,32 @@ def __read_and_swap_bytes(input_file, return_unswapped=False):
     to read a binary file and return a bytearray with all bytes swapped in pairs.
     This handles odd-length files correctly.
     """
+    data = __read_tromino_bytes(input_file)
 
-    # Open binary file
-    with open(input_file, 'rb') as f:
-        data = f.read()
+    if return_unswapped:
+        return data
+    return __swap_byte_pairs(data)
 
-    # Create new byte array for the swapped data
-    swapped = bytearray(len(data))
 
-    # Swap bytes in pairs
-    for i in range(0, len(data) - 1, 2):
-        swapped[i] = data[i + 1]
-        swapped[i + 1] = data[i]
+# Helper function, Part of reading tromino datap
+def __read_tromino_bytes(input_file):
+    """Memory-map a binary file as a (read-only) numpy array of bytes, so it is only read from disk once"""
+    if pathlib.Path(input_file).stat().st_size == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(input_file, dtype=np.uint8, mode='r')
 
-    # Handle odd length
-    if len(data) % 2 == 1:
-        swapped[-1] = data[-1]
 
-    if return_unswapped:
-        return data
+# Helper function, Part of reading tromino datap
+def __swap_byte_pairs(data):
+    """Return a bytearray with all bytes of data swapped in pairs (any odd last byte is kept in place)"""
+    dataArr = np.frombuffer(data, dtype=np.uint8)
+    evenLen = dataArr.shape[0] // 2 * 2
+
+    # Swapping each pair of bytes is the same as swapping the byte order of 16-bit values
+    swapped = bytearray(dataArr.shape[0])
+    swappedArr = np.frombuffer(swapped, dtype=np.uint8)
+    swappedArr[:evenLen] = dataArr[:evenLen].view('<u2').byteswap().view(np.uint8)
+    swappedArr[evenLen:] = dataArr[evenLen:]
     return swapped
 
 
@@ -9224,7 +9511,7 @@ def __locate_data_start_blue(data):
 
 # Helper function, Part of reading tromino data
 # Read data from raspberry shake
-def __read_RS_file_struct(input_data, source, year, doy, inv, params, verbose=False):
+def __read_RS_file_struct(input_data, source, year, doy, inv, params, save_archive_index=True, verbose=False):
     """"Private function used by fetch_data() to read in Raspberry Shake data"""
     from obspy.core import UTCDateTime
     fileList = []
@@ -9234,55 +9521,47 @@ def __read_RS_file_struct(input_data, source, year, doy, inv, params, verbose=Fa
     #Read RS files
     if source=='raw': #raw data with individual files per trace
         if input_data.is_dir():
-            for child in input_data.iterdir():
-                if child.is_file() and child.name.startswith('AM') and str(doy).zfill(3) in child.name and str(year) in child.name:
-                    filesinfolder = True
-                    folderPathList.append(input_data)
-                    fileList.append(child)
-                elif child.is_dir() and child.name.startswith('EH') and not filesinfolder:
-                    folderPathList.append(child)
-                    for c in child.iterdir():
-                        if c.is_file() and c.name.startswith('AM') and c.name.endswith(str(doy).zfill(3)) and str(year) in c.name:
-                            fileList.append(c)
+            # Files are organized by day, so only the days in the requested time range are read
+            # Files are looked up in an index of the archive (updated only where the archive has changed)
+            dayList = __get_RS_day_list(params, year, doy)
+            archiveIndex, rootFiles, subDirFiles = __find_RS_day_files(input_data, dayList, save_index=save_archive_index, verbose=verbose)
+            if len(rootFiles) > 0:
+                filesinfolder = True
+                fileList = rootFiles
+            else:
+                fileList = subDirFiles
+
+            # Group day files by channel (e.g., AM.RAC84.00.EHZ.D.2023.150 -> AM.RAC84.00.EHZ.D)
+            channelFiles = {}
+            for f in fileList:
+                channelFiles.setdefault(f.name.rsplit('.', 2)[0], []).append(f)
+            channelKeys = sorted(channelFiles.keys(), reverse=True) # Puts z channel first
 
             if len(fileList) == 0:
-                doyList = []
-                printList= []
-                for j, folder in enumerate(folderPathList):
-                    for i, file in enumerate(folder.iterdir()):
-                        if j ==0:
-                            doyList.append(str(year) + ' ' + str(file.name[-3:]))
-                            printList.append(f"{datetime.datetime.strptime(doyList[i], '%Y %j').strftime('%b %d')} | Day of year: {file.name[-3:]}")
-                if len(printList) == 0:
+                yearDays = sorted({fileEntry['doy'] for fileEntry in archiveIndex['files'].values() if fileEntry['year'] == int(year)})
+                printList = [f"{datetime.datetime.strptime(f'{year} {dy}', '%Y %j').strftime('%b %d')} | Day of year: {str(dy).zfill(3)}" for dy in yearDays]
+                if len(archiveIndex['files']) == 0:
                     warnings.warn('No files found matching Raspberry Shake data structure or files in specified directory.')
                 else:
                     warnings.warn(f'No file found for specified date: {params["acq_date"]}. The following days/files exist for specified year in this directory')
                     for p in printList:
                         print('\t',p)
                 return None
-            elif len(fileList) !=3:
-                warnings.warn('3 channels needed! {} found.'.format(len(folderPathList)), UserWarning)
+            elif len(channelKeys) !=3:
+                warnings.warn('3 channels needed! {} found.'.format(len(channelKeys)), UserWarning)
             else:
-                fileList.sort(reverse=True) # Puts z channel first
-                folderPathList.sort(reverse=True)
                 if verbose:
-                    print('\n\tReading files: \n\t{}\n\t{}\n\t{}'.format(fileList[0].name, fileList[1].name, fileList[2].name))
+                    print('\n\tReading files: \n\t{}'.format('\n\t'.join([f.name for chaKey in channelKeys for f in sorted(channelFiles[chaKey])])))
 
-            traceList = []
-            for i, f in enumerate(fileList):
-                with warnings.catch_warnings():
-                    warnings.filterwarnings(action='ignore', message='^readMSEEDBuffer()')
-                    st = obspy.read(str(f))#, starttime=UTCDateTime(params['starttime']), endtime=UTCDateTime(params['endtime']), nearest_sample=False)
-                    st = st.split()
-                    st.trim(starttime=UTCDateTime(params['starttime']), endtime=UTCDateTime(params['endtime']), nearest_sample=False)
-                    st.merge()
-                    tr = (st[0])
-                    #tr= obspy.Trace(tr.data,header=meta)
-                    traceList.append(tr)
+            # Read the files of each channel concurrently (results are kept in channel order)
+            with warnings.catch_warnings():
+                warnings.filterwarnings(action='ignore', message='^readMSEEDBuffer()')
+                with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(len(channelKeys), 32))) as executor:
+                    traceList = list(executor.map(lambda chaKey: __read_RS_channel_files(sorted(channelFiles[chaKey]), params), channelKeys))
             rawDataIN = obspy.Stream(traceList)
 
         else:
-            rawDataIN = obspy.read(str(input_data), starttime=UTCDateTime(params['starttime']), endttime=UTCDateTime(params['endtime']), nearest_sample=True)
+            rawDataIN = obspy.read(str(input_data), starttime=UTCDateTime(params['starttime']), endtime=UTCDateTime(params['endtime']), nearest_sample=True)
 
     elif source=='dir': #files with 3 traces, but may be several in a directory or only directory name provided
         OBSPY_FORMATS = ['AH','ALSEP_PSE','ALSEP_WTH','ALSEP_WTN','CSS','DMX','GCF','GSE1','GSE2','KINEMETRICS_EVT','MSEED','NNSA_KB_CORE','PDAS','PICKLE','Q','REFTEK130','RG16','SAC','SACXY','SEG2','SEGY','SEISAN','SH_ASC','SLIST','SU','TSPAIR','WAV','WIN','Y']
@@ -9298,23 +9577,24 @@ def __read_RS_file_struct(input_data, source, year, doy, inv, params, verbose=Fa
                 folderPathList.append(input_data)
                 fileList.append(file.name)
 
-        filepaths = []
-        rawDataIN = obspy.Stream()
-        for i, f in enumerate(fileList):
-            filepaths.append(folderPathList[i].joinpath(f))
-            #filepaths[i] = pathlib.Path(filepaths[i])
-            currData = obspy.read(filepaths[i])
+        filepaths = [folderPathList[i].joinpath(f) for i, f in enumerate(fileList)]
+
+        # Read files concurrently (results are kept in file order)
+        def readMergedStream(filepath):
+            currData = __read_obspy_time_range(filepath, params, verbose=verbose)
             currData.merge()
-            #rawDataIN.append(currData)
-            #if i == 0:
-            #    rawDataIN = currData.copy()
-            if isinstance(currData, obspy.core.stream.Stream):
-                rawDataIN += currData.copy()
+            return currData
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(len(filepaths), 32))) as executor:
+            streamList = list(executor.map(readMergedStream, filepaths))
+
+        # Traces are added to the stream directly (not copied)
+        rawDataIN = obspy.Stream([tr for currData in streamList if isinstance(currData, obspy.core.stream.Stream) for tr in currData])
         #rawDataIN = obspy.Stream(rawDataIN)
         if type(rawDataIN) is list and len(rawDataIN)==1:
             rawDataIN = rawDataIN[0]
     elif source=='file':
-        rawDataIN = obspy.read(str(input_data), starttime=UTCDateTime(params['starttime']), endttime=UTCDateTime(params['endtime']), nearest=True)
+        rawDataIN = obspy.read(str(input_data), starttime=UTCDateTime(params['starttime']), endtime=UTCDateTime(params['endtime']), nearest_sample=True)
         rawDataIN.merge()
 
     elif isinstance(source, (list, tuple)):
@@ -9324,6 +9604,280 @@ def __read_RS_file_struct(input_data, source, year, doy, inv, params, verbose=Fa
     return rawDataIN
 
 
+# Helper function to read and merge all (day) files of one Raspberry Shake channel
+def __read_RS_channel_files(channel_files, params):
+    """Private function used by __read_RS_file_struct() to read the files of a single channel into a single trace"""
+    from obspy.core import UTCDateTime
+    st = obspy.Stream()
+    for f in channel_files:
+        # Only the data within the requested time range is read (with a margin, then trimmed exactly)
+        st += obspy.read(str(f), starttime=UTCDateTime(params['starttime']) - 1, endtime=UTCDateTime(params['endtime']) + 1)
+    st = st.split()
+    st.trim(starttime=UTCDateTime(params['starttime']), endtime=UTCDateTime(params['endtime']), nearest_sample=False)
+    st.merge()
+    tr = (st[0])
+    #tr= obspy.Trace(tr.data,header=meta)
+    return tr
+
+
+# Helper function to get the index of a Raspberry Shake archive directory
+def __get_RS_archive_index(archive_dir, save_index=True, verbose=False):
+    """Private function used by __read_RS_file_struct() to get an index of the day files in a Raspberry Shake archive.
+
+    The index maps each day file (station, channel, year, day of year) to its path, size and modification time.
+    Entries are made from the file names only (each file holds one day of one channel), so no files are read while indexing.
+    It is kept in memory and saved as RS_INDEX_FILENAME in the archive directory, 
+    and only the directories that have changed since the last update are scanned again.
+
+    Returns
+    -------
+    dict
+        Dictionary with keys 'index' (as saved to file) and 'by_day' (relative file paths for each (year, day of year))
+    """
+    archiveDir = pathlib.Path(archive_dir).resolve()
+    indexPath = archiveDir.joinpath(RS_INDEX_FILENAME)
+
+    archiveIndex = _rs_archive_indexes.get(archiveDir.as_posix())
+    if archiveIndex is None:
+        archiveIndex = {'index': None, 'by_day': {}}
+        if indexPath.exists():
+            try:
+                with open(indexPath, 'r') as f:
+                    archiveIndex['index'] = json.load(f)
+            except Exception as e:
+                if verbose:
+                    print(f"\tCould not read archive index {indexPath}, archive will be indexed again: {e}")
+        if archiveIndex['index'] is None or archiveIndex['index'].get('version') != 2:
+            archiveIndex['index'] = {'version': 2, 'dirs': {}, 'files': {}}
+        _rs_archive_indexes[archiveDir.as_posix()] = archiveIndex
+    indexDict = archiveIndex['index']
+
+    # The archive directory is only listed again if it has changed, then each channel directory (if it has changed)
+    # (saving the index also changes the archive directory, so the index is only updated if the files have changed)
+    indexUpdated = False
+    rootMtime = archiveDir.stat().st_mtime_ns
+    if indexDict['dirs'].get('.', {}).get('mtime') != rootMtime:
+        subDirs, filesChanged = __scan_RS_archive_dir(archiveDir, '.', indexDict)
+        indexUpdated = filesChanged or subDirs != indexDict['dirs'].get('.', {}).get('subdirs')
+        indexDict['dirs']['.'] = {'mtime': rootMtime, 'subdirs': subDirs}
+
+    for subDir in list(indexDict['dirs'].keys()):
+        if subDir != '.' and subDir not in indexDict['dirs']['.']['subdirs']:
+            del indexDict['dirs'][subDir]
+            indexDict['files'] = {relPath: fileEntry for relPath, fileEntry in indexDict['files'].items() if fileEntry['dir'] != subDir}
+            indexUpdated = True
+
+    for subDir in indexDict['dirs']['.']['subdirs']:
+        try:
+            subDirMtime = archiveDir.joinpath(subDir).stat().st_mtime_ns
+        except OSError:
+            continue
+        if indexDict['dirs'].get(subDir, {}).get('mtime') != subDirMtime:
+            __scan_RS_archive_dir(archiveDir, subDir, indexDict)
+            indexDict['dirs'][subDir] = {'mtime': subDirMtime}
+            indexUpdated = True
+
+    if indexUpdated or len(archiveIndex['by_day']) == 0:
+        archiveIndex['by_day'] = {}
+        for relPath, fileEntry in indexDict['files'].items():
+            archiveIndex['by_day'].setdefault((fileEntry['year'], fileEntry['doy']), []).append(relPath)
+
+    if indexUpdated and save_index:
+        __save_RS_archive_index(indexPath, indexDict, verbose=verbose)
+
+    return archiveIndex
+
+
+# Helper function to update the index entries of the day files in one directory of a Raspberry Shake archive
+def __scan_RS_archive_dir(archive_dir, rel_dir, index_dict):
+    """Private function used by __get_RS_archive_index() to scan a directory, returns the names of channel subdirectories (EH*) and whether any files changed"""
+    scanDir = pathlib.Path(archive_dir).joinpath(rel_dir)
+    subDirs = []
+    dirFiles = set()
+    filesChanged = False
+    with os.scandir(scanDir) as dirEntries:
+        for dirEntry in dirEntries:
+            if dirEntry.is_dir() and dirEntry.name.startswith('EH') and rel_dir == '.':
+                subDirs.append(dirEntry.name)
+            elif dirEntry.is_file() and dirEntry.name.startswith('AM'):
+                relPath = pathlib.PurePosixPath(rel_dir).joinpath(dirEntry.name).as_posix()
+                fileEntry = __get_RS_file_entry(pathlib.Path(dirEntry.path), rel_dir, index_dict['files'].get(relPath), file_stat=dirEntry.stat())
+                if fileEntry is not None:
+                    filesChanged = filesChanged or fileEntry is not index_dict['files'].get(relPath)
+                    index_dict['files'][relPath] = fileEntry
+                    dirFiles.add(relPath)
+
+    # Remove files that are no longer in the directory
+    for relPath in [relPath for relPath, fileEntry in index_dict['files'].items() if fileEntry['dir'] == rel_dir and relPath not in dirFiles]:
+        del index_dict['files'][relPath]
+        filesChanged = True
+    return sorted(subDirs), filesChanged
+
+
+# Helper function to get the index entry of a Raspberry Shake day file
+def __get_RS_file_entry(filepath, rel_dir, prev_entry=None, file_stat=None):
+    """Private function to get (or reuse, if unchanged) the index entry of a day file (e.g., AM.RAC84.00.EHZ.D.2023.150)"""
+    if file_stat is None:
+        file_stat = filepath.stat()
+    if prev_entry is not None and prev_entry['size'] == file_stat.st_size and prev_entry['mtime'] == file_stat.st_mtime_ns:
+        return prev_entry
+
+    nameParts = filepath.name.split('.')
+    if len(nameParts) < 3 or not nameParts[-1].isdigit() or not nameParts[-2].isdigit():
+        return None
+
+    return {'dir': rel_dir,
+            'station': nameParts[1],
+            'channel': nameParts[3] if len(nameParts) > 5 else None,
+            'year': int(nameParts[-2]),
+            'doy': int(nameParts[-1]),
+            'size': file_stat.st_size,
+            'mtime': file_stat.st_mtime_ns}
+
+
+# Helper function to save the index of a Raspberry Shake archive
+def __save_RS_archive_index(index_path, index_dict, verbose=False):
+    """Private function to save the archive index as json (the archive may not be writable, in which case it is only kept in memory)"""
+    try:
+        tempIndexPath = index_path.with_name(index_path.name + '.tmp')
+        with open(tempIndexPath, 'w') as f:
+            json.dump(index_dict, f)
+        os.replace(tempIndexPath, index_path)
+    except OSError as e:
+        if verbose:
+            print(f"\tArchive index could not be saved to {index_path}: {e}")
+
+
+# Helper function to get the files of a Raspberry Shake archive for each day in day_list
+def __find_RS_day_files(archive_dir, day_list, save_index=True, verbose=False):
+    """Private function used by __read_RS_file_struct() to look up the day files of an archive 
+
+    Returns
+    -------
+    tuple
+        Tuple of (archive index, files in archive directory, files in channel subdirectories)
+    """
+    archiveDir = pathlib.Path(archive_dir)
+    archiveIndex = __get_RS_archive_index(archiveDir, save_index=save_index, verbose=verbose)
+    indexDict = archiveIndex['index']
+
+    rootFiles = []
+    subDirFiles = []
+    entryUpdated = False
+    for yearDay in day_list:
+        for relPath in archiveIndex['by_day'].get((int(yearDay[0]), int(yearDay[1])), []):
+            filepath = archiveDir.joinpath(relPath)
+            # Files may be modified (e.g., still recording) without changing the directory
+            try:
+                fileEntry = __get_RS_file_entry(filepath, indexDict['files'][relPath]['dir'], indexDict['files'][relPath])
+            except OSError:
+                continue
+            if fileEntry is not indexDict['files'][relPath]:
+                indexDict['files'][relPath] = fileEntry
+                entryUpdated = True
+
+            if fileEntry['dir'] == '.':
+                rootFiles.append(filepath)
+            else:
+                subDirFiles.append(filepath)
+
+    if entryUpdated and save_index:
+        __save_RS_archive_index(archiveDir.resolve().joinpath(RS_INDEX_FILENAME), indexDict, verbose=verbose)
+
+    return indexDict, rootFiles, subDirFiles
+
+
+# Helper function to get (year, day of year) of each day of Raspberry Shake data needed for the time range in params
+def __get_RS_day_list(params, year, doy):
+    """Private function used by __read_RS_file_struct() to get the days of data to read (acquisition date and all days from params['starttime'] to params['endtime'])"""
+    dayList = [(int(year), int(doy))]
+    try:
+        sTime = obspy.UTCDateTime(params['starttime'])
+        eTime = obspy.UTCDateTime(params['endtime'])
+    except Exception:
+        return dayList
+
+    nDays = (eTime.date - sTime.date).days
+    if nDays < 0 or nDays > 366:
+        return dayList
+
+    for dayOffset in range(nDays + 1):
+        currDate = sTime.date + datetime.timedelta(days=dayOffset)
+        if (currDate.year, currDate.timetuple().tm_yday) not in dayList:
+            dayList.append((currDate.year, currDate.timetuple().tm_yday))
+    return sorted(dayList)
+
+
+# Helper function to get the time range of input_parameters that can be used to limit the data read from file
+def __get_read_time_range(input_parameters):
+    """Get (starttime, endtime) from input_parameters, or None if they do not limit the data (i.e., they are a full day)"""
+    try:
+        sTime = obspy.UTCDateTime(input_parameters['starttime'])
+        eTime = obspy.UTCDateTime(input_parameters['endtime'])
+    except Exception:
+        return None
+
+    isFullDay = sTime == obspy.UTCDateTime(sTime.date) and eTime == obspy.UTCDateTime(eTime.date) + (86400 - 0.000001)
+    if isFullDay or eTime <= sTime:
+        return None
+    return (sTime, eTime)
+
+
+# Helper function to read data with obspy.read() for only the time range of input_parameters, where possible
+def __read_obspy_time_range(data_path, input_parameters, verbose=False, **read_kwargs):
+    """Read only the data in the time range of input_parameters (with a small margin). 
+    
+    All data is read if the data does not start before input_parameters['starttime'] 
+    (since fetch_data() then uses starttime to update the timing of the data, rather than to trim it)."""
+    timeRange = __get_read_time_range(input_parameters)
+    if timeRange is None or 'starttime' in read_kwargs or 'endtime' in read_kwargs:
+        return obspy.read(data_path, **read_kwargs)
+
+    sTime, eTime = timeRange
+    try:
+        # Margin of 1 second so that data is trimmed exactly (as before) by fetch_data() later
+        rawStream = obspy.read(data_path, starttime=sTime - 1, endtime=eTime + 1, **read_kwargs)
+    except Exception:
+        rawStream = obspy.Stream()
+
+    traceStarttimes = {}
+    for tr in rawStream:
+        traceStarttimes[tr.id] = min(traceStarttimes.get(tr.id, tr.stats.starttime), tr.stats.starttime)
+    if len(rawStream) > 0 and all(trStart < sTime for trStart in traceStarttimes.values()) and max(tr.stats.endtime for tr in rawStream) > sTime:
+        return rawStream
+
+    if verbose:
+        print(f"\tData in {data_path} does not start before {sTime}, reading all data")
+    return obspy.read(data_path, **read_kwargs)
+
+
+# Helper function to read tromino data for only the time range of input_parameters, where possible
+def __read_tromino_time_range(input_parameters, verbose=False, **tromino_kwargs):
+    """Read only the tromino data in the time range of input_parameters.
+    
+    The time window is read exactly (fetch_data() sets starttime and endtime from tromino data). 
+    As in __read_obspy_time_range(), all data is read if the record does not include input_parameters['starttime'] 
+    (starttime is then used to update the timing of the data)."""
+    timeRange = __get_read_time_range(input_parameters)
+    if timeRange is None or tromino_kwargs.get('time_window', None) is not None:
+        return read_tromino_files(input_data=input_parameters, verbose=verbose, **tromino_kwargs)
+
+    sTime, eTime = timeRange
+    tromino_kwargs['time_window'] = (sTime, eTime)
+    try:
+        rawStream = read_tromino_files(input_data=input_parameters, verbose=verbose, **tromino_kwargs)
+    except Exception:
+        rawStream = obspy.Stream()
+
+    if len(rawStream) > 0 and all(abs(tr.stats.starttime - sTime) < tr.stats.delta and tr.stats.npts > 1 for tr in rawStream):
+        return rawStream
+
+    if verbose:
+        print(f"\tTromino data does not start before {sTime}, reading all data")
+    tromino_kwargs['time_window'] = None
+    return read_tromino_files(input_data=input_parameters, verbose=verbose, **tromino_kwargs)
+
+
 # Helper functions for remove_noise()
 # Helper function for removing gaps
 def __remove_gaps(stream, window_gaps_obspy):
@@ -9667,19 +10221,86 @@ def __remove_noise_saturate(stream, sat_percent, min_win_size, verbose=False):
     return outstream
 
 
-# Helper function for removing data using the noise threshold input from remove_noise()
-def __remove_noise_thresh(stream, noise_percent=0.8, lta=30, min_win_size=1, verbose=False):
-    """Helper function for removing data using the noise threshold input from remove_noise()
-
-    The purpose of the noise threshold method is to remove noisy windows (e.g., lots of traffic all at once).
+# Helper function for calculating a centered moving average in linear time
+def __nan_moving_average(data, window_size, buffers=None):
+    """Helper function to calculate a centered moving average using cumulative sums.
 
-    This function uses the lta value (which can be specified here), and finds times where the lta value is at least at the noise_percent level of the max lta value for at least a specified time (min_win_size)
+    The window is aligned and scaled the same way as np.convolve(data, np.ones(window_size)/window_size, mode='same'),
+    so where there are no gaps the results are the same (including at the edges of the record, which count as zeros).
+    Masked and nan samples are excluded from both the sum and the sample count of each window,
+    so windows with gaps are the mean of their valid samples (with any part of the window beyond the record still counted as zeros).
 
     Parameters
     ----------
-    stream : obspy.core.stream.Stream object
-        Input stream from which to remove windows. Passed from remove_noise().
-    noise_percent : float, default=0.995
+    data : numpy.ndarray or numpy.ma.MaskedArray
+        Input data
+    window_size : int
+        Number of samples in the moving window
+    buffers : dict, optional
+        Dictionary of preallocated work arrays (keys 'data', 'valid', 'cumsum', 'count', 'lta')
+        at least as long as data (cumsum and count one sample longer), by default None.
+        This allows the same memory to be reused for each trace of a stream.
+
+    Returns
+    -------
+    numpy.ndarray
+        float32 array the same length as data, with nan where a window contains no valid samples.
+        If buffers is specified, this is a view of buffers['lta'].
+    """
+    npts = len(data)
+    if buffers is None:
+        buffers = {'data': np.empty(npts, dtype=np.float32),
+                   'valid': np.empty(npts, dtype=bool),
+                   'cumsum': np.empty(npts + 1, dtype=np.float64),
+                   'count': np.empty(npts + 1, dtype=np.int64),
+                   'lta': np.empty(npts, dtype=np.float32)}
+
+    dataArr = buffers['data'][:npts]
+    validArr = buffers['valid'][:npts]
+    cumSum = buffers['cumsum'][:npts + 1]
+    cumCount = buffers['count'][:npts + 1]
+    ltaArr = buffers['lta'][:npts]
+
+    # Invalid (masked or nan) samples contribute nothing to the sums
+    dataArr[:] = np.ma.getdata(data)
+    np.isfinite(dataArr, out=validArr)
+    validArr &= ~np.ma.getmaskarray(data)
+    dataArr[~validArr] = 0
+
+    # Cumulative sums are accumulated in float64 to avoid loss of precision over long records
+    cumSum[0] = 0
+    np.cumsum(dataArr, dtype=np.float64, out=cumSum[1:])
+    cumCount[0] = 0
+    np.cumsum(validArr, out=cumCount[1:])
+
+    # Same window alignment as np.convolve(mode='same')
+    sampleInds = np.arange(npts)
+    lowInds = np.clip(sampleInds - window_size // 2, 0, npts)
+    highInds = np.clip(sampleInds + (window_size - 1) // 2 + 1, 0, npts)
+
+    # Only invalid samples within the record reduce the number of samples each window sum is divided by
+    windowCounts = cumCount[highInds] - cumCount[lowInds]
+    windowDivisors = window_size - ((highInds - lowInds) - windowCounts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        np.divide(cumSum[highInds] - cumSum[lowInds], windowDivisors, out=ltaArr, casting='unsafe')
+    ltaArr[windowCounts == 0] = np.nan
+
+    return ltaArr
+
+
+# Helper function for removing data using the noise threshold input from remove_noise()
+def __remove_noise_thresh(stream, noise_percent=0.8, lta=30, min_win_size=1, verbose=False):
+    """Helper function for removing data using the noise threshold input from remove_noise()
+
+    The purpose of the noise threshold method is to remove noisy windows (e.g., lots of traffic all at once).
+
+    This function uses the lta value (which can be specified here), and finds times where the lta value is at least at the noise_percent level of the max lta value for at least a specified time (min_win_size)
+
+    Parameters
+    ----------
+    stream : obspy.core.stream.Stream object
+        Input stream from which to remove windows. Passed from remove_noise().
+    noise_percent : float, default=0.995
         Percentage (between 0 and 1), to use as the threshold at which to remove data. This is used in the noise threshold method. By default 0.995.
 
         If a value is passed that is greater than 1, it will be divided by 100 to obtain the percentage. Passed from remove_noise().
@@ -9698,10 +10319,16 @@ def __remove_noise_thresh(stream, noise_percent=0.8, lta=30, min_win_size=1, ver
     if noise_percent > 1:
         noise_percent = noise_percent / 100
 
+    # Work buffers are allocated once (for the longest trace) and reused for each component
+    maxSamples = max([tr.stats.npts for tr in stream])
+    ltaBuffers = {'data': np.empty(maxSamples, dtype=np.float32),
+                  'valid': np.empty(maxSamples, dtype=bool),
+                  'cumsum': np.empty(maxSamples + 1, dtype=np.float64),
+                  'count': np.empty(maxSamples + 1, dtype=np.int64),
+                  'lta': np.empty(maxSamples, dtype=np.float32)}
+
     removeInd = np.array([], dtype=int)
     for trace in stream:
-        dataArr = trace.data.copy()
-
         sample_rate = trace.stats.delta
         lta_samples = int(lta / sample_rate)
 
@@ -9709,12 +10336,14 @@ def __remove_noise_thresh(stream, noise_percent=0.8, lta=30, min_win_size=1, ver
         window_size = lta_samples
         if window_size == 0:
             window_size = 1
-        kernel = np.ones(window_size) / window_size
-        maskedArr = np.ma.array(dataArr, dtype=float, fill_value=None)
-        ltaArr = np.convolve(maskedArr, kernel, mode='same')
-        #Get max lta value
-        maxLTA = np.max(ltaArr, where = not None)
-        cond = np.nonzero(np.absolute(ltaArr, where=not None) > (noise_percent * maxLTA))[0]
+        ltaArr = __nan_moving_average(trace.data, window_size, buffers=ltaBuffers)
+
+        #Get max lta value (windows with no valid data are nan and are never flagged)
+        if np.all(np.isnan(ltaArr)):
+            continue
+        maxLTA = np.nanmax(ltaArr)
+        with np.errstate(invalid='ignore'):
+            cond = np.nonzero(np.absolute(ltaArr) > (noise_percent * maxLTA))[0]
         removeInd = np.hstack([removeInd, cond])
         #trace.data = np.ma.where(np.absolute(data, where = not None) > (noise_percent * maxAmp), None, data)
     #Combine indices from all three traces
@@ -10508,7 +11137,7 @@ def __dbscan_outlier_detect(hvsr_data, use_hv_curves=True, use_percentile=True,
                             neighborhood_size=50, min_neighborhood_pts=5,
                             col_names=['HV_Curves'], comp_names=['Z', 'E', 'N'],
 
-                            col_prefix = 'HV_Curves',
+                            col_prefix = 'HV_Curves', max_block_elements=2**22,
 
                             verbose=False):
     """
@@ -10523,12 +11152,17 @@ def __dbscan_outlier_detect(hvsr_data, use_hv_curves=True, use_percentile=True,
     use_hv_curves : bool, optional
         Whether to use HV_Curves as the curve set of interest, by default True
     dist_metric : str, optional
-        Distance metric to use (see scipy.spatial.distance.pdist), by default 'euclidean'
+        Distance metric to use (see scipy.spatial.distance.cdist), by default 'euclidean'
     neighborhood_size : int, optional
         Percentile value to use in selecting neighborhood cutoff size.
         100 would use the largest distance in the distance matrix. 0 would use the smallest (0), by default 95
     min_neighborhood_pts : int, optional
         Minimum number of points in a curve's neighborhood for that point to be considered a core point, by default 5
+    max_block_elements : int, optional
+        Maximum number of curve-to-curve distances to calculate at once, by default 2**22 (32 MB).
+        If not all distances fit in one block, the percentile (if use_percentile=True) is still exact:
+        bounds around it are estimated from the distances between a random sample of curves and all curves,
+        and only the distances between these bounds are kept while the blocks are calculated.
 
     Returns
     -------
@@ -10553,22 +11187,67 @@ def __dbscan_outlier_detect(hvsr_data, use_hv_curves=True, use_percentile=True,
             neighborhood_size = neighborhood_size * 100
 
     # Define local function to use general dbscan algorithm for identifying outliers
-    def _dbscan_outliers(distance_matrix, n_size, min_pts, _use_percentile=True):
-        n = dist_matrix.shape[0]
-        has_neighbors = np.ones(n, dtype=bool)
+    def _dbscan_outliers(curves, n_size, min_pts, _use_percentile=True):
+        n = curves.shape[0]
+
+        # Number of rows of the distance matrix to calculate at a time
+        blockRows = int(max(1, min(n, max_block_elements // max(n, 1))))
 
         # Get epsilon based on whether it is a percentile
-        if _use_percentile:
-            eps = np.percentile(dist_matrix, n_size)
+        if _use_percentile and n <= blockRows:
+            # All distances fit in one block
+            allDists = cdist(curves, curves, metric=dist_metric)
+            eps = np.percentile(allDists, n_size)
+            neighborCounts = np.count_nonzero(allDists <= eps, axis=1)
+        elif _use_percentile:
+            # The exact percentile is found from the distances between eps bounds estimated from a sample of curves
+            #  (so only the distances near eps are kept), and the neighbors are counted in the same pass
+            sampleRows = np.sort(np.random.default_rng(0).choice(n, size=blockRows, replace=False))
+            sampleDists = cdist(curves[sampleRows], curves, metric=dist_metric)
+
+            nDists = n * n
+            virtualInd = n_size / 100 * (nDists - 1)
+            lowRank = int(np.floor(virtualInd))
+            highRank = min(lowRank + 1, nDists - 1)
+            boundWidth = 1
+            while True:
+                lowBound = -np.inf if n_size - boundWidth <= 0 else np.percentile(sampleDists, n_size - boundWidth)
+                highBound = np.inf if n_size + boundWidth >= 100 else np.percentile(sampleDists, n_size + boundWidth)
+
+                belowCounts = np.empty(n, dtype=np.int64)
+                candVals = []
+                candRows = []
+                for blockStart in range(0, n, blockRows):
+                    distBlock = cdist(curves[blockStart:blockStart+blockRows], curves, metric=dist_metric)
+                    belowCounts[blockStart:blockStart+blockRows] = np.count_nonzero(distBlock < lowBound, axis=1)
+                    blockCandRows, blockCandCols = np.nonzero((distBlock >= lowBound) & (distBlock <= highBound))
+                    candVals.append(distBlock[blockCandRows, blockCandCols])
+                    candRows.append(blockCandRows + blockStart)
+                candVals = np.concatenate(candVals)
+                candRows = np.concatenate(candRows)
+
+                nBelow = belowCounts.sum()
+                if nBelow <= lowRank and nBelow + candVals.shape[0] > highRank:
+                    break
+                boundWidth *= 4
+
+            lowVal, highVal = np.partition(candVals, [lowRank - nBelow, highRank - nBelow])[[lowRank - nBelow, highRank - nBelow]]
+            # Linear interpolation between the two distances, the same way as np.percentile()
+            frac = virtualInd - lowRank
+            if frac >= 0.5:
+                eps = highVal - (highVal - lowVal) * (1 - frac)
+            else:
+                eps = lowVal + (highVal - lowVal) * frac
+            neighborCounts = belowCounts + np.bincount(candRows[candVals <= eps], minlength=n)
         else:
             eps = n_size
+            neighborCounts = np.empty(n, dtype=np.int64)
+            for blockStart in range(0, n, blockRows):
+                distBlock = cdist(curves[blockStart:blockStart+blockRows], curves, metric=dist_metric)
+                neighborCounts[blockStart:blockStart+blockRows] = np.count_nonzero(distBlock <= eps, axis=1)
 
-        for i in range(n):
-            neighbors = np.where(dist_matrix[i] <= eps)[0]
-            if len(neighbors)-1 < min_pts:
-                has_neighbors[i] = False
-
-            #print(i, len(neighbors), has_neighbors[i])
+        # Each curve is within eps of itself, so that one is not counted as a neighbor
+        has_neighbors = (neighborCounts - 1) >= min_pts
 
         return has_neighbors
 
@@ -10587,9 +11266,8 @@ def _dbscan_outliers(distance_matrix, n_size, min_pts, _use_percentile=True):
             else:
                 column = column
         curves = np.stack(hvsr_data['hvsr_windows_df'][column])
-        dist_matrix = squareform(pdist(curves, metric=dist_metric))
 
-        noise_array = _dbscan_outliers(distance_matrix=dist_matrix,
+        noise_array = _dbscan_outliers(curves=curves,
 
                                        n_size=neighborhood_size,
 
@@ -10607,50 +11285,133 @@ def __prototype_outlier_detect(hvsr_data, use_hv_curves=False,
                                 use_percentile=True, outlier_threshold=98,
                                 col_names=['HV_Curves'], comp_names=['Z', 'E', 'N'],
 
-                                col_prefix = 'HV_Curves',
+                                col_prefix = 'HV_Curves', outlier_metric='rmse', max_iterations=1,
                                 verbose=False):
+    """
+    This is a helper function for remove_outlier_curves() to identify outlier curves by their distance from a prototype (median) curve.
 
-    # Loop through each component, and determine which curves are outliers
-    bad_rmse = []
-    for i, column in enumerate(col_names):
+    All components are processed together as one (components x windows x frequencies) array,
+    and a window is removed if its curve is an outlier for any component.
+
+    Parameters
+    ----------
+    hvsr_data : HVSRData
+        HVSRData instance on which to perform the outlier analysis
+    use_hv_curves : bool, optional
+        Whether to use HV_Curves as the curve set of interest, by default False
+    use_percentile : bool, optional
+        Whether outlier_threshold is a percentile of the metric values of each component (True) or a raw metric value (False), by default True
+    outlier_threshold : float, optional
+        Threshold above which a curve is considered an outlier, by default 98
+    outlier_metric : str, optional
+        Distance of each curve from the prototype curve, by default 'rmse'.
+        'rmse' uses the root mean square error over all frequencies.
+        'mad' uses the median (over frequency) of the absolute deviation from the prototype curve,
+        scaled by the median absolute deviation of all curves at that frequency (i.e., a robust z-score).
+    max_iterations : int, optional
+        Maximum number of times to identify outliers, by default 1.
+        After each iteration, the prototype curves are updated without the outliers found so far,
+        and the metric of each curve is recalculated from them. The thresholds are kept from the first iteration,
+        and iteration stops early once no new outliers are found.
+        The curves at each frequency are sorted once, and the prototype (median) curves are updated
+        by moving a pointer in the sorted curves past the removed windows (see __init_sorted_medians()).
+        With 'rmse', the metric is only updated at the frequencies where the prototype curve changed.
+
+    Returns
+    -------
+    HVSRData
+        HVSRData instance with the hvsr_windows_df DataFrame "Use" column updated
+    """
+    columns = []
+    for column in col_names:
         if column in comp_names:
             if use_hv_curves == False:
                 column = col_prefix + column
-            else:
-                column = column
+        columns.append(column)
 
-        # Retrieve data from dataframe (use all windows, just in case)
-        curr_data = np.stack(hvsr_data['hvsr_windows_df'][column])
+    # Retrieve data from dataframe (use all windows, just in case)
+    curveCube = np.stack([np.stack(hvsr_data['hvsr_windows_df'][column]) for column in columns])
 
-        # Calculate a median curve, and reshape so same size as original
-        medCurve = np.nanmedian(curr_data, axis=0)
-        medCurveArr = np.tile(medCurve, (curr_data.shape[0], 1))
+    useMAD = str(outlier_metric).lower() in ['mad', 'median absolute deviation']
+    metricName = 'MAD' if useMAD else 'RMSE'
 
-        # Calculate RMSE
-        rmse = np.sqrt(((np.subtract(curr_data, medCurveArr)**2).sum(axis=1))/curr_data.shape[1])
-        hvsr_data['hvsr_windows_df']['RMSE_'+column] = rmse
-        if use_percentile is True:
-            rmse_threshold = np.percentile(rmse[~np.isnan(rmse)], outlier_threshold)
-            if verbose:
-                print(f'\tRMSE at {outlier_threshold}th percentile for {column} calculated at: {rmse_threshold:.2f}')
-        else:
-            rmse_threshold = outlier_threshold
+    # Define local function to get the distance of each curve from the prototype curves
+    def _curve_metric(med_curves, active_windows=None):
+        curveDevs = curveCube - med_curves
+        if useMAD:
+            absDevs = np.abs(curveDevs)
+            if active_windows is None:
+                madScale = 1.4826 * np.nanmedian(absDevs, axis=1, keepdims=True)
+            else:
+                madScale = 1.4826 * np.nanmedian(absDevs[:, active_windows, :], axis=1, keepdims=True)
+            madScale[madScale == 0] = np.nan
+            return np.nanmedian(absDevs / madScale, axis=2)
+        return np.sqrt(np.mean(curveDevs**2, axis=2))
+
+    # Calculate a median curve for each component, and the distance of each curve from it
+    medCurves = np.nanmedian(curveCube, axis=1, keepdims=True)
+    metricArr = _curve_metric(medCurves)
+
+    # Get the threshold for each component
+    if use_percentile is True:
+        metricThresholds = np.nanpercentile(metricArr, outlier_threshold, axis=1)
+        if verbose:
+            for column, compThreshold in zip(columns, metricThresholds):
+                print(f'\t{metricName} at {outlier_threshold}th percentile for {column} calculated at: {compThreshold:.2f}')
+    else:
+        metricThresholds = np.full(len(columns), outlier_threshold, dtype=float)
+
+    # A window is an outlier if its curve lies outside the threshold for any component (or could not be evaluated)
+    def _find_outliers(metric_arr):
+        with np.errstate(invalid='ignore'):
+            return np.any(~(metric_arr <= metricThresholds[:, np.newaxis]), axis=0)
+
+    bad_windows = _find_outliers(metricArr)
+
+    # Iteratively update the prototype curves without the outliers found so far
+    if max_iterations is not None and int(max_iterations) > 1:
+        nComps, nWins, nFreqs = curveCube.shape
+        medState = __init_sorted_medians(curveCube.transpose(1, 0, 2).reshape(nWins, nComps*nFreqs))
+        if not useMAD:
+            sqDevSum = np.sum((curveCube - medCurves)**2, axis=2)
+
+        removedWindows = np.zeros(nWins, dtype=bool)
+        nIterations = 1
+        for iteration in range(1, int(max_iterations)):
+            newOutliers = bad_windows & ~removedWindows
+            if not newOutliers.any():
+                break
+            removedWindows |= newOutliers
 
-        # Retrieve index of those RMSE values that lie outside the threshold
-        for j, curve in enumerate(curr_data):
-            if rmse[j] > rmse_threshold:
-                bad_rmse.append(j)
+            __remove_from_sorted_medians(medState, np.flatnonzero(newOutliers))
+            newMedCurves = __sorted_medians(medState).reshape(nComps, 1, nFreqs)
+            if useMAD:
+                metricArr = _curve_metric(newMedCurves, active_windows=~removedWindows)
+            else:
+                # Only the frequencies where the prototype curve changed contribute to the change in the metric
+                for comp in range(nComps):
+                    changedFreqs = newMedCurves[comp, 0] != medCurves[comp, 0]
+                    compCurves = curveCube[comp][:, changedFreqs]
+                    sqDevSum[comp] += np.sum((compCurves - newMedCurves[comp, 0, changedFreqs])**2 -
+                                             (compCurves - medCurves[comp, 0, changedFreqs])**2, axis=1)
+                metricArr = np.sqrt(np.clip(sqDevSum, 0, None) / nFreqs)
+            medCurves = newMedCurves
+
+            bad_windows = removedWindows | _find_outliers(metricArr)
+            nIterations += 1
 
-    # Get unique values of bad_rmse indices and set the "Use" column of the hvsr_windows_df to False for that window
-    bad_rmse = np.unique(bad_rmse)
-    if len(bad_rmse) > 0:
-        hvsr_data['hvsr_windows_df']['Use'] = hvsr_data['hvsr_windows_df']['Use'] * (rmse_threshold > hvsr_data['hvsr_windows_df']['RMSE_'+column])
-        #hvsr_data['hvsr_windows_df'].loc[bad_index, "Use"] = False
+        if verbose:
+            print(f'\tOutlier detection stopped after {nIterations} iteration(s)')
+
+    for column, compMetric in zip(columns, metricArr):
+        hvsr_data['hvsr_windows_df'][metricName+'_'+column] = compMetric
+
+    hvsr_data['hvsr_windows_df']['Use'] = hvsr_data['hvsr_windows_df']['Use'] & ~bad_windows
 
     if verbose:
-        if len(bad_rmse) > 0:
-            print(f"\n\t\tThe windows starting at the following times have been removed from further analysis ({len(bad_rmse)}/{hvsr_data['hvsr_windows_df'].shape[0]}):")
-            for b in hvsr_data['hvsr_windows_df'].index[pd.Series(bad_rmse)]:
+        if bad_windows.any():
+            print(f"\n\t\tThe windows starting at the following times have been removed from further analysis ({bad_windows.sum()}/{hvsr_data['hvsr_windows_df'].shape[0]}):")
+            for b in hvsr_data['hvsr_windows_df'].index[bad_windows]:
                 print(f"\t\t  {b}")
         else:
             print('\tNo outlier curves have been removed')
@@ -10658,6 +11419,101 @@ def __prototype_outlier_detect(hvsr_data, use_hv_curves=False,
     return hvsr_data
 
 
+# Helper functions for iterative prototype outlier detection
+# Presort curves, so that their medians can be updated as windows are removed
+def __init_sorted_medians(curve_arr):
+    """Private function to set up medians of each column of curve_arr (windows x columns) that can be updated as windows are removed
+
+    Each column is sorted once (NaN values are sorted to the end and ignored). For each column, a pointer to the (lower) median
+    in the sorted values is kept, with the number of remaining (active) values below it.
+    When windows are removed, the pointers are moved past the removed values, so removing k windows costs O(k) per column,
+    instead of finding the median of all remaining windows again.
+
+    Parameters
+    ----------
+    curve_arr : numpy.ndarray
+        2D array with one row per window and one column per frequency (and component)
+
+    Returns
+    -------
+    dict
+        Dictionary with the sorted state, for use with __remove_from_sorted_medians() and __sorted_medians()
+    """
+    nValid = (~np.isnan(curve_arr)).sum(axis=0)
+    medState = {'values': curve_arr,
+                'order': np.argsort(curve_arr, axis=0, kind='stable').astype(np.int32),
+                'active': np.ones(curve_arr.shape[0], dtype=bool),
+                'n_active': nValid,
+                'low_pos': np.clip((nValid - 1) // 2, 0, None),
+                'low_rank': np.clip((nValid - 1) // 2, 0, None)}
+    return medState
+
+
+# Remove windows from presorted medians
+def __remove_from_sorted_medians(med_state, windows):
+    """Private function to remove windows (array of row indices) from the medians set up by __init_sorted_medians()"""
+    values = med_state['values']
+    order = med_state['order']
+    colInds = np.arange(values.shape[1])
+    lowWins = order[med_state['low_pos'], colInds]
+    lowVals = values[lowWins, colInds]
+
+    for win in windows:
+        if not med_state['active'][win]:
+            continue
+        # Values sorted before the median pointer (ties are sorted by window, since the sort is stable)
+        winVals = values[win]
+        validVals = ~np.isnan(winVals)
+        belowPointer = validVals & ((winVals < lowVals) | ((winVals == lowVals) & (win < lowWins)))
+        med_state['low_rank'] -= belowPointer
+        med_state['n_active'] -= validVals
+        med_state['active'][win] = False
+
+    # Move each pointer down, then up, until it is on an active value with (n_active-1)//2 active values below it
+    targetRank = (med_state['n_active'] - 1) // 2
+    hasVals = med_state['n_active'] > 0
+    lowPos = med_state['low_pos']
+    lowRank = med_state['low_rank']
+
+    moveDown = hasVals & (lowRank > targetRank)
+    while moveDown.any():
+        lowPos[moveDown] -= 1
+        lowRank[moveDown] -= med_state['active'][order[lowPos[moveDown], colInds[moveDown]]]
+        moveDown = hasVals & (lowRank > targetRank)
+
+    moveUp = hasVals & ((lowRank < targetRank) | ~med_state['active'][order[lowPos, colInds]])
+    while moveUp.any():
+        lowRank[moveUp] += med_state['active'][order[lowPos[moveUp], colInds[moveUp]]]
+        lowPos[moveUp] += 1
+        moveUp = hasVals & ((lowRank < targetRank) | ~med_state['active'][order[lowPos, colInds]])
+
+    return med_state
+
+
+# Get presorted medians
+def __sorted_medians(med_state):
+    """Private function to get the median of each column of the active windows, from __init_sorted_medians() (same as np.nanmedian())"""
+    values = med_state['values']
+    order = med_state['order']
+    colInds = np.arange(values.shape[1])
+    hasVals = med_state['n_active'] > 0
+
+    lowVals = values[order[med_state['low_pos'], colInds], colInds]
+
+    # With an even number of values, the median is the mean of the lower median and the next active value
+    evenCols = hasVals & (med_state['n_active'] % 2 == 0)
+    highPos = med_state['low_pos'] + evenCols
+    findHigh = evenCols & ~med_state['active'][order[highPos, colInds]]
+    while findHigh.any():
+        highPos[findHigh] += 1
+        findHigh = evenCols & ~med_state['active'][order[highPos, colInds]]
+    highVals = values[order[highPos, colInds], colInds]
+
+    medVals = np.where(evenCols, (lowVals + highVals) / 2, lowVals)
+    medVals[~hasVals] = np.nan
+    return medVals
+
+
 # Helper functions for generate_psds()
 # Generate psds from raw data (no response removed)
 def __single_psd_from_raw_data(hvsr_data, window_length=30.0, window_length_method='length', window_type='hann',
@@ -10682,10 +11538,12 @@ def __single_psd_from_raw_data(hvsr_data, window_length=30.0, window_length_meth
 
     Returns
     -------
-    Tuple (dict, np.array)
+    Tuple (dict, np.array, dict)
         Tuple with index 0 being a dictionary with keys of components ("Z", "E", "N").
         Values are numpy array containing the PSDs for that component at each time step.
         Index 1 of tuple contains a numpy array with the start and end times of each time window used for FFT processing.
+        Index 2 of tuple contains a dictionary with the key "NE" (if do_azimuths=True, otherwise empty),
+        with the real part of the N/E cross spectral density (linear units, not decibels) at each time step.
     """
     zdata = hvsr_data.stream.select(component='Z').merge()
     edata = hvsr_data.stream.select(component='E').merge()
@@ -10695,14 +11553,6 @@ def __single_psd_from_raw_data(hvsr_data, window_length=30.0, window_length_meth
                 'E':edata,
                 'N':ndata}
 
-    if do_azimuths:
-        azimuthStream = hvsr_data.stream.select(component='R').merge()
-
-        for azimuthTrace in azimuthStream:
-            keyName = f"AZ{azimuthTrace.stats.location}"
-
-            dataDict[keyName] = azimuthTrace
-
     if remove_response:
         pf1 = hvsr_data['hvsr_band'][0]/2
         pf2 = hvsr_data['hvsr_band'][0]
@@ -10854,7 +11704,227 @@ def __single_psd_from_raw_data(hvsr_data, window_length=30.0, window_length_meth
         #psds = np.mean(np.array(final_psds), axis=0)
         #psdDict[key][str(stime)] = np.array(final_psds)
 
-    return psdDict, np.array(windows_out)
+    # Azimuthal spectra are quadratic forms of the N/E auto and cross spectra,
+    #  so only the N/E cross spectrum is needed (once per window), no matter how many azimuths are used
+    crossDict = {}
+    if do_azimuths:
+        crossDict['NE'] = {}
+        nTrace = dataDict['N'].merge()[0]
+        eTrace = dataDict['E'].merge()[0]
+        for stime, etime in windows:
+            nWindow = nTrace.slice(starttime=stime, endtime=etime).split()
+            if len(nWindow) == 0:
+                crossDict['NE'][str(stime)] = np.full(x_freqs.shape, np.nan)
+                continue
+            # Use the same continuous data section as the N component
+            nWindowTrace = max(nWindow, key=len)
+            eWindowTrace = eTrace.slice(starttime=nWindowTrace.stats.starttime, endtime=nWindowTrace.stats.endtime)
+
+            nArr = np.ma.filled(np.ma.masked_invalid(nWindowTrace.data, copy=False).astype(np.float64), np.nan)
+            eArr = np.ma.filled(np.ma.masked_invalid(eWindowTrace.data, copy=False).astype(np.float64), np.nan)
+            nsamplesperwin = min(psd_window_samples, len(nArr))
+            if len(nArr) != len(eArr) or nsamplesperwin <= 1 or np.any(np.isnan(nArr)) or np.any(np.isnan(eArr)):
+                crossDict['NE'][str(stime)] = np.full(x_freqs.shape, np.nan)
+                continue
+
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                f, pne = scipy.signal.csd(nArr, eArr, fs=nWindowTrace.stats.sampling_rate,
+                                          window=window_type, nperseg=nsamplesperwin,
+                                          noverlap=min(int(overlap_samples), nsamplesperwin - 1), nfft=None, detrend='linear',
+                                          return_onesided=True, scaling='density', axis=-1, average='mean')
+            crossDict['NE'][str(stime)] = np.interp(x_freqs, f, np.real(pne))
+
+    return psdDict, np.array(windows_out), crossDict
+
+
+# Calculate azimuthal psds from the N/E auto and cross spectra
+def __azimuth_psds_from_cross_spectra(psd_n, psd_e, psd_ne, azimuths, decibels=True):
+    """Helper function to calculate the psds of azimuthal horizontal components without rotating any time series.
+
+    Since H(az) = N*cos(az) + E*sin(az), the psd at any azimuth is 
+
+    P(az) = cos(az)^2 * P_NN + sin(az)^2 * P_EE + 2*cos(az)*sin(az) * Re(P_NE)
+
+    Parameters
+    ----------
+    psd_n : numpy.ndarray
+        PSD values (in decibels) of the N component, shape (time windows, frequencies)
+    psd_e : numpy.ndarray
+        PSD values (in decibels) of the E component, same shape as psd_n
+    psd_ne : numpy.ndarray
+        Real part of the N/E cross spectral density (linear units), same shape as psd_n
+    azimuths : dict
+        Dictionary with azimuth keys (e.g., "AZ045") and dictionaries with "weights" (N weight, E weight), as in hvsr_data['azimuths']
+    decibels : bool, default=True
+        Whether psd_n and psd_e are in decibels. If False, they are in linear units (as psd_ne).
+
+    Returns
+    -------
+    dict
+        Dictionary with the same keys as azimuths, and arrays (same shape as psd_n) of azimuthal PSD values in decibels
+    """
+    if decibels:
+        pNN = np.power(10.0, np.asarray(psd_n, dtype=np.float64) / 10.0)
+        pEE = np.power(10.0, np.asarray(psd_e, dtype=np.float64) / 10.0)
+    else:
+        pNN = np.asarray(psd_n, dtype=np.float64)
+        pEE = np.asarray(psd_e, dtype=np.float64)
+    pNE = np.asarray(psd_ne, dtype=np.float64)
+
+    azPSDs = {}
+    for azKey, azDict in azimuths.items():
+        nWeight, eWeight = azDict['weights']
+        azPower = (nWeight**2) * pNN + (eWeight**2) * pEE + (2 * nWeight * eWeight) * pNE
+        # Exact arithmetic guarantees this is non-negative, but guard against roundoff
+        azPower = np.maximum(azPower, 10e-300)
+        azPSDs[azKey] = 10 * np.log10(azPower)
+    return azPSDs
+
+
+# Resample azimuthal psds from the N/E auto and cross spectra, as process_hvsr() does for the other components
+def __resample_azimuth_psds(cross_spectra, azimuths, x_periods, resample=True):
+    """Helper function to calculate azimuthal psds (in decibels) of each window from hvsr_data['psd_cross_spectra']
+
+    Parameters
+    ----------
+    cross_spectra : dict
+        Dictionary with "NN", "EE", and "NE" arrays (linear units) and "period_bin_centers", as in hvsr_data['psd_cross_spectra']
+    azimuths : dict
+        Dictionary with azimuth keys (e.g., "AZ045") and dictionaries with "weights" (N weight, E weight), as in hvsr_data['azimuths']
+    x_periods : numpy.ndarray
+        Periods of the processed N component psds (x_periods['N'] in process_hvsr())
+    resample : bool or int, default=True
+        resample parameter of process_hvsr(). If True or an integer, the psds are interpolated to x_periods.
+
+    Returns
+    -------
+    dict
+        Dictionary with the same keys as azimuths, and arrays (time windows, frequencies) of unsmoothed azimuthal psds in decibels
+    """
+    azPSDs = __azimuth_psds_from_cross_spectra(cross_spectra['NN'], cross_spectra['EE'], cross_spectra['NE'],
+                                               azimuths, decibels=False)
+    if resample is True or type(resample) is int or type(resample) is float:
+        for azKey, azPSD in azPSDs.items():
+            azPSDs[azKey] = np.array([np.interp(x_periods, cross_spectra['period_bin_centers'], azArr) for azArr in azPSD])
+    return azPSDs
+
+
+# Smooth azimuthal psds the same way process_hvsr() smooths the other components
+def __smooth_azimuth_psds(az_psds, x_freqs, freq_smooth='konno ohmachi', f_smooth_width=40):
+    """Helper function to smooth the azimuthal psds from __resample_azimuth_psds()
+
+    Konno & Ohmachi smoothing of all azimuths is carried out in one pass (each azimuth psd is still smoothed as if it were on its own),
+    so the smoothing matrix is only built once for any number of azimuths.
+
+    Parameters
+    ----------
+    az_psds : dict
+        Dictionary with azimuth keys and arrays (time windows, frequencies) of azimuthal psds in decibels
+    x_freqs : numpy.ndarray
+        Frequencies of the psds
+    freq_smooth : str or bool, default='konno ohmachi'
+        freq_smooth parameter of process_hvsr()
+    f_smooth_width : int, default=40
+        f_smooth_width parameter of process_hvsr()
+
+    Returns
+    -------
+    dict
+        Dictionary with the same keys as az_psds, with the smoothed psds
+    """
+    freq_smooth_ko = ['konno ohmachi', 'konno-ohmachi', 'konnoohmachi', 'konnohmachi', 'ko', 'k']
+    freq_smooth_constant = ['constant', 'const', 'c']
+    freq_smooth_proport = ['proportional', 'proportion', 'prop', 'p']
+
+    azKeys = list(az_psds.keys())
+    if len(azKeys) == 0 or not freq_smooth:
+        return dict(az_psds)
+
+    if freq_smooth is True or (freq_smooth.lower() in freq_smooth_ko and (not not f_smooth_width and not not freq_smooth)):
+        smoothedAzPSDs = __konno_ohmachi_smooth(np.stack([az_psds[azKey] for azKey in azKeys]), x_freqs, f_smooth_width)
+        return dict(zip(azKeys, smoothedAzPSDs))
+    elif freq_smooth.lower() in freq_smooth_constant or freq_smooth.lower() in freq_smooth_proport:
+        if freq_smooth.lower() in freq_smooth_constant:
+            kindSmooth = 'constant'
+        else:
+            kindSmooth = 'proportional'
+        smoothDict = {'psd_raw': {azKey: np.array(az_psds[azKey]) for azKey in azKeys},
+                      'hvsr_windows_df': pd.DataFrame({'psd_values_'+azKey: list(az_psds[azKey]) for azKey in azKeys})}
+        smoothDict = __freq_smooth_window(smoothDict, f_smooth_width, kind_freq_smooth=kindSmooth)
+        return {azKey: np.stack(smoothDict['psd_raw'][azKey]) for azKey in azKeys}
+    return dict(az_psds)
+
+
+# Calculate azimuthal H/V curves at any angle, as process_hvsr() does for hvsr_data['hvsr_az']
+def __azimuth_hvsr_curves(hvsr_data, azimuth_angles, chunk_size=30):
+    """Helper function to calculate median H/V curves at arbitrary azimuths from the N/E auto and cross spectra
+
+    Parameters
+    ----------
+    hvsr_data : HVSRData
+        HVSRData object that has been processed with process_hvsr() with azimuthal psds
+    azimuth_angles : array_like
+        Azimuth angles (in radians) at which to calculate the H/V curves
+    chunk_size : int, default=30
+        Number of azimuths resampled and smoothed at once (limits memory use)
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of H/V curves with shape (number of azimuths, number of frequencies - 1).
+        These are calculated the same way as the curves in hvsr_data['hvsr_az'].
+    """
+    procParams = hvsr_data['processing_parameters']['process_hvsr']
+    hvsrDF = hvsr_data['hvsr_windows_df']
+    use = hvsrDF['Use'].astype(bool).values
+    xFreqs = hvsr_data['x_freqs']['N']
+
+    azimuth_angles = np.asarray(azimuth_angles, dtype=np.float64)
+    azHVList = []
+    for chunkStart in range(0, azimuth_angles.shape[0], chunk_size):
+        azDict = {f'AZ{i:04d}': {'weights': (np.cos(az_rad), np.sin(az_rad))}
+                  for i, az_rad in enumerate(azimuth_angles[chunkStart:chunkStart+chunk_size])}
+        azPSDs = __resample_azimuth_psds(hvsr_data['psd_cross_spectra'], azDict, hvsr_data['x_period']['N'],
+                                         resample=procParams.get('resample', True))
+        azPSDs = __smooth_azimuth_psds(azPSDs, xFreqs, freq_smooth=procParams.get('freq_smooth', 'konno ohmachi'),
+                                       f_smooth_width=procParams.get('f_smooth_width', 40))
+
+        # H/V from the median psds, with the same calculation as for hvsr_data['hvsr_az']
+        psdMedians = {k: hvsr_data['psd_values_tavg'][k] for k in ['Z', 'E', 'N']}
+        for azKey, azPSD in azPSDs.items():
+            psdMedians[azKey] = np.nanmedian(azPSD[use], axis=0)
+        _, chunkHV, _ = __get_hvsr_curve(x=xFreqs, psd=psdMedians, horizontal_method=3, hvsr_data=hvsr_data)
+        azHVList.extend(chunkHV[azKey] for azKey in azDict.keys())
+    return np.array(azHVList)
+
+
+# Create radial traces from the azimuth weights (only needed for the obspy PPSD method)
+def __get_azimuth_traces(hvsr_data):
+    """Helper function to build obspy traces of azimuthal components from the weights stored in hvsr_data['azimuths']
+
+    Parameters
+    ----------
+    hvsr_data : HVSRData
+        HVSRData object with stream and azimuths attributes
+
+    Returns
+    -------
+    dict
+        Dictionary with azimuth keys (e.g., "AZ045") and obspy.Trace objects of the radial component at that azimuth
+    """
+    nTrace = hvsr_data['stream'].select(component='N').merge()[0]
+    eTrace = hvsr_data['stream'].select(component='E').merge()[0]
+
+    azTraces = {}
+    for azKey, azDict in hvsr_data['azimuths'].items():
+        nWeight, eWeight = azDict['weights']
+        statsDict = eTrace.stats.copy()
+        statsDict['location'] = azKey[2:]
+        statsDict['channel'] = eTrace.stats.channel[:-1] + 'R'
+        # np.ma arithmetic combines the masks of both components
+        azTraces[azKey] = obspy.Trace(data=nTrace.data * nWeight + eTrace.data * eWeight, header=statsDict)
+    return azTraces
 
 
 # Generate windows "manually"
@@ -11157,6 +12227,51 @@ def _dfa(x, hvsr_data=None, verbose=False):#, equal_interval_energy, median_dail
     return hvsr_tSteps
 
 
+# Helper function for Konno & Ohmachi smoothing
+def __konno_ohmachi_smooth(psd_data, freqs, f_smooth_width):
+    """Helper function to carry out Konno & Ohmachi smoothing on a 2D array (time windows, frequencies), padded to prevent boundary anomalies.
+    
+    A 3D array (e.g., azimuths, time windows, frequencies) is smoothed in one pass, with each 2D array padded separately (as if smoothed on its own)."""
+    from obspy.signal import konnoohmachismoothing
+
+    padding_length = int(f_smooth_width)
+
+    stackShape = np.shape(psd_data)
+    psd_data = np.reshape(psd_data, (-1,) + stackShape[-2:])
+
+    padding_value_R = np.nanmean(psd_data[:, :, -1*padding_length:], axis=(1, 2))
+    padding_value_L = np.nanmean(psd_data[:, :, :padding_length], axis=(1, 2))
+
+    # Pad the data to prevent boundary anamolies
+    padded_psd_data = np.concatenate([np.broadcast_to(padding_value_L[:, np.newaxis, np.newaxis], psd_data.shape[:2] + (padding_length,)),
+                                      psd_data,
+                                      np.broadcast_to(padding_value_R[:, np.newaxis, np.newaxis], psd_data.shape[:2] + (padding_length,))], axis=2)
+    padded_psd_data = padded_psd_data.reshape(-1, padded_psd_data.shape[-1])
+
+    # Pad the frequencies
+    ratio = freqs[1] / freqs[0]
+    # Generate new elements on either side and combine
+    left_padding = [freqs[0] / (ratio ** i) for i in range(padding_length, 0, -1)]
+    right_padding = [freqs[-1] * (ratio ** i) for i in range(1, padding_length + 1)]
+    padded_freqs = np.concatenate([left_padding, freqs, right_padding])
+
+    # Filter out UserWarning for just this method, since it throws up a UserWarning that doesn't really matter about dtypes often
+    with warnings.catch_warnings():
+        # warnings.simplefilter('ignore', category=UserWarning)
+        padded_psd_data = padded_psd_data.astype(padded_freqs.dtype)  # Make them the same datatype
+        padded_psd_data = np.round(padded_psd_data, 12)  # Prevent overflows
+        padded_freqs = np.round(padded_freqs, 9)
+
+        smoothed_psd_data = konnoohmachismoothing.konno_ohmachi_smoothing(padded_psd_data, padded_freqs,
+
+                                                                          bandwidth=f_smooth_width,
+
+                                                                          normalize=True)
+
+    # Only use the original, non-padded data
+    return smoothed_psd_data[:, padding_length:-1*padding_length].reshape(stackShape)
+
+
 # Helper function for smoothing across frequencies
 def __freq_smooth_window(hvsr_out, f_smooth_width, kind_freq_smooth):
     """Helper function to smooth frequency if 'constant' or 'proportional' is passed to freq_smooth parameter of process_hvsr() function"""
@@ -11519,9 +12634,279 @@ def __find_peaks(_y):
     return _index_list[0]
 
 
+# Find peaks in the hvsr curves of all time windows at once
+def __find_peaks_2d(_y2d):
+    """Finds all possible peaks on each row of a 2D array of hvsr curves
+
+    This gives the same peaks as running __find_peaks() on each row, but for all rows in one pass.
+    The peaks are returned in a ragged (CSR-style) format: the peaks of row i are
+    peak_indices[peak_offsets[i]:peak_offsets[i+1]].
+
+    Parameters
+    ----------
+    _y2d : array_like
+        2D array with one curve per row (e.g., the H/V curve of each time window)
+
+    Returns
+    -------
+    peak_indices : np.ndarray
+        Flat array with the (column) indices of the peaks of all rows, in row order
+    peak_offsets : np.ndarray
+        Array of length n_rows + 1 with the start of each row in peak_indices
+    """
+    _y2d = np.atleast_2d(np.asarray(_y2d, dtype=float))
+    nRows = _y2d.shape[0]
+
+    # Same as argrelextrema(..., np.greater) along each row: strictly greater than both neighbors
+    with np.errstate(invalid='ignore'):
+        isPeak = (_y2d[:, 1:-1] > _y2d[:, :-2]) & (_y2d[:, 1:-1] > _y2d[:, 2:])
+    rowInds, colInds = np.nonzero(isPeak)
+
+    peak_indices = colInds + 1
+    peak_offsets = np.zeros(nRows + 1, dtype=np.intp)
+    np.cumsum(np.bincount(rowInds, minlength=nRows), out=peak_offsets[1:])
+    return peak_indices, peak_offsets
+
+
+# Get the peaks of the individual time window H/V curves
+def _get_ind_peaks(hvsr_data, col_id='HV', use_only=True):
+    """Private function to get the peaks of the H/V curves of each time window, in ragged (CSR-style) format
+
+    Parameters
+    ----------
+    hvsr_data : HVSRData or dict
+        Data object with process_hvsr() already run on it
+    col_id : str, default='HV'
+        Which curve to use, either 'HV' or an azimuth key (e.g., 'AZ045')
+    use_only : bool, default=True
+        If True, only the time windows marked as "Use" in hvsr_windows_df are returned
+
+    Returns
+    -------
+    peak_indices : np.ndarray
+        Flat array with the frequency indices of the peaks of all time windows
+    peak_offsets : np.ndarray
+        Array with the start of each time window in peak_indices (length is number of windows + 1)
+    """
+    hvsrDF = hvsr_data['hvsr_windows_df']
+    if 'ind_hvsr_peaks' in hvsr_data.keys() and col_id in hvsr_data['ind_hvsr_peaks']:
+        peak_indices = hvsr_data['ind_hvsr_peaks'][col_id]['indices']
+        peak_offsets = hvsr_data['ind_hvsr_peaks'][col_id]['offsets']
+    else:
+        # e.g., data processed with an earlier version of sprit, or read from a json file
+        peakLists = [np.asarray(pList, dtype=np.intp).ravel() for pList in hvsrDF['CurvesPeakIndices_'+col_id]]
+        peak_offsets = np.zeros(len(peakLists) + 1, dtype=np.intp)
+        np.cumsum([pList.shape[0] for pList in peakLists], out=peak_offsets[1:])
+        peak_indices = np.concatenate(peakLists) if peakLists else np.array([], dtype=np.intp)
+
+    if use_only:
+        useArr = hvsrDF['Use'].to_numpy(dtype=bool)
+        peakCounts = np.diff(peak_offsets)
+        rowIDs = np.repeat(np.arange(peakCounts.shape[0]), peakCounts)
+
+        peak_indices = peak_indices[useArr[rowIDs]]
+        peak_offsets = np.zeros(useArr.sum() + 1, dtype=np.intp)
+        np.cumsum(peakCounts[useArr], out=peak_offsets[1:])
+
+    return peak_indices, peak_offsets
+
+
+# Set up streaming statistics of curves
+def _init_streaming_stats(n_freqs, track_median=True, buffer_size=50):
+    """Set up single-pass (streaming) estimators of the statistics at each frequency of a set of curves (e.g., psd or H/V curves of time windows)
+
+    Curves are added one at a time (or in blocks) with _update_streaming_stats(), as each window is processed,
+    so the curves of all windows never need to be stacked into one array.
+        - The mean and standard deviation use Welford's algorithm (combined by block, as in Chan et al., 1979).
+          These are exact (up to floating point rounding), and curves can also be removed again.
+        - The median is exact for the first buffer_size curves, which are kept.
+          After that, it is estimated with the P² algorithm (Jain & Chlamtac, 1985), with 5 markers per frequency
+          initialized from the kept curves, and the kept curves are discarded.
+
+    NaN values are ignored, as with np.nanmedian() and np.nanstd().
+
+    Parameters
+    ----------
+    n_freqs : int
+        Number of values in each curve (i.e., number of frequency steps)
+    track_median : bool, default=True
+        Whether to estimate the median. If False, only the mean and standard deviation are calculated.
+    buffer_size : int, default=50
+        Number of curves for which the median is exact, before switching to the P² estimate.
+
+    Returns
+    -------
+    dict
+        Dictionary with the state of the estimators, for use with _update_streaming_stats() and _streaming_stats_results()
+    """
+    streamStats = {'count': np.zeros(n_freqs, dtype=np.int64),
+                   'mean': np.zeros(n_freqs, dtype=np.float64),
+                   'M2': np.zeros(n_freqs, dtype=np.float64),
+                   'track_median': track_median}
+
+    if track_median:
+        streamStats['buffer'] = []
+        streamStats['buffer_size'] = buffer_size
+        streamStats['p2_heights'] = None
+        streamStats['p2_positions'] = None
+        streamStats['p2_desired'] = None
+    return streamStats
+
+
+# Add (or remove) curves to streaming statistics
+def _update_streaming_stats(stream_stats, curves, remove=False):
+    """Add curves to (or remove curves from) the streaming statistics set up by _init_streaming_stats()
+
+    Parameters
+    ----------
+    stream_stats : dict
+        Streaming statistics, from _init_streaming_stats() (e.g., hvsr_data['streaming_stats']['psd']['Z'] after process_hvsr(stats_method='streaming'))
+    curves : numpy.ndarray
+        A single curve (1D array), or a block of curves (2D array with one curve per row)
+    remove : bool, default=False
+        If True, the curves are removed from the statistics instead of added (e.g., after they are found to be outliers).
+        Curves can only be removed from statistics that do not track the median (track_median=False).
+
+    Returns
+    -------
+    dict
+        The updated streaming statistics (the dictionary is also updated in place)
+    """
+    curves = np.atleast_2d(np.asarray(curves, dtype=np.float64))
+    if remove and stream_stats['track_median']:
+        raise ValueError('Curves cannot be removed from streaming statistics that track the median (track_median=True)')
+
+    # Mean and sum of squared deviations of the block, combined with (or removed from) the current values
+    blockCount = (~np.isnan(curves)).sum(axis=0)
+    hasVals = blockCount > 0
+    blockMean = np.divide(np.nansum(curves, axis=0), blockCount, out=np.zeros(curves.shape[1]), where=hasVals)
+    blockM2 = np.nansum((curves - blockMean)**2, axis=0)
+
+    count = stream_stats['count']
+    if remove:
+        newCount = count - blockCount
+        hasNew = newCount > 0
+        newMean = np.divide(count * stream_stats['mean'] - blockCount * blockMean, newCount, out=np.zeros(curves.shape[1]), where=hasNew)
+        delta = blockMean - newMean
+        newM2 = stream_stats['M2'] - blockM2 - np.divide(delta**2 * newCount * blockCount, count, out=np.zeros(curves.shape[1]), where=count > 0)
+        stream_stats['M2'] = np.where(hasNew, np.clip(newM2, 0, None), 0)
+    else:
+        newCount = count + blockCount
+        delta = blockMean - stream_stats['mean']
+        newMean = stream_stats['mean'] + np.divide(delta * blockCount, newCount, out=np.zeros(curves.shape[1]), where=hasVals)
+        stream_stats['M2'] = stream_stats['M2'] + blockM2 + np.divide(delta**2 * count * blockCount, newCount, out=np.zeros(curves.shape[1]), where=hasVals)
+    stream_stats['mean'] = newMean
+    stream_stats['count'] = newCount
+
+    if stream_stats['track_median']:
+        for curve in curves:
+            __p2_median_update(stream_stats, curve)
+
+    return stream_stats
+
+
+# Update the median estimate of streaming statistics with one curve
+def __p2_median_update(stream_stats, curve):
+    """Private function to update the (exact or P²) median of streaming statistics with a single curve"""
+    p2Increments = np.array([0, 0.25, 0.5, 0.75, 1])
+
+    # Curves are kept until the buffer is full, then the P² markers are set from them
+    if stream_stats['p2_heights'] is None:
+        stream_stats['buffer'].append(curve)
+        if len(stream_stats['buffer']) >= stream_stats['buffer_size']:
+            bufferArr = np.sort(np.stack(stream_stats['buffer']), axis=0)  # NaN values are sorted to the end
+            validCount = (~np.isnan(bufferArr)).sum(axis=0)
+            if validCount.min() >= 5:
+                desired = 1 + (validCount[:, np.newaxis] - 1) * p2Increments
+                positions = np.round(desired)
+                stream_stats['p2_heights'] = np.take_along_axis(bufferArr, positions.T.astype(int) - 1, axis=0).T
+                stream_stats['p2_positions'] = positions
+                stream_stats['p2_desired'] = desired
+                stream_stats['buffer'] = []
+        return stream_stats
+
+    updRows = np.flatnonzero(~np.isnan(curve))
+    if updRows.size == 0:
+        return stream_stats
+
+    x = curve[updRows]
+    q = stream_stats['p2_heights'][updRows]
+    n = stream_stats['p2_positions'][updRows]
+    nDes = stream_stats['p2_desired'][updRows]
+
+    # Find the cell of each new value, extending the extreme markers if needed
+    q[:, 0] = np.minimum(q[:, 0], x)
+    q[:, 4] = np.maximum(q[:, 4], x)
+    cellInd = (x[:, np.newaxis] >= q[:, 1:4]).sum(axis=1)
+    n += np.arange(5)[np.newaxis, :] > cellInd[:, np.newaxis]
+    nDes += p2Increments
+
+    # Adjust the middle markers, with piecewise-parabolic (or linear) interpolation
+    for i in range(1, 4):
+        d = nDes[:, i] - n[:, i]
+        doAdjust = ((d >= 1) & (n[:, i+1] - n[:, i] > 1)) | ((d <= -1) & (n[:, i-1] - n[:, i] < -1))
+        if not doAdjust.any():
+            continue
+        d = np.sign(d[doAdjust])
+        qa, na = q[doAdjust], n[doAdjust]
+
+        qParabolic = qa[:, i] + d / (na[:, i+1] - na[:, i-1]) * \
+            ((na[:, i] - na[:, i-1] + d) * (qa[:, i+1] - qa[:, i]) / (na[:, i+1] - na[:, i]) +
+             (na[:, i+1] - na[:, i] - d) * (qa[:, i] - qa[:, i-1]) / (na[:, i] - na[:, i-1]))
+        neighborInd = i + d.astype(int)
+        qNeighbor = qa[np.arange(qa.shape[0]), neighborInd]
+        nNeighbor = na[np.arange(na.shape[0]), neighborInd]
+        qLinear = qa[:, i] + d * (qNeighbor - qa[:, i]) / (nNeighbor - na[:, i])
+
+        useParabolic = (qa[:, i-1] < qParabolic) & (qParabolic < qa[:, i+1])
+        qa[:, i] = np.where(useParabolic, qParabolic, qLinear)
+        na[:, i] += d
+        q[doAdjust] = qa
+        n[doAdjust] = na
+
+    stream_stats['p2_heights'][updRows] = q
+    stream_stats['p2_positions'][updRows] = n
+    stream_stats['p2_desired'][updRows] = nDes
+    return stream_stats
+
+
+# Get results of streaming statistics
+def _streaming_stats_results(stream_stats):
+    """Get the median and standard deviation at each frequency from streaming statistics
+
+    Parameters
+    ----------
+    stream_stats : dict
+        Streaming statistics, from _init_streaming_stats() and _update_streaming_stats()
+
+    Returns
+    -------
+    tuple
+        Tuple (median, std), each a 1D array with one value per frequency (NaN where no values have been added).
+        median is None if track_median=False. std uses ddof=0, as np.nanstd().
+    """
+    count = stream_stats['count']
+    stdVals = np.sqrt(np.divide(stream_stats['M2'], count, out=np.full(count.shape, np.nan), where=count > 0))
+
+    medVals = None
+    if stream_stats['track_median']:
+        if stream_stats['p2_heights'] is not None:
+            medVals = stream_stats['p2_heights'][:, 2].copy()
+        elif len(stream_stats['buffer']) > 0:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', category=RuntimeWarning)
+                medVals = np.nanmedian(np.stack(stream_stats['buffer']), axis=0)
+        else:
+            medVals = np.full(count.shape, np.nan)
+    return medVals, stdVals
+
+
 # Get additional HVSR params for later calcualtions
-def __gethvsrparams(hvsr_out):
-    """Private function to get HVSR parameters for later calculations (things like standard deviation, etc)"""
+def __gethvsrparams(hvsr_out, stream_stats=None):
+    """Private function to get HVSR parameters for later calculations (things like standard deviation, etc)
+
+    If stream_stats (from process_hvsr(stats_method='streaming')) is given, hvsr_log_std is taken from its 'log_hv' estimators.
+    """
 
     hvsrp2 = {}
     hvsrm2 = {}
@@ -11536,11 +12921,7 @@ def __gethvsrparams(hvsr_out):
     hvsrDF = hvsr_out['hvsr_windows_df']
 
     if len(hvsr_out['ind_hvsr_curves'].keys()) > 0:
-        # With arrays, original way of doing it
-        hvsr_log_std = {}
-        for k in hvsr_out['ind_hvsr_curves'].keys():
-            minVal = 1e-10
-            hvsr_log_std[k] = np.nanstd(np.log10(np.clip(hvsr_out['ind_hvsr_curves'][k], minVal, None)), axis=0)
+        minVal = 1e-10
 
         #With dataframe, updated way to use DF for all time-step tasks, still testing
         logStackedata = {}
@@ -11564,7 +12945,10 @@ def __gethvsrparams(hvsr_out):
                     logStackedata[i] = np.array(r)
 
                 hvsr_out['hvsr_windows_df']['Log10_HV_Curves'+colSuffix] = logStackedata
-                hvsr_log_std[colID] = np.nanstd(np.stack(hvsr_out['hvsr_windows_df']['Log10_HV_Curves'+colSuffix][hvsrDF['Use']]), axis=0)
+                if stream_stats is not None and colID in stream_stats['log_hv'].keys():
+                    hvsr_log_std[colID] = _streaming_stats_results(stream_stats['log_hv'][colID])[1]
+                else:
+                    hvsr_log_std[colID] = np.nanstd(np.stack(hvsr_out['hvsr_windows_df']['Log10_HV_Curves'+colSuffix][hvsrDF['Use']]), axis=0)
 
                 #The components are already calculated, don't need to recalculate aren't calculated at the time-step level
                 if colID=='HV':
@@ -11845,6 +13229,88 @@ def _display_html_report(html_report):
                         pass
 
 
+# Private/Helper function to read and compile the html report template
+@functools.lru_cache(maxsize=None)
+def __compile_html_template(template_path):
+    """Private function to read the html report template and split it on its placeholders.
+
+    This is cached, so the template is only read and parsed once per process.
+
+    Parameters
+    ----------
+    template_path : str
+        Filepath to the html report template
+
+    Returns
+    -------
+    tuple
+        Parts of the template, alternating between literal text (even indices) and placeholder names (odd indices)
+    """
+    with open(template_path, 'r') as htmlF:
+        html = htmlF.read()
+
+    placeholderRegex = r'(HVSR_REPORT_TITLE|HVSR_ID|PEAKFREQ|PEAKSTDEV|SESAME_TESTS_RESULTS|\./output\.png|HVSR_PRINT_REPORT|TableData_\d{2}|X_Coordinate|Y_Coordinate|Deg_E|Deg_N)'
+    return tuple(re.split(placeholderRegex, html))
+
+
+# Private/Helper function to rasterize the plot report once for the html and pdf reports
+def __get_report_png(hvsr_results):
+    """Private function to get the Plot_Report figure as png bytes.
+
+    The png is saved with the figure in the (private) _plot_report_png attribute of hvsr_results,
+    so the html and pdf reports of the same get_report() call only save the figure once.
+    get_report() removes it (with __clear_report_png()) before and after generating reports,
+    so changes made to the figure between calls are not missed.
+
+    Parameters
+    ----------
+    hvsr_results : HVSRData
+        HVSRData object with a Plot_Report attribute
+
+    Returns
+    -------
+    bytes
+        The Plot_Report figure as png image
+    """
+    fig = hvsr_results['Plot_Report']
+    if hasattr(hvsr_results, '_plot_report_png') and hvsr_results['_plot_report_png']['figure'] is fig:
+        return hvsr_results['_plot_report_png']['png']
+
+    plotEngine = 'matplotlib'
+    if 'get_report' in hvsr_results.processing_parameters:
+        plotEngine = hvsr_results.processing_parameters['get_report']['plot_engine'].lower()
+
+    if str(plotEngine).lower() not in ['plotly', 'plty', 'p']:
+        fig = plt.figure(fig)
+        fig.set_size_inches(8.5, 6)
+        # Create a byte stream from the image
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png')
+        reportPNG = buf.getvalue()
+    else:
+        reportPNG = fig.to_image(format='png', engine='kaleido')
+
+    hvsr_results['_plot_report_png'] = {'figure': fig, 'png': reportPNG}
+    return reportPNG
+
+
+# Helper function to remove the png saved by __get_report_png()
+def __clear_report_png(hvsr_results):
+    """Private function to remove the (private) _plot_report_png attribute saved by __get_report_png(), if present"""
+    if hasattr(hvsr_results, '_plot_report_png'):
+        delattr(hvsr_results, '_plot_report_png')
+    return hvsr_results
+
+
+# Helper function to keep track of the report files written by get_report() and export_report()
+def __add_report_path(hvsr_results, report_format, report_path):
+    """Private function to save the filepath of an exported report in hvsr_results['Report_Paths'] (dict with report formats as keys)"""
+    if 'Report_Paths' not in hvsr_results.keys() or not isinstance(hvsr_results['Report_Paths'], dict):
+        hvsr_results['Report_Paths'] = {}
+    hvsr_results['Report_Paths'][report_format] = pathlib.Path(report_path)
+    return hvsr_results
+
+
 # Private function for html report generation
 def _generate_html_report(hvsr_results, azimuth='HV', show_html_report=False, verbose=False):
     """Private function that generates html report, intented to be used by get_report() public function
@@ -11863,53 +13329,32 @@ def _generate_html_report(hvsr_results, azimuth='HV', show_html_report=False, ve
     HVSRData or HVSRBatch
         Returns the input dataset, with the HTML_Report attribute updated with the html text of the report
     """
-    htmlTemplatePath = RESOURCE_DIR.joinpath('html_report_template.html')
+    htmlTemplate = __compile_html_template(RESOURCE_DIR.joinpath('html_report_template.html').as_posix())
 
-    with open(htmlTemplatePath, 'r') as htmlF:
-        html = htmlF.read()
+    # Values for each placeholder in the template (placeholders without a value are left as they are)
+    htmlValues = {}
 
     # Update report title (site name)
-    html = html.replace("HVSR_REPORT_TITLE", hvsr_results['site'])
-    html = html.replace("HVSR_ID", hvsr_results['hvsr_id'])
+    htmlValues["HVSR_REPORT_TITLE"] = hvsr_results['site']
+    htmlValues["HVSR_ID"] = hvsr_results['hvsr_id']
 
     # Update peak freq info
-    html = html.replace("PEAKFREQ", str(round(float(hvsr_results['BestPeak'][azimuth]['f0']), 3)))
-    html = html.replace("PEAKSTDEV", str(round(float(hvsr_results['BestPeak'][azimuth]['Sf']), 3)))
+    htmlValues["PEAKFREQ"] = str(round(float(hvsr_results['BestPeak'][azimuth]['f0']), 3))
+    htmlValues["PEAKSTDEV"] = str(round(float(hvsr_results['BestPeak'][azimuth]['Sf']), 3))
 
     if hvsr_results.Table_Report['PeakPasses'][0]:
-        html = html.replace("SESAME_TESTS_RESULTS", 'Peak has passed the SESAME validation tests.')
+        htmlValues["SESAME_TESTS_RESULTS"] = 'Peak has passed the SESAME validation tests.'
     else:
-        html = html.replace("SESAME_TESTS_RESULTS", 'Peak did not pass the SESAME validation tests.')
+        htmlValues["SESAME_TESTS_RESULTS"] = 'Peak did not pass the SESAME validation tests.'
 
     # Update image source
-    # Save the plot to a BytesIO object
-    # Default to matplotlib object
-    plotEngine = 'matplotlib'
-    if 'get_report' in hvsr_results.processing_parameters:
-        plotEngine = hvsr_results.processing_parameters['get_report']['plot_engine'].lower()
-
-    if str(plotEngine).lower() not in ['plotly', 'plty', 'p']:
-        fig = plt.figure(hvsr_results['Plot_Report'])
-        fig.set_size_inches(8.5, 6)
-        #fig.set_size_inches(4.25, 3)
-        # Create a byte stream from the image
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png')
-        buf.seek(0)
-
-        # Encode the image to base64
-        hvplot_base64 = base64.b64encode(buf.read()).decode('utf-8')
+    # The plot is rasterized once (and shared with any other report that needs the image)
+    try:
+        hvplot_base64 = base64.b64encode(__get_report_png(hvsr_results)).decode('utf-8')
         # Embed the image in the html document
-        html = html.replace("./output.png", f'data:image/png;base64,{hvplot_base64}')
-    else:
-
-        try:
-            img = hvsr_results.Plot_Report.to_image(format='png', engine='kaleido')
-            hvplot_base64 = base64.b64encode(img).decode('utf8')
-
-            html = html.replace("./output.png", f'data:image/png;base64,{hvplot_base64}')
-        except Exception:
-            html = html
+        htmlValues["./output.png"] = f'data:image/png;base64,{hvplot_base64}'
+    except Exception:
+        pass
 
     # Update formatting for print report for html
     html_print_report = hvsr_results.Print_Report.replace('\n', '<br>').replace('\t', "&nbsp;&nbsp;&nbsp;&nbsp;")
@@ -11917,7 +13362,6 @@ def _generate_html_report(hvsr_results, azimuth='HV', show_html_report=False, ve
     html_print_report = html_print_report.replace('✔', '&#10004;')
     html_print_report = html_print_report.replace('✘', '&cross;')
 
-    majorSepLine = u"\u2014"*99
     majorSepLine = u"\u2014"*99
     minorSepLine = u"\u2012"*95
     majorSepLineHTML = '&mdash;'*40
@@ -11932,16 +13376,13 @@ def _generate_html_report(hvsr_results, azimuth='HV', show_html_report=False, ve
     html_print_report = html_print_report.replace(minorSepLine, minorSepLineHTML) # Replace the minor separator lines
     html_print_report = html_print_report.replace("=", '') # Get rid of =
 
-    html = html.replace('HVSR_PRINT_REPORT', html_print_report)
+    htmlValues['HVSR_PRINT_REPORT'] = html_print_report
 
     # Update table
     htmlTable = hvsr_results.Table_Report.iloc[:,2:]
     for i in range(len(htmlTable.columns)):
-        tableHeader = htmlTable.columns[i]
-        #html = html.replace(f"TableHeader_{str(i).zfill(2)}", tableHeader)
-
         tableValue = htmlTable.iloc[:,i][0]
-        html = html.replace(f"TableData_{str(i).zfill(2)}", str(tableValue))
+        htmlValues[f"TableData_{str(i).zfill(2)}"] = str(tableValue)
 
     coord0Dir = hvsr_results['output_crs'].axis_info[0].direction
 
@@ -11963,11 +13404,14 @@ def _generate_html_report(hvsr_results, azimuth='HV', show_html_report=False, ve
     if 'latitude' in yaxis_name.lower():
         yaxis_name = 'Latitude'
 
-    html = html.replace("X_Coordinate", xaxis_name)
-    html = html.replace("Y_Coordinate", yaxis_name)
+    htmlValues["X_Coordinate"] = xaxis_name
+    htmlValues["Y_Coordinate"] = yaxis_name
 
-    html = html.replace("Deg_E", xaxisinfo.unit_name)
-    html = html.replace("Deg_N", yaxisinfo.unit_name)
+    htmlValues["Deg_E"] = xaxisinfo.unit_name
+    htmlValues["Deg_N"] = yaxisinfo.unit_name
+
+    # Fill in all placeholders in a single pass over the compiled template
+    html = ''.join(htmlValues.get(part, part) if i % 2 else part for i, part in enumerate(htmlTemplate))
 
     hvsr_results['HTML_Report'] = html
 
@@ -11982,14 +13426,116 @@ def _generate_html_report(hvsr_results, azimuth='HV', show_html_report=False, ve
     return hvsr_results
 
 
+# Private/Helper function to write the pdf report directly with matplotlib (without xhtml2pdf)
+def __write_pdf_report_pages(hvsr_results, pdf_report_filepath=None, azimuth='HV', verbose=False):
+    """Private function to write the pdf report using matplotlib's PdfPages.
+
+    The pdf has a summary page (peak information and Table_Report), the Plot_Report figure (as vector graphics, if plot_engine is matplotlib),
+    and the Print_Report text.
+
+    Parameters
+    ----------
+    hvsr_results : HVSRData
+        Input dataset with all processing already carried out
+    pdf_report_filepath : str or pathlib.Path, optional
+        Filepath or directory to save the pdf. If None, saved to a temporary file, by default None
+    azimuth : str, optional
+        Which azimuth to use for the report, by default 'HV'
+    verbose : bool, optional
+        Whether to print information to terminal, by default False
+
+    Returns
+    -------
+    pathlib.Path
+        Filepath of the pdf report
+    """
+    if pdf_report_filepath is None:
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
+            pdf_export_path = pathlib.Path(temp_file.name)
+    elif pathlib.Path(pdf_report_filepath).is_dir():
+        fname = f"{hvsr_results['site']}_REPORT_{hvsr_results['hvsr_id']}_{datetime.date.today()}.pdf"
+        pdf_export_path = pathlib.Path(pdf_report_filepath).joinpath(fname)
+    else:
+        pdf_export_path = pathlib.Path(pdf_report_filepath).with_suffix('.pdf')
+
+    # The pdf is built from the other reports, so create them if not already
+    if not hasattr(hvsr_results, 'Print_Report') or hvsr_results['Print_Report'] is None:
+        hvsr_results = _generate_print_report(hvsr_results, azimuth=azimuth, show_print_report=False, verbose=False)
+    if not hasattr(hvsr_results, 'Table_Report'):
+        hvsr_results = _generate_table_report(hvsr_results, azimuth=azimuth, show_table_report=False, verbose=False)
+    if not hasattr(hvsr_results, 'Plot_Report'):
+        hvsr_results['Plot_Report'] = plot_hvsr(hvsr_results, azimuth=azimuth, return_fig=True, show_plot=False)
+
+    a4Size = (8.27, 11.69)
+    with PdfPages(pdf_export_path) as pdf:
+        # Summary page: title, peak information, and table report
+        sumFig = plt.figure(figsize=a4Size)
+        sumFig.text(0.5, 0.95, hvsr_results['site'], ha='center', va='top', fontsize=20, fontweight='bold')
+        sumFig.text(0.5, 0.915, hvsr_results['hvsr_id'], ha='center', va='top', fontsize=10, color='gray')
+        peakText = f"Peak Frequency: {round(float(hvsr_results['BestPeak'][azimuth]['f0']), 3)} ± {round(float(hvsr_results['BestPeak'][azimuth]['Sf']), 3)} Hz"
+        sumFig.text(0.5, 0.87, peakText, ha='center', va='top', fontsize=14)
+        if hvsr_results['Table_Report']['PeakPasses'][0]:
+            sesameText = 'Peak has passed the SESAME validation tests.'
+        else:
+            sesameText = 'Peak did not pass the SESAME validation tests.'
+        sumFig.text(0.5, 0.84, sesameText, ha='center', va='top', fontsize=11)
+
+        tableRow = hvsr_results['Table_Report'].iloc[0]
+        tableAx = sumFig.add_axes([0.35, 0.08, 0.5, 0.7])
+        tableAx.axis('off')
+        reportTable = tableAx.table(cellText=[[str(v)] for v in tableRow.values], rowLabels=[str(c) for c in tableRow.index],
+                                    colLabels=['Value'], loc='upper center', cellLoc='left')
+        reportTable.auto_set_font_size(False)
+        reportTable.set_fontsize(10)
+        reportTable.scale(1, 1.6)
+        pdf.savefig(sumFig)
+        plt.close(sumFig)
+
+        # Plot page: saved as vector graphics if possible
+        plotEngine = 'matplotlib'
+        if 'get_report' in hvsr_results['processing_parameters']:
+            plotEngine = hvsr_results['processing_parameters']['get_report']['plot_engine'].lower()
+
+        if str(plotEngine).lower() not in ['plotly', 'plty', 'p']:
+            pdf.savefig(hvsr_results['Plot_Report'])
+        else:
+            plotFig, plotAx = plt.subplots(figsize=a4Size)
+            plotAx.imshow(plt.imread(io.BytesIO(__get_report_png(hvsr_results)), format='png'))
+            plotAx.axis('off')
+            pdf.savefig(plotFig)
+            plt.close(plotFig)
+
+        # Print report page
+        printFig = plt.figure(figsize=a4Size)
+        printFig.text(0.05, 0.97, hvsr_results['Print_Report'].strip('\n').expandtabs(4),
+                      ha='left', va='top', fontsize=7, family='monospace')
+        pdf.savefig(printFig)
+        plt.close(printFig)
+
+        pdfMetadata = pdf.infodict()
+        pdfMetadata['Title'] = f"HVSR Report: {hvsr_results['site']}"
+        pdfMetadata['Subject'] = hvsr_results['hvsr_id']
+
+    if verbose:
+        print(f'PDF report saved to {pdf_export_path}')
+
+    return pdf_export_path
+
+
 # Private/Helper function to generate pdf report
-def _generate_pdf_report(hvsr_results, pdf_report_filepath=None, show_pdf_report=False, show_html_report=False, return_pdf_path=False, verbose=False):
-    """Private/helper function to generate pdf report from HTML report, intended to be used by get_report() function
+def _generate_pdf_report(hvsr_results, pdf_report_filepath=None, azimuth='HV', pdf_engine='xhtml2pdf', show_pdf_report=False, show_html_report=False, return_pdf_path=False, verbose=False):
+    """Private/helper function to generate pdf report, intended to be used by get_report() function
 
     Parameters
     ----------
     hvsr_results : HVSRData or HVSRBatch
         Input dataset with all processing already carried out
+    azimuth : str, optional
+        Which azimuth to use for the report (see get_report()), by default 'HV'
+    pdf_engine : str {'xhtml2pdf', 'matplotlib'}, optional
+        How to create the pdf, by default 'xhtml2pdf'.
+            - 'xhtml2pdf' converts the HTML report to pdf
+            - 'matplotlib' writes the pdf directly using matplotlib's PdfPages (plot report as vector graphics, plus summary, table, and print report pages)
     show_pdf_report : bool, optional
         EXPERIMENTAL: Whether to open the report after generating it, by default False
     show_html_report : bool, optional
@@ -11998,69 +13544,74 @@ def _generate_pdf_report(hvsr_results, pdf_report_filepath=None, show_pdf_report
         Whether to print verbose description of what the function is doing
     """
 
-    # Generate HTML Report if not already (this will be converted to pdf using xhtml2pdf)
-    if not hasattr(hvsr_results, "HTML_Report"):
-        hvsr_results = _generate_html_report(hvsr_results, show_html_report=show_html_report)
-        if verbose:
-            print('\tNo HTML Report previously generated, attempting now.')
-        # try Code to generate HTML report from template
+    if str(pdf_engine).lower() in ['matplotlib', 'mpl', 'pdfpages']:
+        pdf_export_path = __write_pdf_report_pages(hvsr_results, pdf_report_filepath=pdf_report_filepath, azimuth=azimuth, verbose=verbose)
+    else:
+        from xhtml2pdf import pisa  # Only imported when needed (slow to import)
 
-    htmlReport = hvsr_results['HTML_Report']
-    htmlReport = htmlReport.replace('width=99%', '')
+        # Generate HTML Report if not already (this will be converted to pdf using xhtml2pdf)
+        if not hasattr(hvsr_results, "HTML_Report"):
+            hvsr_results = _generate_html_report(hvsr_results, azimuth=azimuth, show_html_report=show_html_report)
+            if verbose:
+                print('\tNo HTML Report previously generated, attempting now.')
+            # try Code to generate HTML report from template
 
-    if pdf_report_filepath is None:
-        if verbose:
-            print('\t pdf_report_filepath not specified, attempting to save to temporary file.')
-        try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                pdf_export_path = temp_file.name  # Get the name of the temporary file
+        htmlReport = hvsr_results['HTML_Report']
+        htmlReport = htmlReport.replace('width=99%', '')
 
-            # Now, open the file again for writing
-            with open(pdf_export_path, 'wb') as temp_file:
-                pisa_status = pisa.CreatePDF(htmlReport, dest=temp_file)
-        except Exception:
-            print("\t Attempting BytesIO")
+        if pdf_report_filepath is None:
+            if verbose:
+                print('\t pdf_report_filepath not specified, attempting to save to temporary file.')
+            try:
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
+                    pdf_export_path = temp_file.name  # Get the name of the temporary file
 
-            output = io.BytesIO()
-            pisa_status = 'All good'
-            pisa_status = pisa.CreatePDF(htmlReport,
-                            dest=output, # destination "file"
-                          )
+                # Now, open the file again for writing
+                with open(pdf_export_path, 'wb') as temp_file:
+                    pisa_status = pisa.CreatePDF(htmlReport, dest=temp_file)
+            except Exception:
+                print("\t Attempting BytesIO")
 
-            pdf_export_path = "PDF_Report attribute"
-            # You can get the PDF file bytes with `.getbuffer()`
-            print("\tPDF File created as bytes buffer of size", len(output.getbuffer()))
-            hvsr_results["PDF_Report"] = output.getbuffer()
+                output = io.BytesIO()
+                pisa_status = 'All good'
+                pisa_status = pisa.CreatePDF(htmlReport,
+                                dest=output, # destination "file"
+                              )
 
-    else:
-        if pathlib.Path(pdf_report_filepath).is_dir():
-            fname = f"{hvsr_results['site']}_REPORT_{hvsr_results['hvsr_id']}_{datetime.date.today()}.pdf"
-            pdf_report_filepath = pathlib.Path(pdf_report_filepath).joinpath(fname)
+                pdf_export_path = "PDF_Report attribute"
+                # You can get the PDF file bytes with `.getbuffer()`
+                print("\tPDF File created as bytes buffer of size", len(output.getbuffer()))
+                hvsr_results["PDF_Report"] = output.getbuffer()
 
-        try:
+        else:
+            if pathlib.Path(pdf_report_filepath).is_dir():
+                fname = f"{hvsr_results['site']}_REPORT_{hvsr_results['hvsr_id']}_{datetime.date.today()}.pdf"
+                pdf_report_filepath = pathlib.Path(pdf_report_filepath).joinpath(fname)
 
-            with open(pdf_report_filepath, "w+b") as export_file:
-                pisa_status = pisa.CreatePDF(htmlReport, dest=export_file)
-            pdf_export_path = pdf_report_filepath
-            if verbose:
-                print(f'PDF report saved to {pdf_export_path}')
-        except Exception as e:
-            print(f'PDF could not be saved to {pdf_report_filepath}')
-            if verbose:
-                print(f'\t{e}')
+            try:
 
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                pdf_export_path = temp_file.name  # Get the name of the temporary file
-            print(f'Saving pdf to temporary file instead: {temp_file.name}')
-            # Now, open the file again for writing
-            with open(pdf_export_path, 'wb') as temp_file:
-                pisa_status = pisa.CreatePDF(htmlReport, dest=temp_file)
+                with open(pdf_report_filepath, "w+b") as export_file:
+                    pisa_status = pisa.CreatePDF(htmlReport, dest=export_file)
+                pdf_export_path = pdf_report_filepath
+                if verbose:
+                    print(f'PDF report saved to {pdf_export_path}')
+            except Exception as e:
+                print(f'PDF could not be saved to {pdf_report_filepath}')
+                if verbose:
+                    print(f'\t{e}')
 
-    if verbose:
-        if hasattr(pisa_status, 'err') and not str(pisa_status.err) == '0':
-            print('\t', pisa_status.err)
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
+                    pdf_export_path = temp_file.name  # Get the name of the temporary file
+                print(f'Saving pdf to temporary file instead: {temp_file.name}')
+                # Now, open the file again for writing
+                with open(pdf_export_path, 'wb') as temp_file:
+                    pisa_status = pisa.CreatePDF(htmlReport, dest=temp_file)
 
-    if show_html_report:
+        if verbose:
+            if hasattr(pisa_status, 'err') and not str(pisa_status.err) == '0':
+                print('\t', pisa_status.err)
+
+    if show_html_report and 'HTML_Report' in hvsr_results.keys():
         _display_html_report(hvsr_results['HTML_Report'])
 
     if show_pdf_report:
@@ -12114,6 +13665,9 @@ def _generate_pdf_report(hvsr_results, pdf_report_filepath=None, show_pdf_report
             except Exception as e:
                 print('\tHTML Report could not be displayed, but has been saved to the .HTML_Report attribute')
 
+    if pdf_export_path != "PDF_Report attribute":
+        __add_report_path(hvsr_results, 'pdf', pdf_export_path)
+
     if return_pdf_path:
         return pdf_export_path
 
@@ -12299,17 +13853,14 @@ def _plot_hvsr(hvsr_data, plot_type, xtype='frequency', fig=None, ax=None, azimu
             else:
                 # Show all peaks at all times (semitransparent red bars)
                 if k == 'tp':
-                    for j, t in enumerate(hvsrDF[used]['CurvesPeakIndices_'+azimuth]):
-                        for i, v in enumerate(t):
-                            v= x[v]
-                            if i==0:
-                                width = (x[i+1]-x[i])/16
-                            else:
-                                width = (x[i]-x[i-1])/16
-                            if j == 0 and i==0:
-                                ax.fill_betweenx(ylim,v-width,v+width, color='r', alpha=0.05, label='Individual H/V Peaks')
-                            else:
-                                ax.fill_betweenx(ylim,v-width,v+width, color='r', alpha=0.05)
+                    peakInds, _ = _get_ind_peaks(hvsr_data, azimuth, use_only=True)
+                    if peakInds.shape[0] > 0:
+                        # All peaks drawn as one collection of bars, each 1/8 of the local frequency step wide
+                        xArr = np.asarray(x)
+                        peakFreqs = xArr[peakInds]
+                        widths = (xArr[np.maximum(peakInds, 1)] - xArr[np.maximum(peakInds, 1)-1])/16
+                        ax.broken_barh(np.column_stack([peakFreqs-widths, 2*widths]), (ylim[0], ylim[1]-ylim[0]),
+                                       color='r', alpha=0.05, linewidth=0, label='Individual H/V Peaks')
                 # Show curves at all time windows
                 if k == 't':
                     if used.sum() > 0:
@@ -12719,7 +14270,7 @@ def __plot_current_fig(save_dir, filename, fig, ax, plot_suffix, user_suffix, sh
 
 
 # Plot specgtrogram, private supporting function for plot_hvsr
-def _plot_specgram_hvsr(hvsr_data, fig=None, ax=None, azimuth='HV', save_dir=None, save_suffix='', **kwargs):
+def _plot_specgram_hvsr(hvsr_data, fig=None, ax=None, azimuth='HV', save_dir=None, save_suffix='', show_plot=True, **kwargs):
     """Private function for plotting average spectrogram of all three channels from psds
     """
     # Get all input parameters
@@ -12878,15 +14429,10 @@ def _plot_specgram_hvsr(hvsr_data, fig=None, ax=None, azimuth='HV', save_dir=Non
                       bbox={'alpha':0.8, 'edgecolor':None, 'linewidth':0, 'fc':'w', 'pad':0.3})
 
     if show_all_time_peaks:
-        timeVals = []
-        peakFreqs = []
-        for tIndex, pFreqs in enumerate(hvsrDF[used]['CurvesPeakFreqs_'+azimuth]):
-            endWindow = hvsrDF.iloc[tIndex]['TimesProcessed_MPLEnd']
-            startWindow = hvsrDF.iloc[tIndex]['TimesProcessed_MPL']
-            midTime = (endWindow + startWindow) / 2
-            for f in pFreqs:
-                timeVals.append(midTime)
-                peakFreqs.append(f)
+        peakInds, peakOffsets = _get_ind_peaks(hvsr_data, azimuth, use_only=True)
+        midTimes = (hvsrDF[used]['TimesProcessed_MPLEnd'].to_numpy(dtype=float) + hvsrDF[used]['TimesProcessed_MPL'].to_numpy(dtype=float)) / 2
+        timeVals = np.repeat(midTimes, np.diff(peakOffsets))
+        peakFreqs = np.asarray(hvsr_data['x_freqs'][anyKey])[peakInds]
         ax.scatter(timeVals, peakFreqs, marker="^", facecolors='#00000000', edgecolors='#00000088',s=12)
 
     if show_all_peaks:
@@ -12916,7 +14462,8 @@ def _plot_specgram_hvsr(hvsr_data, fig=None, ax=None, azimuth='HV', save_dir=Non
     #plt.sca(ax)
     #plt.rcParams['figure.dpi'] = 500
     #plt.rcParams['figure.figsize'] = (12,4)
-    fig.canvas.draw()
+    if show_plot:
+        fig.canvas.draw()
 
     return fig, ax
 
@@ -12952,21 +14499,49 @@ def __init_peaks(_x, _y, _index_list, _hvsr_band, peak_freq_range=DEFAULT_BAND,
 
             List of dictionaries, one for each input peak
     """
+    _index_list = np.asarray(_index_list, dtype=int).ravel()
+    if _index_list.size == 0:
+        return list()
+
+    # Select all peaks in the bands at once, keeping the order of _index_list
+    _xPeaks = np.asarray(_x)[_index_list]
+    _yPeaks = np.asarray(_y)[_index_list]
+    _keep = (_hvsr_band[0] <= _xPeaks) & (_xPeaks <= _hvsr_band[1]) & \
+        (peak_freq_range[0] <= _xPeaks) & (_xPeaks <= peak_freq_range[1]) & \
+        (_yPeaks > _min_peak_amp)
 
     _peak = list()
-    for _i in _index_list:
-        if (_hvsr_band[0] <= _x[_i] <= _hvsr_band[1]) and (peak_freq_range[0] <= _x[_i] <= peak_freq_range[1]) and (_y[_i]>_min_peak_amp):
-            _peak.append({'f0': float(_x[_i]), 'A0': float(_y[_i]),
+    for _f0, _a0 in zip(_xPeaks[_keep], _yPeaks[_keep]):
+        _peak.append({'f0': float(_f0), 'A0': float(_a0),
 
-                          'f-': None, 'f+': None, 'Sf': None, 'Sa': None,
-                          'Score': 0,
+                      'f-': None, 'f+': None, 'Sf': None, 'Sa': None,
+                      'Score': 0,
 
-                          'Report': {'Lw':'', 'Nc':'', 'σ_A(f)':'', 'A(f-)':'', 'A(f+)':'', 'A0': '', 'P+': '', 'P-': '', 'Sf': '', 'Sa': ''},
-                          'PassList':{},
-                          'PeakPasses':False})
+                      'Report': {'Lw':'', 'Nc':'', 'σ_A(f)':'', 'A(f-)':'', 'A(f+)':'', 'A0': '', 'P+': '', 'P-': '', 'Sf': '', 'Sa': ''},
+                      'PassList':{},
+                      'PeakPasses':False})
     return _peak
 
 
+# Get the f0 and A0 values of a list of peaks as arrays
+def __peak_arrays(_peak):
+    """Private function to get the peak frequencies and amplitudes of a list of peak dictionaries as numpy arrays
+
+    Parameters
+    ----------
+    _peak : list
+        List of dictionaries (from __init_peaks()), each with at least the 'f0' and 'A0' keys
+
+    Returns
+    -------
+    tuple
+        Tuple of two 1D numpy arrays (f0, A0), each with one item per peak
+    """
+    _f0 = np.array([p['f0'] for p in _peak], dtype=float)
+    _a0 = np.array([p['A0'] for p in _peak], dtype=float)
+    return _f0, _a0
+
+
 # Check reliability of HVSR of curve
 def __check_curve_reliability(hvsr_data, _peak, col_id='HV'):
     """Tests to check for reliable H/V curve
@@ -12986,6 +14561,8 @@ def __check_curve_reliability(hvsr_data, _peak, col_id='HV'):
             StDev is a measure of the variation of all the H/V curves generated for each time window
                 Our main H/V curve is the median of these
 
+    All peaks are tested at once, using a (peaks x frequencies) boolean mask for the 0.5f0-2f0 band of each peak.
+
     Parameters
     ----------
     hvsr_data   : dict
@@ -12998,62 +14575,59 @@ def __check_curve_reliability(hvsr_data, _peak, col_id='HV'):
     _peak   : list
         List of dictionaries, same as above, except with information about curve reliability tests added
     """
+    if len(_peak) == 0:
+        return _peak
+
     anyKey = list(hvsr_data['psds'].keys())[0]#Doesn't matter which channel we use as key
 
-    delta = hvsr_data['psds'][anyKey]['delta']
     window_len = hvsr_data['psds'][anyKey]['psd_length'] #Window length in seconds
     window_num = np.array(hvsr_data['psd_raw'][anyKey]).shape[0]
 
+    peakFreqs, _ = __peak_arrays(_peak)
+
+    # Test 1 and Test 2
+    test1 = peakFreqs > 10/window_len
+    ncArr = window_len * window_num * peakFreqs
+    test2 = ncArr > 200
+
+    # Test 3: no frequency between f0/2 and 2f0 may have a log standard deviation at or above the threshold
+    xFreqs = np.asarray(hvsr_data['x_freqs'][anyKey])[:-1]
+    logStd = np.asarray(hvsr_data['hvsr_log_std'][col_id])[:xFreqs.shape[0]]
+    xFreqs = xFreqs[:logStd.shape[0]]
+
+    compVals = np.where(peakFreqs >= 0.5, 2, 3)
+    bandMask = (xFreqs[np.newaxis, :] >= peakFreqs[:, np.newaxis] / 2) & (xFreqs[np.newaxis, :] < peakFreqs[:, np.newaxis] * 2)
+    failMask = bandMask & (logStd[np.newaxis, :] >= compVals[:, np.newaxis])
+    test3 = ~np.any(failMask, axis=1)
+
     for _i in range(len(_peak)):
-        # Test 1
-        peakFreq= _peak[_i]['f0']
-        test1 = peakFreq > 10/window_len
-
-        nc = window_len * window_num * peakFreq
-        test2 = nc > 200
-
-        halfF0 = peakFreq/2
-        doublef0 = peakFreq*2
-
-        test3 = True
-        failCount = 0
-        for i, freq in enumerate(hvsr_data['x_freqs'][anyKey][:-1]):
-            if freq >= halfF0 and freq <doublef0:
-                compVal = 2
-                if peakFreq >= 0.5:
-                    if hvsr_data['hvsr_log_std'][col_id][i] >= compVal:
-                        test3=False
-                        failCount +=1
-
-                else: #if peak freq is less than 0.5
-                    compVal = 3
-                    if hvsr_data['hvsr_log_std'][col_id][i] >= compVal:
-                        test3=False
-                        failCount +=1
-
-        if test1:
+        peakFreq = _peak[_i]['f0']
+        compVal = compVals[_i]
+        nc = ncArr[_i]
+
+        if test1[_i]:
             _peak[_i]['Report']['Lw'] = f'{round(peakFreq,3)} > {10/int(window_len):0.3} (10 / {int(window_len)})  {sprit_utils._check_mark()}'
         else:
             _peak[_i]['Report']['Lw'] = f'{round(peakFreq,3)} > {10/int(window_len):0.3} (10 / {int(window_len)})  {sprit_utils._x_mark()}'
 
-        if test2:
+        if test2[_i]:
             _peak[_i]['Report']['Nc'] = f'{int(nc)} > 200  {sprit_utils._check_mark()}'
         else:
             _peak[_i]['Report']['Nc'] = f'{int(nc)} > 200  {sprit_utils._x_mark()}'
 
-        if test3:
+        if test3[_i]:
             _peak[_i]['Report']['σ_A(f)'] = f'H/V Amp. St.Dev. for {peakFreq*0.5:0.3f}-{peakFreq*2:0.3f}Hz < {compVal}  {sprit_utils._check_mark()}'
         else:
             _peak[_i]['Report']['σ_A(f)'] = f'H/V Amp. St.Dev. for {peakFreq*0.5:0.3f}-{peakFreq*2:0.3f}Hz < {compVal}  {sprit_utils._x_mark()}'
 
-        _peak[_i]['PassList']['WinLen'] = test1
-        _peak[_i]['PassList']['SigCycles'] = test2
-        _peak[_i]['PassList']['LowCurveStD'] = test3
+        _peak[_i]['PassList']['WinLen'] = bool(test1[_i])
+        _peak[_i]['PassList']['SigCycles'] = bool(test2[_i])
+        _peak[_i]['PassList']['LowCurveStD'] = bool(test3[_i])
     return _peak
 
 
 # Check clarity of peaks
-def __check_clarity(_x, _y, _peak, do_rank=True):
+def __check_clarity(_x, _y, _peak):
     """Check clarity of peak amplitude(s)
 
        Test peaks for satisfying amplitude clarity conditions as outlined by SESAME 2004:
@@ -13061,6 +14635,9 @@ def __check_clarity(_x, _y, _peak, do_rank=True):
            - there exist one frequency f+, lying between f0 and 4*f0, such that A0 / A(f+) > 2
            - A0 > 2
 
+        All peaks are tested at once, using (peaks x frequencies) boolean masks for the f0/4-f0 and f0-4f0 bands.
+        The frequency reported for f- is the highest one satisfying the condition, and for f+ the lowest one.
+
         Parameters
         ----------
         x : list-like obj
@@ -13071,74 +14648,82 @@ def __check_clarity(_x, _y, _peak, do_rank=True):
             List with hvsr curve values
         _peak : list
             List with dictionaries for each peak, containing info about that peak
-        do_rank : bool, default=False
-            Include Rank in output
 
         Returns
         -------
         _peak : list
             List of dictionaries, each containing the clarity test information for the different peaks that were read in
     """
-    global max_rank
+    if len(_peak) == 0:
+        return _peak
 
-    # Test each _peak for clarity.
-    if do_rank:
-        max_rank += 1
+    _x = np.asarray(_x, dtype=float)
+    _y = np.asarray(_y, dtype=float)
+    _f0, _a0 = __peak_arrays(_peak)
 
-    if np.array(_x).shape[0] == 1000:
+    if _x.shape[0] == 1000:
         jstart = len(_y)-2
     else:
         jstart = len(_y)-1
+    jend = len(_x)-1
 
-    for _i in range(len(_peak)):
-        #Initialize as False
-        _peak[_i]['f-'] = sprit_utils._x_mark()
-        _peak[_i]['Report']['A(f-)'] = f"H/V curve > {_peak[_i]['A0']/2:0.2f} for all {_peak[_i]['f0']/4:0.2f} Hz-{_peak[_i]['f0']:0.3f} Hz {sprit_utils._x_mark()}"
-        _peak[_i]['PassList']['ProminenceLow'] = False #Start with assumption that it is False until we find an instance where it is True
-        for _j in range(jstart, -1, -1):
-            # There exist one frequency f-, lying between f0/4 and f0, such that A0 / A(f-) > 2.
-            if (float(_peak[_i]['f0']) / 4.0 <= _x[_j] < float(_peak[_i]['f0'])) and float(_peak[_i]['A0']) / _y[_j] > 2.0:
-                _peak[_i]['Score'] += 1
-                _peak[_i]['f-'] = '%10.3f %1s' % (_x[_j], sprit_utils._check_mark())
-                _peak[_i]['Report']['A(f-)'] = f"Amp. of H/V Curve @{_x[_j]:0.3f}Hz ({_y[_j]:0.3f}) < {_peak[_i]['A0']/2:0.3f} {sprit_utils._check_mark()}"
-                _peak[_i]['PassList']['ProminenceLow'] = True
-                break
-            else:
-                pass
+    # The curve may have one value fewer than the x-values
+    nVals = min(_x.shape[0], _y.shape[0])
+    _x = _x[:nVals]
+    _y = _y[:nVals]
 
-    if do_rank:
-        max_rank += 1
-    for _i in range(len(_peak)):
-        #Initialize as False
-        _peak[_i]['f+'] = sprit_utils._x_mark()
-        _peak[_i]['Report']['A(f+)'] = f"H/V curve > {_peak[_i]['A0']/2:0.2f} for all {_peak[_i]['f0']:0.2f} Hz-{_peak[_i]['f0']*4:0.3f} Hz {sprit_utils._x_mark()}"
-        _peak[_i]['PassList']['ProminenceHi'] = False
-        for _j in range(len(_x) - 1):
-
-            # There exist one frequency f+, lying between f0 and 4*f0, such that A0 / A(f+) > 2.
-            if float(_peak[_i]['f0']) * 4.0 >= _x[_j] > float(_peak[_i]['f0']) and \
-                    float(_peak[_i]['A0']) / _y[_j] > 2.0:
-                _peak[_i]['Score'] += 1
-                _peak[_i]['f+'] = f"{_x[_j]:0.3f} {sprit_utils._check_mark()}"
-                _peak[_i]['Report']['A(f+)'] = f"H/V Curve at {_x[_j]:0.2f} Hz: {_y[_j]:0.2f} < {_peak[_i]['A0']/2:0.2f} (f0/2) {sprit_utils._check_mark()}"
-                _peak[_i]['PassList']['ProminenceHi'] = True
-                break
-            else:
-                pass
+    # A0 / A(f) > 2 for each peak (rows) at each frequency (columns)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ampRatioPass = (_a0[:, np.newaxis] / _y[np.newaxis, :]) > 2.0
+
+    # There exist one frequency f-, lying between f0/4 and f0, such that A0 / A(f-) > 2.
+    lowMask = (_x[np.newaxis, :] >= _f0[:, np.newaxis] / 4.0) & (_x[np.newaxis, :] < _f0[:, np.newaxis]) & ampRatioPass
+    lowMask[:, jstart+1:] = False
+    lowPass = np.any(lowMask, axis=1)
+    lowInd = lowMask.shape[1] - 1 - np.argmax(lowMask[:, ::-1], axis=1)  # Highest frequency satisfying the test
+
+    # There exist one frequency f+, lying between f0 and 4*f0, such that A0 / A(f+) > 2.
+    hiMask = (_x[np.newaxis, :] <= _f0[:, np.newaxis] * 4.0) & (_x[np.newaxis, :] > _f0[:, np.newaxis]) & ampRatioPass
+    hiMask[:, jend:] = False
+    hiPass = np.any(hiMask, axis=1)
+    hiInd = np.argmax(hiMask, axis=1)  # Lowest frequency satisfying the test
 
     # Amplitude Clarity test
     # Only peaks with A0 > 2 pass
-    if do_rank:
-        max_rank += 1
-    _a0 = 2.0
+    _a0Thresh = 2.0
+    ampPass = _a0 > _a0Thresh
+
     for _i in range(len(_peak)):
+        if lowPass[_i]:
+            _j = lowInd[_i]
+            _peak[_i]['Score'] += 1
+            _peak[_i]['f-'] = '%10.3f %1s' % (_x[_j], sprit_utils._check_mark())
+            _peak[_i]['Report']['A(f-)'] = f"Amp. of H/V Curve @{_x[_j]:0.3f}Hz ({_y[_j]:0.3f}) < {_peak[_i]['A0']/2:0.3f} {sprit_utils._check_mark()}"
+            _peak[_i]['PassList']['ProminenceLow'] = True
+        else:
+            _peak[_i]['f-'] = sprit_utils._x_mark()
+            _peak[_i]['Report']['A(f-)'] = f"H/V curve > {_peak[_i]['A0']/2:0.2f} for all {_peak[_i]['f0']/4:0.2f} Hz-{_peak[_i]['f0']:0.3f} Hz {sprit_utils._x_mark()}"
+            _peak[_i]['PassList']['ProminenceLow'] = False
+
+    for _i in range(len(_peak)):
+        if hiPass[_i]:
+            _j = hiInd[_i]
+            _peak[_i]['Score'] += 1
+            _peak[_i]['f+'] = f"{_x[_j]:0.3f} {sprit_utils._check_mark()}"
+            _peak[_i]['Report']['A(f+)'] = f"H/V Curve at {_x[_j]:0.2f} Hz: {_y[_j]:0.2f} < {_peak[_i]['A0']/2:0.2f} (f0/2) {sprit_utils._check_mark()}"
+            _peak[_i]['PassList']['ProminenceHi'] = True
+        else:
+            _peak[_i]['f+'] = sprit_utils._x_mark()
+            _peak[_i]['Report']['A(f+)'] = f"H/V curve > {_peak[_i]['A0']/2:0.2f} for all {_peak[_i]['f0']:0.2f} Hz-{_peak[_i]['f0']*4:0.3f} Hz {sprit_utils._x_mark()}"
+            _peak[_i]['PassList']['ProminenceHi'] = False
 
-        if float(_peak[_i]['A0']) > _a0:
-            _peak[_i]['Report']['A0'] = f"Amplitude of peak ({_peak[_i]['A0']:0.2f}) > {int(_a0)} {sprit_utils._check_mark()}"
+    for _i in range(len(_peak)):
+        if ampPass[_i]:
+            _peak[_i]['Report']['A0'] = f"Amplitude of peak ({_peak[_i]['A0']:0.2f}) > {int(_a0Thresh)} {sprit_utils._check_mark()}"
             _peak[_i]['Score'] += 1
             _peak[_i]['PassList']['AmpClarity'] = True
         else:
-            _peak[_i]['Report']['A0'] = '%0.2f > %0.1f %1s' % (_peak[_i]['A0'], _a0, sprit_utils._x_mark())
+            _peak[_i]['Report']['A0'] = '%0.2f > %0.1f %1s' % (_peak[_i]['A0'], _a0Thresh, sprit_utils._x_mark())
             _peak[_i]['PassList']['AmpClarity'] = False
 
     return _peak
@@ -13152,6 +14737,8 @@ def __check_freq_stability(_peak, _peakm, _peakp):
         - the _peak should appear at the same frequency (within a percentage ± 5%) on the H/V
             curves corresponding to mean + and - one standard deviation.
 
+    The ±5% windows of all peaks are compared against all peakm/peakp frequencies at once.
+
     Parameters
     ----------
     _peak : list
@@ -13166,70 +14753,56 @@ def __check_freq_stability(_peak, _peakm, _peakp):
     _peak : list
         List of dictionaries containing output information about peak test
     """
-    global max_rank
-
-    # check σf and σA
-    max_rank += 1
+    if len(_peak) == 0:
+        return _peak
+
+    _f0, _ = __peak_arrays(_peak)
+    _f0m, _ = __peak_arrays(_peakm)
+    _f0p, _ = __peak_arrays(_peakp)
+
+    # (peaks x peakm) and (peaks x peakp) masks of frequencies within ±5% of each peak
+    withinM = (_f0[:, np.newaxis] * 0.95 <= _f0m[np.newaxis, :]) & (_f0m[np.newaxis, :] <= _f0[:, np.newaxis] * 1.05)
+    withinP = (_f0[:, np.newaxis] * 0.95 <= _f0p[np.newaxis, :]) & (_f0p[np.newaxis, :] <= _f0[:, np.newaxis] * 1.05)
+    foundM = np.any(withinM, axis=1)
+    foundP = np.any(withinP, axis=1)
+    # Report the first matching frequency, or the last one tested if there is no match
+    indM = np.where(foundM, np.argmax(withinM, axis=1), len(_peakm) - 1)
+    indP = np.where(foundP, np.argmax(withinP, axis=1), len(_peakp) - 1)
 
     # First check below
-    # Initialize list
-    _found_m = list()
-
     for _i in range(len(_peak)):
-        _dx = 1000000.
-        # Initialize test as not passing for this frequency
-        _found_m.append(False)
-        _peak[_i]['Report']['P-'] = sprit_utils._x_mark()
-        # Iterate through all time windows
-        _j = None
-        for _j in range(len(_peakm)):
-            if abs(_peakm[_j]['f0'] - _peak[_i]['f0']) < _dx:
-                _index = _j
-                _dx = abs(_peakm[_j]['f0'] - _peak[_i]['f0']) #_dx is difference between peak frequencies for each time window and main peak
-            if _peak[_i]['f0'] * 0.95 <= _peakm[_j]['f0'] <= _peak[_i]['f0'] * 1.05:
-                _peak[_i]['Report']['P-'] = f"{_peakm[_j]['f0']:0.2f} Hz within ±5% of {_peak[_i]['f0']:0.2f} Hz {sprit_utils._check_mark()}"
-                _found_m[_i] = True
-                break
+        if len(_peakm) == 0:
+            _peak[_i]['Report']['P-'] = sprit_utils._x_mark()
+            continue
 
-        if _peak[_i]['Report']['P-'] == sprit_utils._x_mark() and _j is not None:
-            _peak[_i]['Report']['P-'] = f"{_peakm[_j]['f0']:0.2f} Hz within ±5% of {_peak[_i]['f0']:0.2f} Hz {sprit_utils._x_mark()}"
+        mark = sprit_utils._check_mark() if foundM[_i] else sprit_utils._x_mark()
+        _peak[_i]['Report']['P-'] = f"{_f0m[indM[_i]]:0.2f} Hz within ±5% of {_f0[_i]:0.2f} Hz {mark}"
 
     # Then Check above
-    _found_p = list()
     for _i in range(len(_peak)):
-        _dx = 1000000.
-        _found_p.append(False)
-        _peak[_i]['Report']['P+'] = sprit_utils._x_mark()
-        for _j in range(len(_peakp)):
-            if abs(_peakp[_j]['f0'] - _peak[_i]['f0']) < _dx:
-
-                _dx = abs(_peakp[_j]['f0'] - _peak[_i]['f0'])
-            if _peak[_i]['f0'] * 0.95 <= _peakp[_j]['f0'] <= _peak[_i]['f0'] * 1.05:
-                if _found_m[_i]:
-                    _peak[_i]['Report']['P+'] = f"{_peakp[_j]['f0']:0.2f} Hz within ±5% of {_peak[_i]['f0']:0.2f} Hz {sprit_utils._check_mark()}"
-                    _peak[_i]['Score'] += 1
-                    _peak[_i]['PassList']['FreqStability'] = True
-                else:
-                    _peak[_i]['Report']['P+'] = f"{_peakp[_j]['f0']:0.2f} Hz within ±5% of {_peak[_i]['f0']:0.2f} Hz {sprit_utils._x_mark()}"
-                    _peak[_i]['PassList']['FreqStability'] = False
-                break
-            else:
-                _peak[_i]['Report']['P+'] = f"{_peakp[_j]['f0']:0.2f} Hz within ±5% of {_peak[_i]['f0']:0.2f} Hz {sprit_utils._x_mark()}"
-                _peak[_i]['PassList']['FreqStability'] = False
+        if len(_peakp) == 0:
+            _peak[_i]['Report']['P+'] = sprit_utils._x_mark()
+            continue
 
-        if _peak[_i]['Report']['P+'] == sprit_utils._x_mark() and len(_peakp) > 0:
-            _peak[_i]['Report']['P+'] = f"{_peakp[_j]['f0']:0.2f} Hz within ±5% of {_peak[_i]['f0']:0.2f} Hz {sprit_utils._x_mark()}"
+        passes = bool(foundP[_i] and foundM[_i])
+        mark = sprit_utils._check_mark() if passes else sprit_utils._x_mark()
+        _peak[_i]['Report']['P+'] = f"{_f0p[indP[_i]]:0.2f} Hz within ±5% of {_f0[_i]:0.2f} Hz {mark}"
+        _peak[_i]['PassList']['FreqStability'] = passes
+        if passes:
+            _peak[_i]['Score'] += 1
 
     return _peak
 
 
 # Check stability
-def __check_stability(_stdf, _peak, _hvsr_log_std, rank):
+def __check_stability(_stdf, _peak, _hvsr_log_std):
     """Test peaks for satisfying stability conditions as outlined by SESAME 2004
     This includes:
        - σf lower than a frequency dependent threshold ε(f)
        - σA (f0) lower than a frequency dependent threshold θ(f),
 
+    The thresholds for all peaks are looked up at once from the SESAME frequency bands.
+
     Parameters
     ----------
     _stdf : list
@@ -13238,126 +14811,53 @@ def __check_stability(_stdf, _peak, _hvsr_log_std, rank):
         List of dictionaries containing input information about peak, without freq stability test
     _hvsr_log_std : list
         List of dictionaries containing log standard deviation along curve
-    rank : int
-        Integer value, higher value is "higher-ranked" peak, helps determine which peak is actual hvsr peak
 
     Returns
     -------
     _peak : list
         List of dictionaries containing output information about peak test
     """
+    if len(_peak) == 0:
+        return _peak
+
+    _f0, _ = __peak_arrays(_peak)
+    _stdfArr = np.asarray(_stdf, dtype=float)[:len(_peak)]
+    _logStdArr = np.asarray(_hvsr_log_std, dtype=float)[:len(_peak)]
+
+    # SESAME frequency bands (upper limits) and the thresholds ε(f) (freq.) and θ(f) (amp.) for each band
+    #   f0 < 0.2; 0.2 <= f0 < 0.5; 0.5 <= f0 < 1.0; 1.0 <= f0 <= 2.0; f0 > 2.0
+    bandLimits = np.array([0.2, 0.5, 1.0, 2.0])
+    epsilonVals = np.array([0.25, 0.2, 0.15, 0.1, 0.05])
+    thetaVals = np.array([0.48, 0.40, 0.3, 0.25, 0.2])
+    bandInd = np.searchsorted(bandLimits, _f0, side='right')
+    bandInd[_f0 == 2.0] = 3  # The 1.0-2.0 Hz band includes its upper limit
+
+    _e = epsilonVals[bandInd]
+    _t = thetaVals[bandInd]
+    sfPass = _stdfArr < _e * _f0
+    saPass = _logStdArr < _t
 
-    global max_rank
-
-    #
-    # check σf and σA
-    #
-    if rank:
-        max_rank += 2
     for _i in range(len(_peak)):
         _peak[_i]['Sf'] = _stdf[_i]
         _peak[_i]['Sa'] = _hvsr_log_std[_i]
-        _this_peak = _peak[_i]
-        if _this_peak['f0'] < 0.2:
-            _e = 0.25
-            if _stdf[_i] < _e * _this_peak['f0']:
-                _peak[_i]['Report']['Sf'] = f"St.Dev. of Peak Freq. ({_stdf[_i]:0.2f}) < {(_e * _this_peak['f0']):0.3f} {sprit_utils._check_mark()}"
-                _this_peak['Score'] += 1
-                _this_peak['PassList']['LowStDev_Freq'] = True
-            else:
-                _peak[_i]['Report']['Sf'] = f"St.Dev. of Peak Freq. ({_stdf[_i]:0.2f}) < {(_e * _this_peak['f0']):0.3f} {sprit_utils._x_mark()}"
-                _this_peak['PassList']['LowStDev_Freq'] = False
-
-            _t = 0.48
-            if _hvsr_log_std[_i] < _t:
-                _peak[_i]['Report']['Sa'] = f"St.Dev. of Peak Amp. ({_hvsr_log_std[_i]:0.3f}) < {_t:0.2f} {sprit_utils._check_mark()}"
-                _this_peak['Score'] += 1
-                _this_peak['PassList']['LowStDev_Amp'] = True
-            else:
-                _peak[_i]['Report']['Sa'] = f"St.Dev. of Peak Amp. ({_hvsr_log_std[_i]:0.3f}) < {_t:0.2f} {sprit_utils._check_mark()}"
-                _this_peak['PassList']['LowStDev_Amp'] = False
-
-        elif 0.2 <= _this_peak['f0'] < 0.5:
-            _e = 0.2
-            if _stdf[_i] < _e * _this_peak['f0']:
-                _peak[_i]['Report']['Sf'] = f"St.Dev. of Peak Freq. ({_stdf[_i]:0.2f}) < {(_e * _this_peak['f0']):0.3f} {sprit_utils._check_mark()}"
-                _this_peak['Score'] += 1
-                _this_peak['PassList']['LowStDev_Freq'] = True
-            else:
-                _peak[_i]['Report']['Sf'] = f"St.Dev. of Peak Freq. ({_stdf[_i]:0.2f}) < {(_e * _this_peak['f0']):0.3f} {sprit_utils._x_mark()}"
-                _this_peak['PassList']['LowStDev_Freq'] = False
-
-            _t = 0.40
-            if _hvsr_log_std[_i] < _t:
-                _peak[_i]['Report']['Sa'] = f"St.Dev. of Peak Amp. ({_hvsr_log_std[_i]:0.3f}) < {_t:0.2f} {sprit_utils._check_mark()}"
-                _this_peak['Score'] += 1
-                _this_peak['PassList']['LowStDev_Amp'] = True
-            else:
-                _peak[_i]['Report']['Sa'] = f"St.Dev. of Peak Amp. ({_hvsr_log_std[_i]:0.3f}) < {_t:0.2f} {sprit_utils._check_mark()}"
-                _this_peak['PassList']['LowStDev_Amp'] = False
-
-        elif 0.5 <= _this_peak['f0'] < 1.0:
-            _e = 0.15
-            if _stdf[_i] < _e * _this_peak['f0']:
-                _peak[_i]['Report']['Sf'] = f"St.Dev. of Peak Freq. ({_stdf[_i]:0.2f}) < {(_e * _this_peak['f0']):0.3f} {sprit_utils._check_mark()}"
-                _this_peak['Score'] += 1
-                _this_peak['PassList']['LowStDev_Freq'] = True
-            else:
-                _peak[_i]['Report']['Sf'] = f"St.Dev. of Peak Freq. ({_stdf[_i]:0.2f}) < {(_e * _this_peak['f0']):0.3f} {sprit_utils._x_mark()}"
-                _this_peak['PassList']['LowStDev_Freq'] = False
-
-            _t = 0.3
-            if _hvsr_log_std[_i] < _t:
-                _peak[_i]['Report']['Sa'] = f"St.Dev. of Peak Amp. ({_hvsr_log_std[_i]:0.3f}) < {_t:0.2f} {sprit_utils._check_mark()}"
-                _this_peak['Score'] += 1
-                _this_peak['PassList']['LowStDev_Amp'] = True
-            else:
-                _peak[_i]['Report']['Sa'] = f"St.Dev. of Peak Amp. ({_hvsr_log_std[_i]:0.3f}) < {_t:0.2f} {sprit_utils._check_mark()}"
-                _this_peak['PassList']['LowStDev_Amp'] = False
-
-        elif 1.0 <= _this_peak['f0'] <= 2.0:
-            _e = 0.1
-            if _stdf[_i] < _e * _this_peak['f0']:
-                _peak[_i]['Report']['Sf'] = f"St.Dev. of Peak Freq. ({_stdf[_i]:0.2f}) < {(_e * _this_peak['f0']):0.3f} {sprit_utils._check_mark()}"
-                _this_peak['Score'] += 1
-                _this_peak['PassList']['LowStDev_Freq'] = True
-            else:
-                _peak[_i]['Report']['Sf'] = f"St.Dev. of Peak Freq. ({_stdf[_i]:0.2f}) < {(_e * _this_peak['f0']):0.3f} {sprit_utils._x_mark()}"
-                _this_peak['PassList']['LowStDev_Freq'] = False
-
-            _t = 0.25
-            if _hvsr_log_std[_i] < _t:
-                _peak[_i]['Report']['Sa'] = f"St.Dev. of Peak Amp. ({_hvsr_log_std[_i]:0.3f}) < {_t:0.2f} {sprit_utils._check_mark()}"
-                _this_peak['Score'] += 1
-                _this_peak['PassList']['LowStDev_Amp'] = True
-            else:
-                _peak[_i]['Report']['Sa'] = f"St.Dev. of Peak Amp. ({_hvsr_log_std[_i]:0.3f}) < {_t:0.2f} {sprit_utils._check_mark()}"
-                _this_peak['PassList']['LowStDev_Amp'] = False
-
-        elif _this_peak['f0'] > 0.2:
-            _e = 0.05
-            if _stdf[_i] < _e * _this_peak['f0']:
-                _peak[_i]['Report']['Sf'] = f"St.Dev. of Peak Freq. ({_stdf[_i]:0.2f}) < {(_e * _this_peak['f0']):0.3f} {sprit_utils._check_mark()}"
-                _this_peak['Score'] += 1
-                _this_peak['PassList']['LowStDev_Freq'] = True
-            else:
-                _peak[_i]['Report']['Sf'] = f"St.Dev. of Peak Freq. ({_stdf[_i]:0.2f}) < {(_e * _this_peak['f0']):0.3f} {sprit_utils._x_mark()}"
-                _this_peak['PassList']['LowStDev_Freq'] = False
-
-            _t = 0.2
-            if _hvsr_log_std[_i] < _t:
-                _peak[_i]['Report']['Sa'] = f"St.Dev. of Peak Amp. ({_hvsr_log_std[_i]:0.3f}) < {_t:0.2f} {sprit_utils._check_mark()}"
-                _this_peak['Score'] += 1
-                _this_peak['PassList']['LowStDev_Amp'] = True
-            else:
-                _peak[_i]['Report']['Sa'] = f"St.Dev. of Peak Amp. ({_hvsr_log_std[_i]:0.3f}) < {_t:0.2f} {sprit_utils._check_mark()}"
-                _this_peak['PassList']['LowStDev_Freq'] = False
+        if np.isnan(_f0[_i]):
+            continue
+
+        sfMark = sprit_utils._check_mark() if sfPass[_i] else sprit_utils._x_mark()
+        _peak[_i]['Report']['Sf'] = f"St.Dev. of Peak Freq. ({_stdf[_i]:0.2f}) < {(_e[_i] * _f0[_i]):0.3f} {sfMark}"
+        _peak[_i]['PassList']['LowStDev_Freq'] = bool(sfPass[_i])
+
+        saMark = sprit_utils._check_mark() if saPass[_i] else sprit_utils._x_mark()
+        _peak[_i]['Report']['Sa'] = f"St.Dev. of Peak Amp. ({_hvsr_log_std[_i]:0.3f}) < {_t[_i]:0.2f} {saMark}"
+        _peak[_i]['PassList']['LowStDev_Amp'] = bool(saPass[_i])
+
+        _peak[_i]['Score'] += int(sfPass[_i]) + int(saPass[_i])
 
     return _peak
 
 
 # Get frequency standard deviation
-def __get_stdf(x_values, indexList, hvsrPeaks):
+def __get_stdf(x_values, indexList, peak_indices, peak_offsets):
     """Private function to get frequency standard deviation of peak(s) of interest, from multiple time-step HVSR curves
     Paramaters
     ----------
@@ -13366,6 +14866,10 @@ def __get_stdf(x_values, indexList, hvsrPeaks):
             Array of x_values of dataset (frequency or period, most often frequency)
         indexList : list
             List of index/indices of peak(s) of interest, (index is within the x_values list)
+        peak_indices : np.array
+            Flat array of the peak indices of all the time-step HVSR curves (see _get_ind_peaks())
+        peak_offsets : np.array
+            Start of each time step in peak_indices (length is number of time steps + 1)
 
     Returns
     -------
@@ -13373,41 +14877,23 @@ def __get_stdf(x_values, indexList, hvsrPeaks):
             List of standard deviations of the peak
 
     """
+    x_values = np.asarray(x_values)
+    peak_indices = np.asarray(peak_indices)
+    peakCounts = np.diff(peak_offsets)
+    rowIDs = np.repeat(np.arange(peakCounts.shape[0]), peakCounts)
+    firstPeakInRow = np.asarray(peak_offsets)[:-1][peakCounts > 0]  # Time steps with no peaks are skipped
+
     stdf = list()
     # Go through list containing all peak indices (often, just a single index of the main peak)
     for index in indexList:
-        point = list()
-        # Iterate to get index for all rows of pandas series,
-
-        #   each row contains a list of peak indices for the H/V curve from that time window
-        for j in range(len(hvsrPeaks)):
-            p = None
-
-            # Iterate through each peak in each time window
-            for k in range(len(hvsrPeaks.iloc[j])):
-                if p is None:
-                    p = hvsrPeaks.iloc[j][k]
-                else:
-                    # Find frequency peak closest in the current time window to the (current) hvsr peak
-                    if abs(index - hvsrPeaks.iloc[j][k]) < abs(index - p):
-                        p = hvsrPeaks.iloc[j][k]
-                        # p = hvsrPeaks[j][k]
-                        # print(p=p1, p, p1)
-            if p is not None:
-                # It should never be None, this is just a double check
-                # Append the index of interest for that time window
-                point.append(p)
-        # Append the last index
-        point.append(index)
-        v = list()
-
-        # Get all the actual frequencies (go through each index and extract the frequency from x_values)
-        for pl in range(len(point)):
-            v.append(x_values[point[pl]])
+        # Sort peaks by distance from the (current) hvsr peak within each time step (stable, so ties go to the lower index)
+        #   The first peak of each time step is then the one closest to the hvsr peak
+        closestOrder = np.lexsort((np.abs(index - peak_indices), rowIDs))
+        point = np.append(peak_indices[closestOrder[firstPeakInRow]], index)
 
         # stdf is a list in case there are multiple peaks to check.
 
         # Most of the time this is only a 1-item list
         # Contains std of frequencies of the peaks from each time window H/V curve that are closest to the main H/V peak
-        stdf.append(np.std(v))
+        stdf.append(np.std(x_values[point]))
     return stdf
@@ -1645,22 +1645,19 @@ def _parse_hv_plot_list(hv_data, hvsr_plot_list, azimuth='HV'):
             HVCol = 'HV_Curves_'+azimuth
 
         if 'tp' in hvsr_plot_list:
-            allpeaks = []
-            for row in hvsrDF[hvsrDF['Use']]['CurvesPeakFreqs_'+azimuth].values:
-                for peak in row:
-                    allpeaks.append(peak)
-            allInd = []
-            for row, peakList in enumerate(hvsrDF[hvsrDF['Use']]['CurvesPeakIndices_'+azimuth].values):
-                for ind in peakList:
-                    allInd.append((row, ind))
-            x_vals = []
-            y_vals = []
-            y_max = np.nanmax(hvsr_data.hvsrp[azimuth])
-            hvCurveInd = list(hvsrDF.columns).index(HVCol)
-
-            for i, tp in enumerate(allpeaks):
-                x_vals.extend([tp, tp, None]) # add two x values and a None
-                y_vals.extend([0, hvsrDF.iloc[allInd[i][0], hvCurveInd][allInd[i][1]], None]) # add the first and last y values and a None            
+            # Peaks of each used time window, as flat arrays (with the time window of each peak in rowIDs)
+            peakInds, peakOffsets = sprit_hvsr._get_ind_peaks(hvsr_data, azimuth, use_only=True)
+            rowIDs = np.repeat(np.arange(peakOffsets.shape[0]-1), np.diff(peakOffsets))
+            usedCurves = np.stack(hvsrDF[hvsrDF['Use']][HVCol])
+
+            # Each peak is a vertical line from 0 to the curve amplitude, separated by None
+            x_vals = np.full((peakInds.shape[0], 3), None, dtype=object)
+            y_vals = np.full((peakInds.shape[0], 3), None, dtype=object)
+            x_vals[:, 0] = x_vals[:, 1] = np.asarray(x_data)[peakInds]
+            y_vals[:, 0] = 0
+            y_vals[:, 1] = usedCurves[rowIDs, peakInds]
+            x_vals = x_vals.ravel().tolist()
+            y_vals = y_vals.ravel().tolist()
 
             results_fig.add_trace(go.Scatter(x=x_vals, y=y_vals, mode='lines',
                                             line=dict(width=4, dash="solid", 
@@ -1,5 +1,6 @@
 import copy
 import datetime
+import hashlib
 import inspect
 import io
 import json
@@ -16,6 +17,7 @@
 import ipywidgets as widgets
 from IPython.display import display, clear_output
 import kaleido
+from matplotlib.collections import LineCollection
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import matplotlib
@@ -31,7 +33,7 @@
 import plotly.graph_objs as go
 import plotly.subplots as subplots
 from plotly.subplots import make_subplots
-from scipy import signal, interpolate
+from scipy import signal, interpolate, spatial
 import shapely
 import warnings
 
@@ -42,6 +44,10 @@
     import sprit.sprit_hvsr as sprit_hvsr
     import sprit.sprit_calibration as sprit_calibration
 
+# Delaunay triangulations and fitted interpolators for cross sections, reused when only the styling or grid of a cross section changes
+_cross_section_triangulations = {}
+_cross_section_interpolators = {}
+
 
 # Plot cross section
 def plot_cross_section(hvsr_data,  title=None, fig=None, ax=None, use_elevation=True, show_feet=False, primary_unit='m', 
@@ -82,6 +88,8 @@ def plot_cross_section(hvsr_data,  title=None, fig=None, ax=None, use_elevation=
     grid_size : list, optional
         Two item list with height and width of grid for interpolation.
         If "auto" this will be calculated based on the data, by default 'auto'.
+        Fitted interpolators are cached, so re-plotting the same sites with a new grid_size 
+        (or new styling) only re-evaluates the interpolator on the new grid.
     orientation : str, optional
         The orientation of the cross section. 
         Should be either "WE", "EW", "NS", or "SN", by default 'WE'.
@@ -237,50 +245,48 @@ def plot_cross_section(hvsr_data,  title=None, fig=None, ax=None, use_elevation=
         [print(f"\t{hvdata.site[:12]:<12}: {hvdata.longitude:>8.4f}, {hvdata.latitude:>8.4f}, {hvdata.elevation:<6.1f}") for hvdata in hvDataSorted]
 
     # Get cross section profile
-    shapelyPoints = []
-    interpData = []
-    interpCoords = {'longitude': [], 'latitude': [], 'elevation': [], 'HVVal': [],
-                    'site': []}
-
+    calc_depth_kwargs = {k: v for k, v in kwargs.items() if k in tuple(inspect.signature(sprit_calibration.calculate_depth).parameters.keys())}
+    if 'show_depth_curve' not in calc_depth_kwargs:
+        calc_depth_kwargs['show_depth_curve'] = False
+        if verbose and any([not hasattr(hvData, 'x_elev_m') for hvData in hvDataSorted]):
+            print('Not displaying depth curves. Use "show_depth_curve=True" if you would like to see all depth curve plots prior to plotting cross section.')
+
+    siteCoords = []
+    siteElevs = []
+    siteHVVals = []
+    siteNames = []
+    siteDepthModels = []
     for i, hvData in enumerate(hvDataSorted):
+        # Ensure hvData has all depth/elev info it needs (only calculated once per site)
         if not hasattr(hvData, 'x_elev_m'):
-            calc_depth_kwargs = {k: v for k, v in kwargs.items() if k in tuple(inspect.signature(sprit_calibration.calculate_depth).parameters.keys())}
-            if 'show_depth_curve' not in calc_depth_kwargs:
-                calc_depth_kwargs['show_depth_curve'] = False
-                if i == 0 and verbose:
-                    print('Not displaying depth curves. Use "show_depth_curve=True" if you would like to see all depth curve plots prior to plotting cross section.')
             hvData = sprit_calibration.calculate_depth(hvData, **calc_depth_kwargs, verbose=verbose)
-
-        # Create shapely Point objects at each sounding location
-        x = hvData['longitude']
-        y = hvData['latitude']
-        z = hvData['elevation']
-
-        shapelyPoints.append(shapely.Point(x, y, z))
-
-        zData = hvData['x_elev_m']['Z']
-        maxSiteHV = np.nanmax(hvData.hvsr_curve)
-        for j, pt in enumerate(hvData.hvsr_curve):
-            interpCoords['longitude'].append(x)
-            interpCoords['latitude'].append(y)
-            interpCoords['elevation'].append(zData[j])
-
-            if interpolate_log_values:
-                pt = np.log10(pt/np.log10(maxSiteHV))
-            interpData.append(pt/maxSiteHV)
-            interpCoords['HVVal'].append(pt)
-            interpCoords['site'].append(hvData.site)
-
-        # Since already doing loop, ensure hvData has all depth/elev info it needs
-        if not hasattr(hvData, 'x_elev_m'):
-            calc_depth_kwargs = {k: v for k, v in kwargs.items()
-                                      if k in tuple(inspect.signature(sprit_calibration.calculate_depth).parameters.keys())}
-            if 'calculate_depth_in_feet' not in calc_depth_kwargs:
-                calc_depth_kwargs['calculate_depth_in_feet'] = True
-            calc_depth_kwargs['show_depth_curve'] = False
-            hvDataSorted[i] = sprit_calibration.calculate_depth(hvData, **calc_depth_kwargs, verbose=verbose)
-
-    xSectionProfile = shapely.LineString(shapelyPoints)
+            hvDataSorted[i] = hvData
+
+        hvCurve = np.asarray(hvData.hvsr_curve, dtype=float)
+        if interpolate_log_values:
+            hvCurve = np.log10(hvCurve/np.log10(np.nanmax(hvCurve)))
+
+        siteCoords.append((hvData['longitude'], hvData['latitude'], hvData['elevation']))
+        siteElevs.append(np.asarray(hvData['x_elev_m']['Z'][:hvCurve.shape[0]], dtype=float))
+        siteHVVals.append(hvCurve)
+        siteNames.append(hvData.site)
+        if 'DepthModel' in hvData.Table_Report.columns:
+            siteDepthModels.append(str(hvData.Table_Report['DepthModel'].values[0]))
+        else:
+            siteDepthModels.append(None)
+
+    # Stack the H/V values of all sites (each located at its site coordinates) for interpolation
+    siteCoords = np.array(siteCoords, dtype=float)
+    sitePtCounts = [hvVals.shape[0] for hvVals in siteHVVals]
+    interpCoords = {'longitude': np.repeat(siteCoords[:, 0], sitePtCounts),
+                    'latitude': np.repeat(siteCoords[:, 1], sitePtCounts),
+                    'elevation': np.concatenate(siteElevs),
+                    'HVVal': np.concatenate(siteHVVals),
+                    'site': np.repeat(siteNames, sitePtCounts)}
+
+    # Create shapely Point objects at each sounding location
+    shapelyPoints = list(shapely.points(siteCoords))
+    xSectionProfile = shapely.LineString(siteCoords)
     profileXs, profileYs = xSectionProfile.xy
 
     orderCoordValues = profileXs
@@ -338,45 +344,48 @@ def plot_cross_section(hvsr_data,  title=None, fig=None, ax=None, use_elevation=
         # Get grid coordinates (all coords in z direction (depth/elev))
         gridZcoords = np.linspace(min_grid_elev, max_grid_elev, cellHNumber)
 
+        # All coords in the "x" direction (along profile)
         gridXDists = np.linspace(0, xSectionProfile.length, cellWNumber)
-        gridXcoords = []  # All coords in the "x" direction (along profile)
-        for xdist in gridXDists:
-            x, y = xSectionProfile.interpolate(xdist).xy
-            if 'east' in profile_direction:
-                gridXcoords.append(x[0])
-            else:
-                gridXcoords.append(y[0])
-        gridXcoords = np.array(gridXcoords)
+        gridPoints = shapely.line_interpolate_point(xSectionProfile, gridXDists)
+        if 'east' in profile_direction:
+            gridXcoords = shapely.get_x(gridPoints)
+        else:
+            gridXcoords = shapely.get_y(gridPoints)
 
         if verbose:
             print(f'Grid generated ({cellWNumber*cellHNumber} cells)\n\tx-range: {xSectionLength:.5f} ({cellWNumber:d} cells, each {cellWSize:.5f} units in size)\n\tz-range: {xSectionDepth:.2f} ({cellHNumber:d} cells, each {cellHSize:.5f} units in size)')
 
-        if verbose:
-            print(f'Beginning interpolation ({interpolation_type})... ', end='')
+        df = pd.DataFrame(interpCoords)
+        interpPoints = np.column_stack([interpCoords[ordercoord], interpCoords['elevation']])
+        interpValues = interpCoords['HVVal']
 
-        ctList = ['cloughtocher2dinterpolator', 'cloughtocher', 'ct', 'clough-tocher', 'clough tocher', 'cubic', 'c']
-        nearList = ['nearestnd', 'nearest', 'near', 'n']
-        linList = ['linearnd', 'linear', 'lin', 'l']
-        rbfList = ['radial basis function', 'rbf', 'rbfinterpolator']
+        # Fitted interpolators are cached by site set, depth model, interpolation type, and log flag
+        # (the hash of the data itself guards against sites with the same names but different data)
+        dataHash = hashlib.sha1(np.ascontiguousarray(interpPoints).tobytes() + np.ascontiguousarray(interpValues).tobytes()).hexdigest()
+        interpKey = (tuple(siteNames), tuple(siteDepthModels), ordercoord,
+                     str(interpolation_type).lower(), interpolate_log_values, dataHash)
 
-        df = pd.DataFrame(interpCoords)
+        if verbose:
+            if interpKey in _cross_section_interpolators:
+                print(f'Beginning interpolation ({interpolation_type}, using previously fitted interpolator)... ', end='')
+            else:
+                print(f'Beginning interpolation ({interpolation_type})... ', end='')
 
-        try:
-            if str(interpolation_type).lower() in ctList:
-                interp = interpolate.CloughTocher2DInterpolator(list(zip(df[ordercoord], df['elevation'])), df['HVVal'])
-            elif str(interpolation_type).lower() in rbfList:
-                interp = interpolate.RBFInterpolator(list(zip(df[ordercoord], df['elevation'])), df['HVVal'])
-            elif str(interpolation_type).lower() in linList:
-                interp = interpolate.LinearNDInterpolator(list(zip(df[ordercoord], df['elevation'])), df['HVVal'])
-            elif str(interpolation_type).lower() in nearList:
-                interp = interpolate.NearestNDInterpolator(list(zip(df[ordercoord], df['elevation'])), df['HVVal'])
-            else:  # Default to nearest neighbor (fastest)
-                interp = interpolate.NearestNDInterpolator(list(zip(df[ordercoord], df['elevation'])), df['HVVal'])
-        except:
-            interp = interpolate.NearestNDInterpolator(list(zip(df[ordercoord], df['elevation'])), df['HVVal'])
+        interpCache = __get_cached_item(_cross_section_interpolators, interpKey,
+                                        lambda: {'interpolator': __make_cross_section_interpolator(interpPoints, interpValues, interpolation_type)})
 
+        # Only (re-)evaluate the interpolator if the grid has changed
         xx, zz = np.meshgrid(gridXcoords, gridZcoords)
-        interpData = interp(xx, zz)
+        gridKey = hashlib.sha1(xx.tobytes() + zz.tobytes()).hexdigest()
+        if interpCache.get('grid_key') != gridKey:
+            interp = interpCache['interpolator']
+            if isinstance(interp, interpolate.RBFInterpolator):
+                # RBFInterpolator only takes a single (n, 2) array of points
+                interpCache['grid_values'] = interp(np.column_stack([xx.ravel(), zz.ravel()])).reshape(xx.shape)
+            else:
+                interpCache['grid_values'] = interp(xx, zz)
+            interpCache['grid_key'] = gridKey
+        interpData = interpCache['grid_values'].copy()
         interpDataflat = interpData[:-1, :-1]
         if verbose:
             print('Data interpolated')
@@ -894,7 +903,7 @@ def plot_input_stream(hv_data, stream=None, input_fig=None, plot_engine='plotly'
 # Plot outlier curves
 def plot_outlier_curves(hvsr_data, plot_engine='plotly', plotly_module='go', remove_outliers_during_plot=False,
                         outlier_threshold=0.98, use_percentile=True, use_hv_curves=False, 
-                        from_roc=False, show_plot=True, verbose=False, discarded_curves=None):
+                        from_roc=False, aggregate_curves=True, show_plot=True, verbose=False, discarded_curves=None):
     """Function to plot outlier curves, including which have been excluded
 
     Parameters
@@ -915,6 +924,10 @@ def plot_outlier_curves(hvsr_data, plot_engine='plotly', plotly_module='go', rem
         Whether to perform analysis on HV curves (if True) or PSD curves (if False), by default False
     from_roc : bool, optional
         Helper parameter to determine if this is being called from sprit.remove_outlier_curves function, by default False
+    aggregate_curves : bool, optional
+        If True, the retained curves and the removed curves of each component are each plotted as a single object 
+        (a matplotlib LineCollection or a single NaN-separated plotly trace) rather than one line per window. 
+        This keeps figures with many windows small and responsive, but individual windows are not labeled on hover. By default True.
     show_plot : bool, optional
         Whether to show plot, by default True
     verbose : bool, optional
@@ -978,11 +991,17 @@ def plot_outlier_curves(hvsr_data, plot_engine='plotly', plotly_module='go', rem
 
                 x_data = hvsr_data['x_freqs']['Z']
                 curve_traces = []
-                for ind, (i, hv) in enumerate(hvsr_data.hvsr_windows_df.iterrows()):
-                    nameLabel = f"Window starting at {i.strftime('%H:%M:%S')}<br>Window #{ind}"
-                    curve_traces.append(go.Scatter(x=x_data, y=hv['HV_Curves'], 
-                                hovertemplate=nameLabel, line=dict(color='rgba(0,0,0,0.1)', width=0.75),
+                if aggregate_curves:
+                    xCurves, yCurves = __nan_separated_curves(x_data, np.stack(hvsr_data.hvsr_windows_df['HV_Curves']))
+                    curve_traces.append(go.Scatter(x=xCurves, y=yCurves, name='H/V Curves',
+                                line=dict(color='rgba(0,0,0,0.3)', width=0.75),
                                 showlegend=False))
+                else:
+                    for ind, (i, hv) in enumerate(hvsr_data.hvsr_windows_df.iterrows()):
+                        nameLabel = f"Window starting at {i.strftime('%H:%M:%S')}<br>Window #{ind}"
+                        curve_traces.append(go.Scatter(x=x_data, y=hv['HV_Curves'], 
+                                    hovertemplate=nameLabel, line=dict(color='rgba(0,0,0,0.1)', width=0.75),
+                                    showlegend=False))
                 outlier_fig.add_traces(curve_traces)
                 
                 # Calculate a median curve, and reshape so same size as original
@@ -1043,20 +1062,35 @@ def comp_rgba(comp, a):
                     
                     # Retrieve index of those RMSE values that lie outside the threshold
                     timeIndex = hvsr_data['hvsr_windows_df'].index
-                    for j, curve in enumerate(curr_data):
-                        if rmse[j] > rmse_threshold:
-                            badTrace = go.Scatter(x=x_data, y=curve,
-                                                line=dict(color=comp_rgba(comp, 1), width=1.5, dash='dash'),
-                                                #marker=dict(color=comp_rgba(comp, 1), size=3),
-                                                name=str(hvsr_data.hvsr_windows_df.index[j]), showlegend=False)
-                            outlier_fig.add_trace(badTrace, row=rowDict[comp], col=1)
-                            if j not in indRemoved:
-                                indRemoved.append(j)
-                            noRemoved += 1
-                        else:
-                            goodTrace = go.Scatter(x=x_data, y=curve,
-                                                    line=dict(color=comp_rgba(comp, 0.01)), name=str(hvsr_data.hvsr_windows_df.index[j]), showlegend=False)
+                    badCurves = rmse > rmse_threshold
+                    if aggregate_curves:
+                        indRemoved = list(np.union1d(indRemoved, np.flatnonzero(badCurves)).astype(int))
+                        noRemoved += int(badCurves.sum())
+                        if np.any(~badCurves):
+                            xCurves, yCurves = __nan_separated_curves(x_data, curr_data[~badCurves])
+                            goodTrace = go.Scatter(x=xCurves, y=yCurves, line=dict(color=comp_rgba(comp, 0.1)),
+                                                   name=f'{comp} Retained Curves', showlegend=False)
                             outlier_fig.add_trace(goodTrace, row=rowDict[comp], col=1)
+                        if np.any(badCurves):
+                            xCurves, yCurves = __nan_separated_curves(x_data, curr_data[badCurves])
+                            badTrace = go.Scatter(x=xCurves, y=yCurves, line=dict(color=comp_rgba(comp, 1), width=1.5, dash='dash'),
+                                                  name=f'{comp} Removed Curves', showlegend=False)
+                            outlier_fig.add_trace(badTrace, row=rowDict[comp], col=1)
+                    else:
+                        for j, curve in enumerate(curr_data):
+                            if rmse[j] > rmse_threshold:
+                                badTrace = go.Scatter(x=x_data, y=curve,
+                                                    line=dict(color=comp_rgba(comp, 1), width=1.5, dash='dash'),
+                                                    #marker=dict(color=comp_rgba(comp, 1), size=3),
+                                                    name=str(hvsr_data.hvsr_windows_df.index[j]), showlegend=False)
+                                outlier_fig.add_trace(badTrace, row=rowDict[comp], col=1)
+                                if j not in indRemoved:
+                                    indRemoved.append(j)
+                                noRemoved += 1
+                            else:
+                                goodTrace = go.Scatter(x=x_data, y=curve,
+                                                        line=dict(color=comp_rgba(comp, 0.01)), name=str(hvsr_data.hvsr_windows_df.index[j]), showlegend=False)
+                                outlier_fig.add_trace(goodTrace, row=rowDict[comp], col=1)
 
                     #timeIndRemoved = pd.DatetimeIndex([timeIndex[ind] for ind in indRemoved])
                     #hvsr_data['hvsr_windows_df'].loc[timeIndRemoved, 'Use'] = False
@@ -1165,39 +1199,66 @@ def comp_rgba(comp, a):
                 if rmse[j] > rmse_threshold:
                     bad_rmse.append(j)
 
-            # Iterate through each curve to determine if it's rmse is outside threshold, for plot
-            keep_label_got = False
-            rem_label_got = False
-            for j, curve in enumerate(curr_data):
-                label = None
-                if rmse[j] > rmse_threshold:
-                    linestyle = 'dashed'
-                    linecolor='darkred'
-                    alpha = 1
-                    linewidth = 1
-                    if not rem_label_got:
-                        label='Removed Curve'
-                        rem_label_got=True
-                else:
-                    linestyle='solid'
-                    linecolor = 'rosybrown'
-                    alpha = 0.25
-                    linewidth=0.5
-                    if not keep_label_got:
-                        keep_label_got=True
-                        label='Retained Curve'
-
-                # Plot each individual curve
+            # Plot all retained curves and all removed curves as one LineCollection each
+            if aggregate_curves:
                 if not use_hv_curves:
+                    curveAx = ax[compNames[i]]
                     if 'x_freqs' in hvsr_data.keys():
-                        ax[compNames[i]].plot(hvsr_data.x_freqs[compNames[i]], curve, linewidth=linewidth, c=linecolor, linestyle=linestyle, alpha=alpha, label=label)
+                        xVals = hvsr_data.x_freqs[compNames[i]]
                     else:
-                        ax[compNames[i]].plot(1/hvsr_data.psds[compNames[i]]['period_bin_centers'], curve, linewidth=linewidth, c=linecolor, linestyle=linestyle, alpha=alpha, label=label)
+                        xVals = 1/hvsr_data.psds[compNames[i]]['period_bin_centers']
                 else:
+                    curveAx = ax["HV Curve"]
                     if 'x_freqs' in hvsr_data.keys():
-                        ax["HV Curve"].plot(hvsr_data.x_freqs['Z'][:-1], curve, linewidth=linewidth, c=linecolor, linestyle=linestyle, alpha=alpha, label=label)
+                        xVals = hvsr_data.x_freqs['Z'][:-1]
+                    else:
+                        xVals = 1/(hvsr_data.psds['Z']['period_bin_centers'][:-1])
+
+                badCurves = rmse > rmse_threshold
+                xVals = np.broadcast_to(np.asarray(xVals)[:curr_data.shape[1]], curr_data.shape)
+                curveSegments = np.stack([xVals, curr_data], axis=-1)
+                if np.any(~badCurves):
+                    curveAx.add_collection(LineCollection(curveSegments[~badCurves], linewidths=0.5, colors='rosybrown',
+                                                          linestyles='solid', alpha=0.25, label='Retained Curve'))
+                if np.any(badCurves):
+                    curveAx.add_collection(LineCollection(curveSegments[badCurves], linewidths=1, colors='darkred',
+                                                          linestyles='dashed', alpha=1, label='Removed Curve'))
+                curveAx.autoscale_view()
+
+            else:
+                # Iterate through each curve to determine if it's rmse is outside threshold, for plot
+                keep_label_got = False
+                rem_label_got = False
+                for j, curve in enumerate(curr_data):
+                    label = None
+                    if rmse[j] > rmse_threshold:
+                        linestyle = 'dashed'
+                        linecolor='darkred'
+                        alpha = 1
+                        linewidth = 1
+                        if not rem_label_got:
+                            label='Removed Curve'
+                            rem_label_got=True
+                    else:
+                        linestyle='solid'
+                        linecolor = 'rosybrown'
+                        alpha = 0.25
+                        linewidth=0.5
+                        if not keep_label_got:
+                            keep_label_got=True
+                            label='Retained Curve'
+
+                    # Plot each individual curve
+                    if not use_hv_curves:
+                        if 'x_freqs' in hvsr_data.keys():
+                            ax[compNames[i]].plot(hvsr_data.x_freqs[compNames[i]], curve, linewidth=linewidth, c=linecolor, linestyle=linestyle, alpha=alpha, label=label)
+                        else:
+                            ax[compNames[i]].plot(1/hvsr_data.psds[compNames[i]]['period_bin_centers'], curve, linewidth=linewidth, c=linecolor, linestyle=linestyle, alpha=alpha, label=label)
                     else:
-                        ax["HV Curve"].plot(1/(hvsr_data.psds['Z']['period_bin_centers'][:-1]), curve, linewidth=linewidth, c=linecolor, linestyle=linestyle, alpha=alpha, label=label)                    
+                        if 'x_freqs' in hvsr_data.keys():
+                            ax["HV Curve"].plot(hvsr_data.x_freqs['Z'][:-1], curve, linewidth=linewidth, c=linecolor, linestyle=linestyle, alpha=alpha, label=label)
+                        else:
+                            ax["HV Curve"].plot(1/(hvsr_data.psds['Z']['period_bin_centers'][:-1]), curve, linewidth=linewidth, c=linecolor, linestyle=linestyle, alpha=alpha, label=label)                    
             
             # Plot the median curve
             if 'HV_Curves' in compNames[i]:
@@ -1635,22 +1696,19 @@ def _parse_hv_plot_list(hv_data, hvsr_plot_list, results_fig=None, azimuth='HV')
         HVCol = 'HV_Curves_'+azimuth
 
     if 'tp' in hv_plot_list:
-        allpeaks = []
-        for row in hvsrDF[hvsrDF['Use']]['CurvesPeakFreqs_'+azimuth].values:
-            for peak in row:
-                allpeaks.append(peak)
-        allInd = []
-        for row, peakList in enumerate(hvsrDF[hvsrDF['Use']]['CurvesPeakIndices_'+azimuth].values):
-            for ind in peakList:
-                allInd.append((row, ind))
-        x_vals = []
-        y_vals = []
-        y_max = np.nanmax(hvsr_data.hvsrp[azimuth])
-        hvCurveInd = list(hvsrDF.columns).index(HVCol)
-
-        for i, tp in enumerate(allpeaks):
-            x_vals.extend([tp, tp, None]) # add two x values and a None
-            y_vals.extend([0, hvsrDF.iloc[allInd[i][0], hvCurveInd][allInd[i][1]], None]) # add the first and last y values and a None            
+        # Peaks of each used time window, as flat arrays (with the time window of each peak in rowIDs)
+        peakInds, peakOffsets = sprit_hvsr._get_ind_peaks(hvsr_data, azimuth, use_only=True)
+        rowIDs = np.repeat(np.arange(peakOffsets.shape[0]-1), np.diff(peakOffsets))
+        usedCurves = np.stack(hvsrDF[hvsrDF['Use']][HVCol])
+
+        # Each peak is a vertical line from 0 to the curve amplitude, separated by None
+        x_vals = np.full((peakInds.shape[0], 3), None, dtype=object)
+        y_vals = np.full((peakInds.shape[0], 3), None, dtype=object)
+        x_vals[:, 0] = x_vals[:, 1] = np.asarray(x_data)[peakInds]
+        y_vals[:, 0] = 0
+        y_vals[:, 1] = usedCurves[rowIDs, peakInds]
+        x_vals = x_vals.ravel().tolist()
+        y_vals = y_vals.ravel().tolist()
 
         results_fig.add_trace(go.Scatter(x=x_vals, y=y_vals, mode='lines',
                                         line=dict(width=4, dash="solid", 
@@ -2115,6 +2173,106 @@ def _get_use_array(hvsr_data, stream=None, f=None, timeWindowArr=None, psdArr=No
     return hvdf, useArrShape
 
 
+# Helper function to get the sample times of a trace without looping over each sample
+def _get_trace_times(trace, time_format='datetime64'):
+    """Get the times of every sample of an obspy trace, computed as starttime + n*delta
+
+    Parameters
+    ----------
+    trace : obspy.Trace
+        Trace for which to get sample times
+    time_format : str, default='datetime64'
+        Either 'datetime64' (numpy datetime64[ns] array, used by plotly) or 'matplotlib' (matplotlib date numbers)
+
+    Returns
+    -------
+    numpy.ndarray
+        Array with the time of each sample of the trace
+    """
+    sampleOffsets = np.arange(trace.stats.npts) * trace.stats.delta
+    if str(time_format).lower() in ['matplotlib', 'mpl', 'mdates']:
+        return trace.stats.starttime.matplotlib_date + sampleOffsets / 86400
+
+    startTime = np.datetime64(trace.stats.starttime.ns, 'ns')
+    return startTime + np.round(sampleOffsets * 1e9).astype('timedelta64[ns]')
+
+
+# Helper function to reduce line data to the min/max envelope of each pixel column (M4-style decimation)
+def _decimate_minmax(x, y, n_bins=None):
+    """Decimate line data to the minimum and maximum value of each of n_bins groups of consecutive samples.
+
+    The first and last samples and the min/max of each bin are kept (in their original order), 
+    so the plotted line is visually the same as the full-resolution line when n_bins is about the pixel width of the axis.
+    Masked values (i.e., data gaps) are converted to np.nan so lines are still broken at gaps.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        X values (e.g., times) of the line
+    y : numpy.ndarray or numpy.ma.MaskedArray
+        Y values (e.g., amplitudes) of the line
+    n_bins : int, default=None
+        Number of bins (pixel columns) to decimate to. If None or if the data is already small enough, x and y are returned unchanged.
+
+    Returns
+    -------
+    tuple
+        Tuple of numpy.ndarray (x, y) with decimated data
+    """
+    if isinstance(y, np.ma.MaskedArray):
+        y = np.ma.filled(y.astype(float), np.nan)
+
+    nPts = y.shape[0]
+    if n_bins is None or n_bins < 1 or nPts <= 4 * n_bins:
+        return x, y
+
+    binLen = nPts // n_bins
+    binnedY = y[:binLen * n_bins].reshape(n_bins, binLen)
+    binOffsets = np.arange(n_bins) * binLen
+
+    # Gaps (nan) are ignored when finding extremes, all-nan bins keep a nan value to break the line
+    minInds = np.argmin(np.where(np.isnan(binnedY), np.inf, binnedY), axis=1) + binOffsets
+    maxInds = np.argmax(np.where(np.isnan(binnedY), -np.inf, binnedY), axis=1) + binOffsets
+    keepInds = [minInds, maxInds, [0, nPts - 1]]
+
+    if binLen * n_bins < nPts:
+        tailY = y[binLen * n_bins:]
+        keepInds.append(np.array([np.argmin(np.where(np.isnan(tailY), np.inf, tailY)),
+                                  np.argmax(np.where(np.isnan(tailY), -np.inf, tailY))]) + binLen * n_bins)
+
+    keepInds = np.unique(np.concatenate(keepInds))
+    return x[keepInds], y[keepInds]
+
+
+# Helper function to reduce the number of time columns of a spectrogram for plotting
+def _decimate_spectrogram(times, spec, n_cols=None):
+    """Decimate spectrogram columns (time axis) by averaging blocks of adjacent columns
+
+    Parameters
+    ----------
+    times : numpy.ndarray
+        Time of each column of spec
+    spec : numpy.ndarray
+        2D spectrogram array with shape (frequencies, times)
+    n_cols : int, default=None
+        Maximum number of columns to keep. If None or spec already has fewer columns, inputs are returned unchanged.
+
+    Returns
+    -------
+    tuple
+        Tuple of numpy.ndarray (times, spec) with times of the first column of each block and the block-averaged spectrogram
+    """
+    nTimes = spec.shape[1]
+    if n_cols is None or n_cols < 1 or nTimes <= n_cols:
+        return times, spec
+
+    blockLen = int(np.ceil(nTimes / n_cols))
+    blockStarts = np.arange(0, nTimes, blockLen)
+    blockCounts = np.diff(np.append(blockStarts, nTimes))
+    decSpec = np.add.reduceat(spec, blockStarts, axis=1) / blockCounts
+    return np.asarray(times)[blockStarts], decSpec
+
+
 # Plot Obspy Trace in axis using matplotlib
 def _plot_simple_stream_obspy(stream, hv_data=None, fig=None, axes=None, decimate=True, show_plot=False, ylim_std=0.75, return_fig=True):
     """Function to plot a stream of data with Z, E, N components using matplotlib. Similar to obspy.Stream.Plot(), but will be formatted differently and eventually more customizable.
@@ -2130,6 +2288,8 @@ def _plot_simple_stream_obspy(stream, hv_data=None, fig=None, axes=None, decimat
         Optional: if not None, matplotlib.Figure in which to plot the resulting figure (i.e., can be plotted in existing figure)
     axes : matplotlib.Axis, default=None
         Optional: if not None, matplotlib.Axis in which to plot the resulting figure (i.e., can be plotted in existing axis)
+    decimate : bool, default=True
+        Whether to plot only the min/max envelope of the data (about two points per pixel column of the figure), by default True
     show_plot : bool, default=False
         Whether to do matplotlib.pylot.show(), by default False
     ylim_std : float, default = 0.75
@@ -2151,48 +2311,30 @@ def _plot_simple_stream_obspy(stream, hv_data=None, fig=None, axes=None, decimat
     
     new_stream = stream.copy()
     #axis.plot(trace.times, trace.data)
-    
-    sTime = stream[0].stats.starttime
-    timeList = {}
-    mplTimes = {}
 
-    #In case data is masked, need to split, decimate, then merge back together
+    # Merge so gaps are masked (these are plotted as breaks in the line)
     if isinstance(new_stream[0].data, np.ma.masked_array):
         new_stream = new_stream.split()
-    
-    if decimate:
-        new_stream.decimate(10)
-    
     new_stream.merge()
 
-    zStream = new_stream.select(component='Z')#[0]
-    eStream = new_stream.select(component='E')#[0]
-    nStream = new_stream.select(component='N')#[0]
-    streams = [zStream, nStream, eStream]
-
-    for st in streams:
-        key = st[0].stats.component
-        timeList[key] = []
-        mplTimes[key] = []
-        for tr in st:
-            for t in np.ma.getdata(tr.times()):
-                newt = sTime + t
-                timeList[key].append(newt)
-                mplTimes[key].append(newt.matplotlib_date)
+    # Decimate to a min/max envelope of about two points per pixel column of the figure
+    if decimate:
+        nBins = int(axes['Z'].figure.get_figwidth() * axes['Z'].figure.dpi)
+    else:
+        nBins = None
 
-    #Ensure that the min and max times for each component are the same
-    for i, k in enumerate(mplTimes.keys()):
-        currMin = np.min(list(map(np.min, mplTimes[k])))
-        currMax = np.max(list(map(np.max, mplTimes[k])))
+    mplTimes = {}
+    mplData = {}
+    for tr in new_stream:
+        key = tr.stats.component
+        if key in mplTimes:
+            continue
+        trTimes = _get_trace_times(tr, time_format='matplotlib')
+        mplTimes[key], mplData[key] = _decimate_minmax(trTimes, tr.data, n_bins=nBins)
 
-        if i == 0:
-            xmin = currMin
-            xmax = currMax
-        else:
-            if xmin > currMin:
-                xmin = currMin
-            if xmax < currMax:
-                xmax = currMax
+    #Ensure that the min and max times for each component are the same
+    xmin = min([np.min(t) for t in mplTimes.values()])
+    xmax = max([np.max(t) for t in mplTimes.values()])
 
     axes['Z'].xaxis_date()
     axes['N'].xaxis_date()
@@ -2204,22 +2346,10 @@ def _plot_simple_stream_obspy(stream, hv_data=None, fig=None, axes=None, decimat
     axes['E'].xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
     axes["E"].xaxis.set_minor_locator(mdates.MinuteLocator(interval=1))
     axes["E"].tick_params(axis='x', labelsize=8)
-    
 
-    streams = [zStream.merge(method=1), 
-               nStream.merge(method=1), 
-               eStream.merge(method=1)]
-
-    for st in streams:
-        for i, tr in enumerate(st):
-            key = tr.stats.component
-            if key == 'Z':
-                pColor='k'
-            elif key=='N':
-                pColor='r'
-            else:
-                pColor='b'
-            axes[key].plot(mplTimes[key], tr.data, color=pColor, linewidth=0.15)
+    for key, pColor in zip(['Z', 'N', 'E'], ['k', 'r', 'b']):
+        if key in mplTimes:
+            axes[key].plot(mplTimes[key], mplData[key], color=pColor, linewidth=0.15)
 
 
     axes['Z'].set_ylabel('Z')
@@ -2303,34 +2433,24 @@ def _plot_input_stream_plotly(hv_data=None, stream=None, input_fig=None,
         
 
         sTimeZ = zTrace.stats.starttime
-        sTimeE = eTrace.stats.starttime
-        sTimeN = nTrace.stats.starttime        
-        # Z
-        for i, zTr in enumerate(zTraces):
-            if i == 0:
-                xTraceTimesZ = [np.datetime64((sTimeZ + tT).datetime) for tT in zTr.times()]
-                xTraceTimesAppZ = [[np.datetime64((sTimeZ + tT).datetime) for tT in zTr.times()]]
-            else:
-                xTraceTimesAppZ.append([np.datetime64((sTimeZ + tT).datetime) for tT in zTr.times()])
-                xTraceTimesZ.extend([np.datetime64((sTimeZ + tT).datetime) for tT in zTr.times()])
-        
-        # E
-        for i, eTr in enumerate(eTraces):
-            if i == 0:
-                xTraceTimesE = [np.datetime64((sTimeE + tT).datetime) for tT in eTr.times()]
-                xTraceTimesAppE = [[np.datetime64((sTimeE + tT).datetime) for tT in eTr.times()]]
-            else:
-                xTraceTimesAppE.append([np.datetime64((sTimeE + tT).datetime) for tT in eTr.times()])
-                xTraceTimesE.extend([np.datetime64((sTimeE + tT).datetime) for tT in eTr.times()])
-
-        # N
-        for i, nTr in enumerate(nTraces):
-            if i == 0:
-                xTraceTimesN = [np.datetime64((sTimeN + tT).datetime) for tT in nTr.times()]
-                xTraceTimesAppN = [[np.datetime64((sTimeN + tT).datetime) for tT in nTr.times()]]
-            else:
-                xTraceTimesAppN.append([np.datetime64((sTimeN + tT).datetime) for tT in nTr.times()])
-                xTraceTimesN.extend([np.datetime64((sTimeN + tT).datetime) for tT in nTr.times()])
+
+        # Decimate to a min/max envelope of about two points per pixel column of a (wide) screen
+        if decimate:
+            nBins = 2000
+        else:
+            nBins = None
+
+        # Get sample times from each trace's own starttime and decimate each trace
+        traceXY = {}
+        for compKey, compTraces in zip(['Z', 'E', 'N'], [zTraces, eTraces, nTraces]):
+            totalPts = sum([tr.stats.npts for tr in compTraces])
+            traceXY[compKey] = []
+            for tr in compTraces:
+                if nBins is None:
+                    trBins = None
+                else:
+                    trBins = max(1, int(nBins * tr.stats.npts / totalPts))
+                traceXY[compKey].append(_decimate_minmax(_get_trace_times(tr), tr.data, n_bins=trBins))
 
 
         if specKey == 'N':
@@ -2346,14 +2466,15 @@ def _plot_input_stream_plotly(hv_data=None, stream=None, input_fig=None,
 
         stream_spec_freqs = f
         stream_spec_times = specTimes
-        psdArr = psdArr
+
+        if decimate:
+            specTimes, psdArr = _decimate_spectrogram(specTimes, psdArr, n_cols=nBins)
 
         if f[0] == 0:
             f[0] = f[1] / 10  # Fix so bottom number is not 0
 
-        specTimes = list(specTimes)
-        specTimes.insert(0, 0)
-        timeWindowArr = np.array([np.datetime64((sTimeZ + tT).datetime) for tT in specTimes])
+        specTimes = np.insert(specTimes, 0, 0)
+        timeWindowArr = np.datetime64(sTimeZ.ns, 'ns') + np.round(specTimes * 1e9).astype('timedelta64[ns]')
         
         if hasattr(hvsr_data, 'hvsr_band'):
             hvsrBand = hvsr_data['hvsr_band']
@@ -2418,59 +2539,23 @@ def _plot_input_stream_plotly(hv_data=None, stream=None, input_fig=None,
         input_fig.update_yaxes(title={'text':f'Spectrogram ({specKey})'}, row=1, col=1)
 
         # Data traces
-        # Z Traces
-        for i, zTr in enumerate(zTraces):
-            if i == 0:
-                zDataFig = pxScatter(x=xTraceTimesAppZ[i], y=zTr.data)
-            else:
-                zTempFig = pxScatter(x=xTraceTimesAppZ[i])
-                for zFigTrace in zTempFig.data:
-                    zDataFig.add_trace(zFigTrace)
-        
-        zDataFig.update_traces(mode='markers+lines',
-                            marker=dict(size=1, color='rgba(0,0,0,1)'),
-                            line=dict(width=1, color='rgba(0,0,0,1)'),
-                            selector=dict(mode='markers'))
-        for zTrace in zDataFig.data:
-            input_fig.add_trace(zTrace, row=3, col=1)
-
-        # E Traces
-        for i, eTr in enumerate(eTraces):
-            if i == 0:
-                eDataFig = pxScatter(x=xTraceTimesAppE[i], y=eTr.data)
-            else:
-                eTempFig = pxScatter(x=xTraceTimesAppE[i])
-                for eFigTrace in eTempFig.data:
-                    eDataFig.add_trace(eFigTrace)
-        
-        eDataFig.update_traces(mode='markers+lines',
-                            marker=dict(size=1, color='rgba(0,0,255,1)'),
-                            line=dict(width=1, color='rgba(0,0,255,1)'),
-                            selector=dict(mode='markers'))
-        for eTrace in eDataFig.data:
-            input_fig.add_trace(eTrace, row=4, col=1)
-
-        # N Traces
-        for i, nTr in enumerate(nTraces):
-            if i == 0:
-                nDataFig = pxScatter(x=xTraceTimesAppN[i], y=nTr.data)
-            else:
-                nTempFig = pxScatter(x=xTraceTimesAppN[i])
-                for nFigTrace in nTempFig.data:
-                    nDataFig.add_trace(nFigTrace)
-        
-        nDataFig.update_traces(mode='markers+lines',
-                            marker=dict(size=1, color='rgba(255,0,0,1)'),
-                            line=dict(width=1, color='rgba(255,0,0,1)'),
-                            selector=dict(mode='markers'))
-
-        for nTrace in nDataFig.data:
-            input_fig.add_trace(nTrace, row=5, col=1)
+        compPlotParams = [('Z', 3, 'rgba(0,0,0,1)'),
+                          ('E', 4, 'rgba(0,0,255,1)'),
+                          ('N', 5, 'rgba(255,0,0,1)')]
+        for compKey, rowNum, traceColor in compPlotParams:
+            for xTimes, yData in traceXY[compKey]:
+                compDataFig = pxScatter(x=xTimes, y=yData)
+                compDataFig.update_traces(mode='markers+lines',
+                                    marker=dict(size=1, color=traceColor),
+                                    line=dict(width=1, color=traceColor),
+                                    selector=dict(mode='markers'))
+                for compFigTrace in compDataFig.data:
+                    input_fig.add_trace(compFigTrace, row=rowNum, col=1)
 
         input_fig.update_layout(title_text="Frequency and Data values over time", 
                             height=650, showlegend=False)
 
-        input_fig.update_xaxes(type='date', range=[xTraceTimesZ[0], xTraceTimesZ[-1]])
+        input_fig.update_xaxes(type='date', range=[traceXY['Z'][0][0][0], traceXY['Z'][-1][0][-1]])
 
         hvsr_data['Input_Plot'] = input_fig # not currently using
 
@@ -2620,41 +2705,30 @@ def _plot_input_stream_mpl(stream, hv_data=None, component='Z', stack_type='line
     vmin = np.nanpercentile(array_displayed, cmap_per[0]*100)
     vmax = np.nanpercentile(array_displayed, cmap_per[1]*100)
   
+    # Decimate to a min/max envelope of about two points per pixel column of the figure
     if decimate:
-        decimation_factor = 5
+        nBins = int(ax['signalz'].figure.get_figwidth() * ax['signalz'].figure.dpi)
+    else:
+        nBins = None
 
-    sTime = stream[0].stats.starttime
-    timeList = {}
-    mplTimes = {}
-    
     if isinstance(og_stream[0].data, np.ma.masked_array):
-        og_stream = og_stream.split()      
-    #og_stream.decimate(decimation_factor)
-    #og_stream.detrend('spline', order=2, dspline=500)
+        og_stream = og_stream.split()
     og_stream.merge()
 
+    mplTimes = {}
+    mplData = {}
     for tr in og_stream:
         key = tr.stats.component
-        timeList[key] = []
-        mplTimes[key] = []
-        for t in np.ma.getdata(tr.times()[::decimation_factor]):
-            newt = sTime + t
-            timeList[key].append(newt)
-            mplTimes[key].append(newt.matplotlib_date)
-    
+        trTimes = _get_trace_times(tr, time_format='matplotlib')
+        mplTimes[key], mplData[key] = _decimate_minmax(trTimes, tr.data, n_bins=nBins)
+
     # Ensure that the min and max times for all charts are the same
-    for i, k in enumerate(mplTimes.keys()):
-        currMin = np.min(list(map(np.min, mplTimes[k])))
-        currMax = np.max(list(map(np.max, mplTimes[k])))
+    xmin = min([np.min(t) for t in mplTimes.values()])
+    xmax = max([np.max(t) for t in mplTimes.values()])
 
-        if i == 0:
-            xmin = currMin
-            xmax = currMax
-        else:
-            if xmin > currMin:
-                xmin = currMin
-            if xmax < currMax:
-                xmax = currMax     
+    # Spectrogram does not need more time columns than there are pixels either
+    if decimate:
+        times, array_displayed = _decimate_spectrogram(times, array_displayed, n_cols=nBins)
     
     norm = matplotlib.colors.Normalize(vmin=vmin, vmax=vmax)
     im = ax['spec'].imshow(array_displayed, norm=norm, cmap=cmap, aspect='auto', interpolation=None, extent=[xmin,xmax,ymax,ymin])
@@ -2678,9 +2752,9 @@ def _plot_input_stream_mpl(stream, hv_data=None, component='Z', stack_type='line
     ax['signale'].xaxis.set_minor_locator(mdates.MinuteLocator(interval=1))
     ax['signale'].tick_params(axis='x', labelsize=8)
     
-    ax['signalz'].plot(mplTimes['Z'], og_stream.select(component='Z')[0].data[::decimation_factor], color='k', linewidth=0.15)
-    ax['signaln'].plot(mplTimes['N'], og_stream.select(component='N')[0].data[::decimation_factor], color='k', linewidth=0.15)
-    ax['signale'].plot(mplTimes['E'], og_stream.select(component='E')[0].data[::decimation_factor], color='k', linewidth=0.15)
+    ax['signalz'].plot(mplTimes['Z'], mplData['Z'], color='k', linewidth=0.15)
+    ax['signaln'].plot(mplTimes['N'], mplData['N'], color='k', linewidth=0.15)
+    ax['signale'].plot(mplTimes['E'], mplData['E'], color='k', linewidth=0.15)
 
     # Get all components plotted on the same y
     zMax = np.nanmax(np.abs(og_stream.select(component='Z')[0].data))
@@ -2858,6 +2932,106 @@ def _plot_simple_stream_mpl(hv_data, stream=None, input_fig=None, decimate=True,
         return input_fig
 
 
+# Helper function to get an item from one of the cross section caches, with least-recently-used eviction
+def __get_cached_item(cache, key, make_item, max_cached=8):
+    """Get cache[key], calling make_item() to create it if not yet in cache
+
+    Parameters
+    ----------
+    cache : dict
+        Cache dictionary (ordered from least to most recently used)
+    key : hashable
+        Key of item
+    make_item : callable
+        Function with no arguments that returns the item if it is not already cached
+    max_cached : int, default=8
+        Maximum number of items to keep in cache
+
+    Returns
+    -------
+    object
+        Cached item
+    """
+    if key in cache:
+        # Move to end so the least recently used item is removed first
+        cache[key] = cache.pop(key)
+    else:
+        cache[key] = make_item()
+        while len(cache) > max_cached:
+            cache.pop(next(iter(cache)))
+    return cache[key]
+
+
+# Helper function to fit the interpolator used for the cross section background
+def __make_cross_section_interpolator(interp_points, interp_values, interpolation_type):
+    """Fit scipy interpolator for cross section (falls back to nearest neighbor if interpolator cannot be fit)"""
+    ctList = ['cloughtocher2dinterpolator', 'cloughtocher', 'ct', 'clough-tocher', 'clough tocher', 'cubic', 'c']
+    nearList = ['nearestnd', 'nearest', 'near', 'n']
+    linList = ['linearnd', 'linear', 'lin', 'l']
+    rbfList = ['radial basis function', 'rbf', 'rbfinterpolator']
+
+    try:
+        if str(interpolation_type).lower() in ctList:
+            interp = interpolate.CloughTocher2DInterpolator(__get_cross_section_triangulation(interp_points), interp_values)
+        elif str(interpolation_type).lower() in rbfList:
+            interp = interpolate.RBFInterpolator(interp_points, interp_values)
+        elif str(interpolation_type).lower() in linList:
+            interp = interpolate.LinearNDInterpolator(__get_cross_section_triangulation(interp_points), interp_values)
+        elif str(interpolation_type).lower() in nearList:
+            interp = interpolate.NearestNDInterpolator(interp_points, interp_values)
+        else:  # Default to nearest neighbor (fastest)
+            interp = interpolate.NearestNDInterpolator(interp_points, interp_values)
+    except:
+        interp = interpolate.NearestNDInterpolator(interp_points, interp_values)
+    return interp
+
+
+# Helper function to get the (cached) Delaunay triangulation of cross section interpolation points
+def __get_cross_section_triangulation(points, max_cached=8):
+    """Get Delaunay triangulation of points, reusing a previous triangulation of the same points if available
+
+    Parameters
+    ----------
+    points : numpy.ndarray
+        Array of shape (n, 2) with the (along-profile coordinate, elevation) of each interpolation point
+    max_cached : int, default=8
+        Maximum number of triangulations to keep in memory
+
+    Returns
+    -------
+    scipy.spatial.Delaunay
+        Triangulation that can be passed directly to CloughTocher2DInterpolator or LinearNDInterpolator
+    """
+    points = np.ascontiguousarray(points, dtype=float)
+    pointsKey = (points.shape, hashlib.sha1(points.tobytes()).hexdigest())
+    return __get_cached_item(_cross_section_triangulations, pointsKey, lambda: spatial.Delaunay(points), max_cached=max_cached)
+
+
+# Helper function to join curves into a single NaN-separated line
+def __nan_separated_curves(x_data, curves):
+    """Join multiple curves that share the same x values into one pair of x/y arrays, separated by np.nan
+
+    This allows many curves to be plotted as a single (plotly) trace.
+
+    Parameters
+    ----------
+    x_data : array-like
+        X values shared by all curves
+    curves : numpy.ndarray
+        2D array with one curve per row
+
+    Returns
+    -------
+    tuple
+        Tuple of numpy.ndarray (x, y), each with length curves.shape[0] * (curves.shape[1] + 1)
+    """
+    curves = np.atleast_2d(curves)
+    nCurves, nPts = curves.shape
+    xCurves = np.tile(np.append(np.asarray(x_data, dtype=float)[:nPts], np.nan), nCurves)
+    yCurves = np.hstack([curves, np.full((nCurves, 1), np.nan)]).ravel()
+    return xCurves, yCurves
+
+
 # Helper function for plotting outlier curves using the express module of plotly
 def __plotly_outlier_curves_px(hvsr_data, **input_args):
     """Support function for using plotly express to make outlier curves chart. Intended for use with streamlit API
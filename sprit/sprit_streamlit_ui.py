@@ -1011,46 +1011,24 @@ def make_input_fig_plotly():
 
         specKey = 'Z'
 
-        xTraceTimesAppZ = []
         f = []
         specTimes = []
         psdArr = []
         timeWindowArr = []
 
-        sTimeZ = zTraces[0].stats.starttime
-        sTimeE = eTraces[0].stats.starttime
-        sTimeN = nTraces[0].stats.starttime        
-      
-        # E
-        for i, eTr in enumerate(eTraces):
-            if i == 0:
-                xTraceTimesE = [np.datetime64((sTimeE + tT).datetime) for tT in eTr.times()]
-                xTraceTimesAppE = [[np.datetime64((sTimeE + tT).datetime) for tT in eTr.times()]]
-            else:
-                xTraceTimesAppE.append([np.datetime64((sTimeE + tT).datetime) for tT in eTr.times()])
-                xTraceTimesE.extend([np.datetime64((sTimeE + tT).datetime) for tT in eTr.times()])
-
-        # N
-        for i, nTr in enumerate(nTraces):
-            if i == 0:
-                xTraceTimesN = [np.datetime64((sTimeN + tT).datetime) for tT in nTr.times()]
-                xTraceTimesAppN = [[np.datetime64((sTimeN + tT).datetime) for tT in nTr.times()]]
-            else:
-                xTraceTimesAppN.append([np.datetime64((sTimeN + tT).datetime) for tT in nTr.times()])
-                xTraceTimesN.extend([np.datetime64((sTimeN + tT).datetime) for tT in nTr.times()])
-
-
+        # Sample times are computed per trace (vectorized) and decimated to a min/max envelope for display
+        nBins = 2000
+        traceXY = {}
+        for compKey, compTraces in zip(['Z', 'E', 'N'], [zTraces, eTraces, nTraces]):
+            totalPts = sum([tr.stats.npts for tr in compTraces])
+            traceXY[compKey] = []
+            for tr in compTraces:
+                trBins = max(1, int(nBins * tr.stats.npts / totalPts))
+                traceXY[compKey].append(sprit_plot._decimate_minmax(sprit_plot._get_trace_times(tr), tr.data, n_bins=trBins))
 
         for i, zTrace in enumerate(zTraces):
             sTimeZ = zTrace.stats.starttime
 
-            if i == 0:
-                xTraceTimesZ = [np.datetime64((sTimeZ + tT).datetime) for tT in zTrace.times()]
-                xTraceTimesAppZ = [[np.datetime64((sTimeZ + tT).datetime) for tT in zTrace.times()]]
-            else:
-                xTraceTimesAppZ.append([np.datetime64((sTimeZ + tT).datetime) for tT in zTrace.times()])
-                xTraceTimesZ.extend([np.datetime64((sTimeZ + tT).datetime) for tT in zTrace.times()])
-
             fTemp, specTimesTemp, psdArrTemp = _generate_stream_specgram(_trace=zTrace)
 
             if fTemp[0] == 0:
@@ -1061,7 +1039,7 @@ def make_input_fig_plotly():
             specTimesTemp.insert(0, 0)
             specTimes.append(specTimesTemp)
 
-            timeWindowArr.append(np.array([np.datetime64((sTimeZ + tT).datetime) for tT in specTimesTemp]))
+            timeWindowArr.append(np.datetime64(sTimeZ.ns, 'ns') + np.round(np.array(specTimesTemp) * 1e9).astype('timedelta64[ns]'))
             
             psdArr.append(psdArrTemp)
 
@@ -1138,9 +1116,9 @@ def make_input_fig_plotly():
         # Z Traces
         for i, zTr in enumerate(zTraces):
             if i == 0:
-                zDataFig = pxScatter(x=xTraceTimesAppZ[i], y=zTr.data)
+                zDataFig = pxScatter(x=traceXY['Z'][i][0], y=traceXY['Z'][i][1])
             else:
-                zTempFig = pxScatter(x=xTraceTimesAppZ[i], y=zTr.data)
+                zTempFig = pxScatter(x=traceXY['Z'][i][0], y=traceXY['Z'][i][1])
                 for zFigTrace in zTempFig.data:
                     zDataFig.add_trace(zFigTrace)
         
@@ -1154,9 +1132,9 @@ def make_input_fig_plotly():
         # E Traces
         for i, eTr in enumerate(eTraces):
             if i == 0:
-                eDataFig = pxScatter(x=xTraceTimesAppE[i], y=eTr.data)
+                eDataFig = pxScatter(x=traceXY['E'][i][0], y=traceXY['E'][i][1])
             else:
-                eTempFig = pxScatter(x=xTraceTimesAppE[i], y=eTr.data)
+                eTempFig = pxScatter(x=traceXY['E'][i][0], y=traceXY['E'][i][1])
                 for eFigTrace in eTempFig.data:
                     eDataFig.add_trace(eFigTrace)
         
@@ -1172,9 +1150,9 @@ def make_input_fig_plotly():
         # N Traces
         for i, nTr in enumerate(nTraces):
             if i == 0:
-                nDataFig = pxScatter(x=xTraceTimesAppN[i], y=nTr.data)
+                nDataFig = pxScatter(x=traceXY['N'][i][0], y=traceXY['N'][i][1])
             else:
-                nTempFig = pxScatter(x=xTraceTimesAppN[i], y=nTr.data)
+                nTempFig = pxScatter(x=traceXY['N'][i][0], y=traceXY['N'][i][1])
                 for nFigTrace in nTempFig.data:
                     nDataFig.add_trace(nFigTrace)
         
@@ -1220,8 +1198,8 @@ def make_input_fig_plotly():
         inputFig.update_layout(title_text="Frequency and Data values over time", 
                             height=650, showlegend=False)
 
-        chartStartT = min(xTraceTimesZ[0], xTraceTimesE[0], xTraceTimesN[0])
-        chartEndT = max(xTraceTimesZ[-1], xTraceTimesE[-1], xTraceTimesN[-1])
+        chartStartT = min([traceXY[comp][0][0][0] for comp in traceXY])
+        chartEndT = max([traceXY[comp][-1][0][-1] for comp in traceXY])
         inputFig.update_xaxes(type='date', range=[chartStartT, chartEndT])
 
         st.session_state.input_fig = inputFig